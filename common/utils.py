@@ -21,7 +21,9 @@
 
 import operator
 from django.conf import settings
+from django.contrib.messages import get_messages
 from django.utils.translation import ugettext as _, get_language
+from django.views.decorators.http import condition
 from languages.models import Language
 try:
     import PyICU
@@ -176,3 +178,30 @@ def get_user_locale(request):
 if __name__ == "__main__":
     import doctest
     doctest.testmod()
+
+def _stats_generation(request):
+    """ Return the (value, updated) StatsGeneration tuple, read once per request """
+    if not hasattr(request, '_stats_generation'):
+        # Import here to prevent a circular dependency
+        from stats.models import StatsGeneration
+        request._stats_generation = StatsGeneration.current()
+    return request._stats_generation
+
+def _stats_etag(request, *args, **kwargs):
+    if len(get_messages(request)):
+        # Pending messages are part of the page
+        return None
+    return "%d-%s-%s" % (_stats_generation(request)[0],
+                         request.user.is_authenticated() and request.user.id or "anon",
+                         getattr(request, 'LANGUAGE_CODE', settings.LANGUAGE_CODE))
+
+def _stats_last_modified(request, *args, **kwargs):
+    # Authenticated pages have user-specific content, only the ETag can be used
+    if request.user.is_authenticated() or len(get_messages(request)):
+        return None
+    return _stats_generation(request)[1]
+
+def stats_condition(view_func):
+    """ Decorator for views only depending on the statistics data (see StatsGeneration),
+        the user and the language: a 304 is returned when the page has not changed """
+    return condition(etag_func=_stats_etag, last_modified_func=_stats_last_modified)(view_func)
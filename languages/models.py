@@ -60,7 +60,6 @@ class Language(models.Model):
         return "http://bugzilla.gnome.org/buglist.cgi?product=l10n&amp;component=%s%%20[%s]&amp;bug_status=NEW&amp;bug_status=REOPENED&amp;bug_status=ASSIGNED&amp;bug_status=UNCONFIRMED" % (self.name, self.locale)
 
     def get_release_stats(self, archives=False):
-        # FIXME Here be dragons
         """ Get summary stats for all releases """
         from stats.models import Release
 
@@ -68,10 +67,7 @@ class Language(models.Model):
             releases = Release.objects.all().filter(weight__lt=0).order_by('status', '-weight', '-name')
         else:
             releases = Release.objects.all().filter(weight__gte=0).order_by('status', '-weight', '-name')
-        stats = []
-        for rel in releases:
-            stats.append(rel.total_for_lang(self))
-        return stats
+        return Release.total_for_lang_by_releases(releases, self)
 
     def get_team_url(self):
         if self.team:
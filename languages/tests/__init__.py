@@ -18,12 +18,98 @@
 # along with Damned Lies; if not, write to the Free Software Foundation, Inc.,
 # 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
+import fcntl, os, shutil, tarfile, tempfile
+from StringIO import StringIO
+
+from django.conf import settings
 from django.core.urlresolvers import reverse
 from django.test import TestCase
 
+from languages.views import clean_tar_files
+from stats.models import Statistics
+
 class LanguageTestCase(TestCase):
     fixtures = ['sample_data.json']
 
+    def setUp(self):
+        self.old_scratchdir = settings.SCRATCHDIR
+        settings.SCRATCHDIR = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(settings.SCRATCHDIR)
+        settings.SCRATCHDIR = self.old_scratchdir
+
     def testLanguageReleaseXML(self):
-        response = self.client.get(reverse("languages.views.language_release_xml", args=['fr', 'gnome-2-30']))
-        self.assertContains(response, """<stats language="fr" release="gnome-2-30">""")
+        url = reverse("languages.views.language_release_xml", args=['fr', 'gnome-2-30'])
+        response = self.client.get(url)
+        # Streamed content can only be read once
+        content, etag = response.content, response['ETag']
+        self.assertTrue(content.startswith("""<stats language="fr" release="gnome-2-30">"""))
+        # Cached content, and conditional requests
+        self.assertEqual(self.client.get(url).content, content)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Changing statistics of the release changes the XML
+        stat = Statistics.objects.get(branch__module__name='zenity', branch__name='gnome-2-30', language__locale='fr', domain__dtype='ui')
+        stat.set_translation_stats('dummy', 100, 20, 16, reduced=False)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertTrue("<translated>100</translated><fuzzy>20</fuzzy><untranslated>16</untranslated>" in response.content)
+        # So does a change of a domain directory
+        etag = response['ETag']
+        domain = stat.domain
+        domain.directory = "po-new"
+        domain.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue("/po-new</svnpath>" in response.content)
+
+    def testLanguageReleaseTar(self):
+        old_potdir = settings.POTDIR
+        settings.POTDIR = tempfile.mkdtemp()
+        try:
+            for stat in Statistics.objects.filter(branch__releases__name='gnome-2-30', domain__dtype='ui'):
+                path = stat.po_path()
+                if not os.path.exists(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                open(path, 'w').write('msgid ""\nmsgstr ""\n')
+            url = reverse("languages.views.language_release_tar", args=['fr', 'gnome-2-30', 'ui'])
+            # The first request builds the archive and sends it
+            response = self.client.get(url)
+            self.assertEqual(response['Content-Type'], 'application/x-gzip')
+            tar_file = tarfile.open(fileobj=StringIO(response.content))
+            self.assertTrue('zenity.gnome-2-30.fr.po' in tar_file.getnames())
+            # Then the cached archive is used
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 302)
+            tar_name = response['Location'].split('/')[-1]
+            self.assertTrue(os.path.exists(os.path.join(settings.POTDIR, 'tar', tar_name)))
+            clean_tar_files()
+            self.assertTrue(os.path.exists(os.path.join(settings.POTDIR, 'tar', tar_name)))
+            # The archive is streamed while it is built, under the build lock
+            tar_path = os.path.join(settings.POTDIR, 'tar', tar_name)
+            os.remove(tar_path)
+            response = self.client.get(url)
+            lock_file = open(tar_path + ".lock", 'w')
+            self.assertRaises(IOError, fcntl.flock, lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self.assertFalse(os.path.exists(tar_path))
+            tar_file = tarfile.open(fileobj=StringIO(response.content))
+            self.assertTrue('zenity.gnome-2-30.fr.po' in tar_file.getnames())
+            self.assertTrue(os.path.exists(tar_path))
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            lock_file.close()
+            # Requests waiting too long for another build get a 503 response
+            os.remove(tar_path)
+            lock_file = open(tar_path + ".lock", 'w')
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            settings.TAR_BUILD_TIMEOUT = 0.5
+            try:
+                response = self.client.get(url)
+            finally:
+                lock_file.close()
+                del settings.TAR_BUILD_TIMEOUT
+            self.assertEqual(response.status_code, 503)
+            self.assertTrue(response.has_header('Retry-After'))
+        finally:
+            shutil.rmtree(settings.POTDIR)
+            settings.POTDIR = old_potdir
@@ -19,18 +19,19 @@
 # along with Damned Lies; if not, write to the Free Software Foundation, Inc.,
 # 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
-from datetime import date, datetime
-import os
-import tarfile
+from datetime import datetime, timedelta
+import errno, fcntl, hashlib, os, time
+import tarfile, tempfile
 
 from django.conf import settings
 from django.http import HttpResponse, HttpResponseRedirect
 from django.shortcuts import render, get_object_or_404
 from django.utils.translation import ugettext as _
+from django.views.decorators.http import condition
 
 from common import utils
 from languages.models import Language
-from stats.models import Release, Statistics
+from stats.models import Branch, Domain, Release, Statistics
 
 def languages(request):
     languages = Language.objects.select_related("team").all()
@@ -40,6 +41,7 @@ def languages(request):
     }
     return render(request, 'languages/language_list.html', context)
 
+@utils.stats_condition
 def language_all(request, locale, dtype):
     language = get_object_or_404(Language, locale=locale)
     stats = Statistics.get_lang_stats_by_type(language, dtype, release=None)
@@ -67,6 +69,7 @@ def release_archives(request, locale):
     }
     return render(request, 'languages/language_release_summary.html', context)
 
+@utils.stats_condition
 def language_release(request, locale, release_name, dtype):
     if locale == 'C':
         language = None
@@ -90,99 +93,248 @@ def language_release(request, locale, release_name, dtype):
     return render(request, 'languages/language_release.html', context)
 
 def language_release_tar(request, locale, release_name, dtype):
+    """ Produce a tar.gz archive of all po files of a release for a language.
+        Archives are cached in POTDIR/tar with a name depending on the file list and on
+        the last update of the files. A missing archive is built under a lock, and streamed
+        to the client while it is saved. Concurrent requests for the same archive are
+        redirected to it once it is saved, or get a 503 response if it is still being built
+        after TAR_BUILD_TIMEOUT seconds. """
     release = get_object_or_404(Release, name=release_name)
     language = get_object_or_404(Language, locale=locale)
     last_modif, file_list = release.get_lang_files(language, dtype)
 
-    tar_filename = '%s.%s.%s.%s.tar.gz' % (release.name, dtype, language.locale, date.today())
+    key = hashlib.sha1(repr((last_modif, file_list))).hexdigest()[:16]
+    tar_filename = '%s.%s.%s.%s.tar.gz' % (release.name, dtype, language.locale, key)
     tar_directory = os.path.join(settings.POTDIR, 'tar')
     if not os.access(tar_directory, os.R_OK):
         os.mkdir(tar_directory)
     tar_path = os.path.join(tar_directory, tar_filename)
-    if not os.access(tar_path, os.R_OK) or last_modif > datetime.fromtimestamp(os.path.getmtime(tar_path)):
-        # Create a new tar file
-        tar_file = tarfile.open(tar_path, 'w:gz')
-        for f in file_list:
-            tar_file.add(f, os.path.basename(f))
-        tar_file.close()
+    if not os.access(tar_path, os.R_OK):
+        lock_file = open(tar_path + ".lock", 'w')
+        if not lock_with_timeout(lock_file, getattr(settings, 'TAR_BUILD_TIMEOUT', 30)):
+            # Another request is still building the archive
+            lock_file.close()
+            response = HttpResponse(_("The archive is being generated, please try again later."),
+                                    status=503, content_type='text/plain')
+            response['Retry-After'] = 30
+            return response
+        if not os.access(tar_path, os.R_OK):
+            # The lock is released as soon as the archive is saved (or the client went away)
+            response = HttpResponse(release_lock_after(save_stream(tar_chunks(file_list), tar_path), lock_file),
+                                    content_type='application/x-gzip')
+            response['Content-Disposition'] = 'attachment; filename=%s.%s.%s.tar.gz' % (release.name, dtype, language.locale)
+            return response
+        # Built by another request in the meantime
+        lock_file.close()
 
     return HttpResponseRedirect("/POT/tar/%s" % tar_filename)
 
+def release_xml_etag(request, locale, release_name):
+    generation = Release.objects.filter(name=release_name).values_list('stats_generation', flat=True)
+    if not generation:
+        return None
+    return "%s-%s-%d" % (release_name, locale, generation[0])
+
+@condition(etag_func=release_xml_etag)
 def language_release_xml(request, locale, release_name):
     """ This view create the same XML output than the previous Damned-Lies, so as
         apps which depend on it (like Vertimus) don't break.
-        This view may be suppressed when Vertimus will be integrated in D-L. """
+        This view may be suppressed when Vertimus will be integrated in D-L.
+        The output is cached until statistics of the release change (see
+        Release.stats_generation), and streamed while it is generated. """
     language = get_object_or_404(Language, locale=locale)
     release = get_object_or_404(Release, name=release_name)
+    xml_directory = os.path.join(settings.SCRATCHDIR, 'xml')
+    if not os.path.exists(xml_directory):
+        os.makedirs(xml_directory)
+    prefix = "%s.%s." % (release.name, language.locale)
+    xml_path = os.path.join(xml_directory, "%s%d.xml" % (prefix, release.stats_generation))
+    if os.access(xml_path, os.R_OK):
+        return HttpResponse(read_chunks(xml_path), content_type='text/xml')
+    # Remove outdated generations
+    for filename in os.listdir(xml_directory):
+        if filename.startswith(prefix) and filename.endswith(".xml"):
+            os.remove(os.path.join(xml_directory, filename))
+    return HttpResponse(save_stream(release_xml_chunks(language, release), xml_path), content_type='text/xml')
+
+def release_xml_chunks(language, release):
+    """ Generator producing the XML statistics of language for release, a category at a time """
     stats = release.get_lang_stats(language)
-    content = "<stats language=\"%s\" release=\"%s\">\n" % (locale, release_name)
+    load_vcs_objects(stats)
+    yield "<stats language=\"%s\" release=\"%s\">\n" % (language.locale, release.name)
     for catname, categ in stats['ui']['categs'].items():
+        content = []
         if catname != 'default':
-            content += "<category id=\"%s\">" % catname
+            content.append("<category id=\"%s\">" % catname)
         # totals for category
         if catname in stats['doc']['categs']:
-            content += "<doctranslated>%s</doctranslated>" % stats['doc']['categs'][catname]['cattrans']
-            content += "<docfuzzy>%s</docfuzzy>" % stats['doc']['categs'][catname]['catfuzzy']
-            content += "<docuntranslated>%s</docuntranslated>" % stats['doc']['categs'][catname]['catuntrans']
-        content += "<translated>%s</translated>" % categ['cattrans']
-        content += "<fuzzy>%s</fuzzy>" % categ['catfuzzy']
-        content += "<untranslated>%s</untranslated>" % categ['catuntrans']
+            content.append("<doctranslated>%s</doctranslated>" % stats['doc']['categs'][catname]['cattrans'])
+            content.append("<docfuzzy>%s</docfuzzy>" % stats['doc']['categs'][catname]['catfuzzy'])
+            content.append("<docuntranslated>%s</docuntranslated>" % stats['doc']['categs'][catname]['catuntrans'])
+        content.append("<translated>%s</translated>" % categ['cattrans'])
+        content.append("<fuzzy>%s</fuzzy>" % categ['catfuzzy'])
+        content.append("<untranslated>%s</untranslated>" % categ['catuntrans'])
         # Modules
         for modname, mod in categ['modules']:
             branch_name, domains = mod.items()[0]
-            content += "<module id=\"%s\" branch=\"%s\">" % (modname, branch_name)
+            content.append("<module id=\"%s\" branch=\"%s\">" % (modname, branch_name))
             # DOC domains
             if catname in stats['doc']['categs'] and stats['doc']['categs'][catname]['modules']:
                 for docmod in stats['doc']['categs'][catname]['modules']:
                     if docmod[0] == modname:
-                        content += get_domain_stats(docmod[1].values()[0], "document")
+                        content.extend(get_domain_stats(docmod[1].values()[0], "document"))
             # UI stats
-            content += get_domain_stats(domains, "domain")
-            content += "</module>"
+            content.extend(get_domain_stats(domains, "domain"))
+            content.append("</module>")
         # Add modules who have no ui counterparts
         if catname == 'dev-tools':
             try:
                 mod = [m for m in stats['doc']['categs']['dev-tools']['modules'] if m[0] == 'gnome-devel-docs'][0][1]
-                content += "<module id=\"gnome-devel-docs\" branch=\"%s\">" % mod.keys()[0]
-                content += get_domain_stats(mod.values()[0], "document")
-                content += "</module>"
+                content.append("<module id=\"gnome-devel-docs\" branch=\"%s\">" % mod.keys()[0])
+                content.extend(get_domain_stats(mod.values()[0], "document"))
+                content.append("</module>")
             except:
                 pass
         if catname == 'desktop':
             try:
                 mod = [m for m in stats['doc']['categs']['desktop']['modules'] if m[0] == 'gnome-user-docs'][0][1]
-                content += "<module id=\"gnome-user-docs\" branch=\"%s\">" % mod.keys()[0]
-                content += get_domain_stats(mod.values()[0], "document")
-                content += "</module>"
+                content.append("<module id=\"gnome-user-docs\" branch=\"%s\">" % mod.keys()[0])
+                content.extend(get_domain_stats(mod.values()[0], "document"))
+                content.append("</module>")
             except:
                 pass
 
         if catname != 'default':
-            content += "</category>"
-    content += "</stats>"
-    return HttpResponse(content, content_type='text/xml')
+            content.append("</category>")
+        yield "".join(content)
+    yield "</stats>"
+
+def load_vcs_objects(stats):
+    """ Set branch and domain objects of all StatisticsRow objects of the stats
+        produced by Release.get_lang_stats, as needed by vcs_web_path() """
+    rows = []
+    for dtype_stats in stats.values():
+        for categ in dtype_stats['categs'].values():
+            for modname, mod in categ['modules']:
+                for doms in mod.values():
+                    rows.extend([stat for dom_key, stat in doms if dom_key != ' fake'])
+    branches = Branch.objects.select_related('module').in_bulk(list(set([row.branch_id for row in rows])))
+    domains = Domain.objects.in_bulk(list(set([row.domain_id for row in rows])))
+    for row in rows:
+        row.branch = branches[row.branch_id]
+        row.domain = domains[row.domain_id]
 
 def get_domain_stats(mods, node_name):
-    """ Iterate module domains to get stats """
-    content = ""
+    """ Iterate module domains to get stats, as a list of XML strings """
+    content = []
     for dom_key, stat in mods:
         if dom_key == ' fake':
             continue
-        content += "<%s id=\"%s\">" % (node_name, stat.domain.name)
-        content += "<translated>%s</translated>" % stat.translated()
-        content += "<fuzzy>%s</fuzzy>" % stat.fuzzy()
-        content += "<untranslated>%s</untranslated>" % stat.untranslated()
-        content += "<pofile>%s</pofile>" % stat.po_url()
-        content += "<svnpath>%s</svnpath>" % stat.vcs_web_path()
-        content += "</%s>" % node_name
+        content.append("<%s id=\"%s\">" % (node_name, stat.domain_name))
+        content.append("<translated>%s</translated>" % stat.translated())
+        content.append("<fuzzy>%s</fuzzy>" % stat.fuzzy())
+        content.append("<untranslated>%s</untranslated>" % stat.untranslated())
+        content.append("<pofile>%s</pofile>" % stat.po_url())
+        content.append("<svnpath>%s</svnpath>" % stat.vcs_web_path())
+        content.append("</%s>" % node_name)
     return content
 
 # ********* Utility functions ******************
+class TarStream(object):
+    """ File-like object collecting the data written by tarfile """
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(data)
+
+    def pop_data(self):
+        data = "".join(self.chunks)
+        self.chunks = []
+        return data
+
+def tar_chunks(file_list):
+    """ Generator producing the content of a tar.gz archive of file_list """
+    stream = TarStream()
+    tar_file = tarfile.open(mode='w|gz', fileobj=stream)
+    for f in file_list:
+        tar_file.add(f, os.path.basename(f))
+        yield stream.pop_data()
+    tar_file.close()
+    yield stream.pop_data()
+
+def lock_with_timeout(lock_file, timeout, poll_interval=0.2):
+    """ Take an exclusive lock on lock_file, waiting at most timeout seconds.
+        Returns False if the lock could not be taken. """
+    start = time.time()
+    while True:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except IOError, e:
+            if e.errno not in (errno.EAGAIN, errno.EACCES):
+                raise
+        if time.time() - start > timeout:
+            return False
+        time.sleep(poll_interval)
+
+def release_lock_after(chunks, lock_file):
+    """ Generator passing through chunks, then closing lock_file (which releases its lock)
+        once chunks are exhausted or the client went away """
+    try:
+        for chunk in chunks:
+            yield chunk
+    finally:
+        chunks.close()
+        lock_file.close()
+
+def save_stream(chunks, path):
+    """ Generator passing through chunks, which are also saved to path once all of them
+        have been produced. """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    out_file = os.fdopen(fd, 'wb')
+    try:
+        for chunk in chunks:
+            out_file.write(chunk)
+            yield chunk
+        out_file.close()
+        os.rename(tmp_path, path)
+    finally:
+        # Removes the partial file if the client went away or an error occurred
+        if os.path.exists(tmp_path):
+            out_file.close()
+            os.remove(tmp_path)
+
+def read_chunks(path, chunk_size=65536):
+    f = open(path, 'rb')
+    try:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            yield data
+    finally:
+        f.close()
+
 def clean_tar_files():
-    """ Delete outdated tar.gz files generated by the language_release_tar view """
+    """ Delete outdated tar.gz files generated by the language_release_tar view:
+        only the most recent archive of each release/dtype/language is kept """
     tar_directory = os.path.join(settings.POTDIR, 'tar')
     if not os.path.exists(tar_directory):
         return
-    for tarfile in os.listdir(tar_directory):
-        if not tarfile.endswith("%s.tar.gz" % date.today()):
-            os.remove(os.path.join(tar_directory, tarfile))
+    latest = {}
+    for filename in os.listdir(tar_directory):
+        path = os.path.join(tar_directory, filename)
+        if not filename.endswith(".tar.gz"):
+            # Lock files and partial archives of interrupted builds
+            if datetime.fromtimestamp(os.path.getmtime(path)) < datetime.now() - timedelta(days=1):
+                os.remove(path)
+            continue
+        prefix = filename.rsplit('.', 3)[0]
+        mtime = os.path.getmtime(path)
+        if prefix in latest:
+            if latest[prefix][0] > mtime:
+                os.remove(path)
+                continue
+            os.remove(latest[prefix][1])
+        latest[prefix] = (mtime, path)
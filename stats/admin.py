@@ -23,7 +23,7 @@ from django.contrib.admin import helpers
 from django.shortcuts import render
 from django.utils.encoding import force_unicode
 from django import forms
-from stats.models import Statistics, Information, PoFile, Module, Branch, Domain, Category, Release
+from stats.models import Statistics, Information, PoFile, Module, Branch, Domain, Category, Release, StatsJob, StatsRun
 
 class BranchInline(admin.TabularInline):
     model = Branch
@@ -63,6 +63,13 @@ class ModuleAdmin(admin.ModelAdmin):
 
 class BranchAdmin(admin.ModelAdmin):
     search_fields = ('name', 'module__name')
+    actions = ['update_stats']
+
+    def update_stats(self, request, queryset):
+        for branch in queryset:
+            StatsJob.enqueue(branch, force=True)
+        self.message_user(request, "Statistics update queued for %d branch(es)." % len(queryset))
+    update_stats.short_description = "Update statistics (forced)"
 
 class DomainAdmin(admin.ModelAdmin):
     list_display = ('__unicode__', 'directory', 'pot_method')
@@ -126,8 +133,21 @@ class StatisticsAdmin(admin.ModelAdmin):
 class PoFileAdmin(admin.ModelAdmin):
     search_fields = ('path',)
 
+class StatsJobAdmin(admin.ModelAdmin):
+    list_display = ('branch', 'status', 'force', 'created', 'started', 'finished')
+    list_filter = ('status',)
+    search_fields = ('branch__name', 'branch__module__name')
+    raw_id_fields = ('branch',)
+
+class StatsRunAdmin(admin.ModelAdmin):
+    list_display = ('branch', 'started', 'duration', 'spawned_commands')
+    search_fields = ('branch__name', 'branch__module__name')
+    raw_id_fields = ('branch',)
+
 admin.site.register(Statistics, StatisticsAdmin)
 admin.site.register(PoFile, PoFileAdmin)
+admin.site.register(StatsJob, StatsJobAdmin)
+admin.site.register(StatsRun, StatsRunAdmin)
 admin.site.register(Branch, BranchAdmin)
 admin.site.register(Domain, DomainAdmin)
 admin.site.register(Category, CategoryAdmin)
@@ -32,12 +32,9 @@ class Command(BaseCommand):
 
             for branch in module.branch_set.exclude(name='master'):
                 # Checkout branch (other than master)
-                cmd = "cd \"%(localdir)s\" && git checkout --track -b %(branch)s  origin/%(branch)s" % {
-                        "localdir" : branch.co_path(),
-                        "branch" : branch.name,
-                        }
+                cmd = ["git", "checkout", "--track", "-b", branch.name, "origin/%s" % branch.name]
                 try:
-                    utils.run_shell_command(cmd, raise_on_error=True)
+                    utils.run_command(cmd, cwd=branch.co_path(), raise_on_error=True)
                 except Exception, e:
                     print "Unable to checkout branch '%s' of module '%s': %s" % (branch.name, module.name, e)
                     continue
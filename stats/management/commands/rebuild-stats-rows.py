@@ -0,0 +1,11 @@
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+
+from stats.models import StatisticsRow
+
+class Command(NoArgsCommand):
+    help = "Recompute the denormalized statistics rows of the language pages"
+
+    def handle_noargs(self, **options):
+        with transaction.commit_on_success():
+            StatisticsRow.rebuild()
@@ -4,6 +4,8 @@ from people.models import Person
 from teams.models import Role
 from vertimus.models import ActionArchived
 from languages.views import clean_tar_files
+from stats.models import StatsJob, StatsRun
+from stats.utils import StatsCache
 
 class Command(BaseCommand):
     help = "Run maintenance tasks"
@@ -14,3 +16,6 @@ class Command(BaseCommand):
         Role.inactivate_unused_roles()
         ActionArchived.clean_old_actions(365)
         clean_tar_files()
+        StatsJob.clean_old_jobs(30)
+        StatsRun.clean_old_runs(30)
+        StatsCache().clean(30)
@@ -0,0 +1,67 @@
+import time
+from optparse import make_option
+from multiprocessing import Process
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from stats.models import StatsJob, LockTimeout, total_seconds
+from stats import utils
+
+def run_jobs(once, poll_interval):
+    """ Run queued statistics updates, until the queue is empty if once is True """
+    while True:
+        try:
+            job = StatsJob.claim_next()
+        except LockTimeout:
+            # Another worker is stuck while claiming a job
+            job = None
+        if job is None:
+            if once and not StatsJob.objects.filter(status='pending').exists():
+                return
+            # Nothing to do, or pending jobs of a module already being updated
+            time.sleep(poll_interval)
+            continue
+        job.run()
+        print "%s stats for %s (branch '%s') in %.1fs, %.1fs after being queued" % (
+            job.status == 'done' and "Updated" or "Error while updating",
+            job.branch.module.name, job.branch.name,
+            total_seconds(job.finished - job.started), total_seconds(job.started - job.created))
+
+class Command(BaseCommand):
+    help = "Run statistics updates queued by the web site (see StatsJob)"
+
+    option_list = BaseCommand.option_list + (
+        make_option('--workers', '-w', action='store', type='int', dest='workers', default=1,
+            help="number of worker processes"),
+        make_option('--once', action='store_true', dest='once', default=False,
+            help="stop when the queue is empty"),
+        make_option('--poll', action='store', type='float', dest='poll',
+            default=getattr(settings, 'STATS_WORKER_POLL_INTERVAL', 5),
+            help="seconds between checks of the queue when it is empty"),
+        make_option('--status', action='store_true', dest='status', default=False,
+            help="display the queue depth and job latency, and exit"),
+    )
+
+    output_transaction = False
+
+    def handle(self, *args, **options):
+        if options['status']:
+            status = StatsJob.queue_status()
+            print "Pending jobs: %(pending)d (oldest queued %(oldest_pending).0fs ago)" % status
+            print "Running jobs: %(running)d" % status
+            print "Jobs finished in the last 24 hours: %(finished)d (%(failed)d failed)" % status
+            print "Average wait: %(avg_wait).1fs, average run: %(avg_run).1fs" % status
+            return
+        if options['workers'] > 1:
+            # Each worker process opens its own database connection
+            connection.close()
+            # Worker processes share the same budget of running commands
+            utils.share_command_slots()
+            workers = [Process(target=run_jobs, args=(options['once'], options['poll']))
+                       for i in range(options['workers'])]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        else:
+            run_jobs(options['once'], options['poll'])
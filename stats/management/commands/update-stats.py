@@ -1,18 +1,87 @@
-import sys, traceback
+import sys, time, traceback
 from optparse import make_option
+from multiprocessing import Pool
 from django.core.management.base import BaseCommand
 from django.core.mail import mail_admins
-from stats.models import Module, Branch
+from django.db import connection
+from stats.models import Module, Branch, fetch_mirrors
+from stats import utils
+
+def update_module_branches(args):
+    """ Update branches of a module (run in a worker process when --jobs > 1)
+        branch_names limits the update to some branches (None for all branches),
+        fetch is False when the module repository has already been fetched.
+        Returns a list of (module name, branch name, elapsed seconds, seconds waited for
+        the lock, traceback or None, profile) tuples, profile being a (steps, commands)
+        tuple (see utils.Profiler) if profile is True, None otherwise """
+    module_id, force, branch_names, fetch, profile = args
+    results = []
+    branches = Branch.objects.select_related('module').filter(module__id=module_id)
+    if branch_names is not None:
+        branches = branches.filter(name__in=branch_names)
+    for branch in branches:
+        start = time.time()
+        try:
+            branch.update_stats(force, fetch=fetch, profile=profile)
+            error = None
+        except:
+            error = traceback.format_exc()
+        results.append((branch.module.name, branch.name, time.time() - start,
+                        getattr(branch, 'lock_wait_time', 0), error, profile_data(branch, profile)))
+    return results
+
+def profile_data(branch, profile):
+    if not profile or not hasattr(branch, 'profiler'):
+        return None
+    return (branch.profiler.ranked_steps(), branch.profiler.commands())
+
+def print_profile(runs, limit=10):
+    """ Print a summary of profiled updates, runs being a list of
+        (branch label, elapsed seconds, (steps, commands)) tuples """
+    runs = [run for run in runs if run[2] is not None]
+    if not runs:
+        return
+    step_totals = {}
+    command_totals = {}
+    for label, elapsed, (steps, commands) in runs:
+        for name, calls, seconds in steps:
+            total = step_totals.setdefault(name, [0, 0.0])
+            total[0] += calls
+            total[1] += seconds
+        for tool, calls, seconds, failures, timeouts in commands:
+            total = command_totals.setdefault(tool, [0, 0.0, 0, 0])
+            for i, value in enumerate((calls, seconds, failures, timeouts)):
+                total[i] += value
+    by_time = lambda item: item[1][1]
+    print "Slowest branches:"
+    for label, elapsed, (steps, commands) in sorted(runs, key=lambda run: run[1], reverse=True)[:limit]:
+        print "  %-40s %8.1fs  %5d commands" % (label, elapsed, sum([c[1] for c in commands]))
+    print "Time spent by step:"
+    for name, (calls, seconds) in sorted(step_totals.items(), key=by_time, reverse=True):
+        print "  %-40s %8.1fs  %5d calls" % (name, seconds, calls)
+    print "Time spent by command:"
+    for tool, (calls, seconds, failures, timeouts) in sorted(command_totals.items(), key=by_time, reverse=True):
+        print "  %-40s %8.1fs  %5d calls  %4d failed  %4d timed out" % (tool, seconds, calls, failures, timeouts)
 
 class Command(BaseCommand):
     help = "Update statistics about po file"
-    args = "[MODULE [BRANCH]]"
+    args = "[MODULE [BRANCH...]]"
 
     option_list = BaseCommand.option_list + (
         make_option('--force', action='store_true', dest='force', default=False,
             help="force statistics generation, even if files didn't change"),
         make_option('--non-gnome', action='store_true', dest='non-gnome', default=False,
             help="generate statistics for non-gnome modules (externally hosted)"),
+        make_option('--jobs', '-j', action='store', type='int', dest='jobs', default=1,
+            help="number of modules to update in parallel (full update only)"),
+        make_option('--fetch-jobs', action='store', type='int', dest='fetch_jobs', default=None,
+            help="maximum number of simultaneous repository fetches (full update only)"),
+        make_option('--domain', action='append', dest='domains', default=None, metavar='DOMAIN',
+            help="only update the DOMAIN domain (can be repeated, MODULE only)"),
+        make_option('--lang', action='append', dest='languages', default=None, metavar='LOCALE',
+            help="only update the LOCALE po files, reusing the current POT files (can be repeated, MODULE only)"),
+        make_option('--profile', action='store_true', dest='profile', default=False,
+            help="record the time spent in each update step and print a summary"),
         make_option('--debug', action='store_true', dest='debug', default=False,
             help="activate interactive debug mode"),
     )
@@ -22,6 +91,13 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         if options['debug']:
             import pdb; pdb.set_trace()
+        partial = {'domains': options['domains'], 'languages': options['languages'],
+                   'reuse_pot': bool(options['languages'])}
+        profile = options['profile']
+        profiled = []
+        if (partial['domains'] or partial['languages']) and not args:
+            print >> sys.stderr, "--domain and --lang can only be used to update a specific module."
+            return "Update unsuccessful."
         if len(args) >= 2:
             # Update the specific branch(es) of a module
             module_arg = args[0]
@@ -35,12 +111,15 @@ class Command(BaseCommand):
                     print >> sys.stderr, "Unable to find branch '%s' for module '%s' in the database." % (branch_arg, module_arg)
                     return "Update unsuccessful."
                 print "Updating stats for %s.%s..." % (module_arg, branch_arg)
+                start = time.time()
                 try:
-                    branch.update_stats(options['force'])
+                    branch.update_stats(options['force'], profile=profile, **partial)
                 except:
                     tbtext = traceback.format_exc()
                     mail_admins("Error while updating %s %s" % (module_arg, branch_arg), tbtext)
                     print >> sys.stderr, "Error during updating, mail sent to admins"
+                profiled.append(("%s.%s" % (module_arg, branch_arg), time.time() - start,
+                                 profile_data(branch, profile)))
 
         elif len(args) == 1:
             # Update all branches of a module
@@ -48,25 +127,70 @@ class Command(BaseCommand):
             print "Updating stats for %s..." % (module_arg)
             branches = Branch.objects.filter(module__name=module_arg)
             for branch in branches.all():
+                start = time.time()
                 try:
-                    branch.update_stats(options['force'])
+                    branch.update_stats(options['force'], profile=profile, **partial)
                 except:
                     print >> sys.stderr, traceback.format_exc()
                     print "Error while updating stats for %s (branch '%s')" % (module_arg, branch.name)
+                profiled.append(("%s.%s" % (module_arg, branch.name), time.time() - start,
+                                 profile_data(branch, profile)))
         else:
             # Update all modules
             if options['non-gnome']:
                 modules = Module.objects.exclude(vcs_root__startswith='git://git.gnome.org/')
             else:
                 modules = Module.objects.all()
+            # Fetch phase: all git mirrors are fetched first, and only branches whose
+            # head differs from their last updated revision are then updated (all branches
+            # with --force)
+            start = time.time()
+            fetched = fetch_mirrors(modules, options['fetch_jobs'])
+            jobs = []
+            failures = []
             for mod in modules:
-                print "Updating stats for %s..." % (mod.name)
-                branches = Branch.objects.filter(module__name=mod)
-                for branch in branches.all():
-                    try:
-                        branch.update_stats(options['force'])
-                    except:
-                        print >> sys.stderr, traceback.format_exc()
-                        print "Error while updating stats for %s (branch '%s')" % (mod.name, branch.name)
+                if mod.id not in fetched:
+                    jobs.append((mod.id, options['force'], None, True, profile))
+                    continue
+                outdated, error = fetched[mod.id]
+                if error:
+                    failures.append("%s (fetch)" % mod.name)
+                    print >> sys.stderr, error
+                    print "Error while fetching %s" % mod.name
+                elif options['force']:
+                    jobs.append((mod.id, True, None, False, profile))
+                elif outdated:
+                    jobs.append((mod.id, False, list(outdated), False, profile))
+            print "Fetched %d repositories in %.1fs, %d modules to update" % (
+                len(fetched), time.time() - start, len(jobs))
+
+            if options['jobs'] > 1:
+                # Each worker process opens its own database connection
+                connection.close()
+                # Worker processes share the same budget of running commands
+                utils.share_command_slots()
+                pool = Pool(options['jobs'])
+                results = pool.imap_unordered(update_module_branches, jobs)
+            else:
+                results = (update_module_branches(job) for job in jobs)
+
+            start = time.time()
+            for module_results in results:
+                for mod_name, branch_name, elapsed, wait_time, error, prof in module_results:
+                    profiled.append(("%s.%s" % (mod_name, branch_name), elapsed, prof))
+                    if error:
+                        failures.append("%s (branch '%s')" % (mod_name, branch_name))
+                        print >> sys.stderr, error
+                        print "Error while updating stats for %s (branch '%s') after %.1fs" % (mod_name, branch_name, elapsed)
+                    else:
+                        print "Updated stats for %s (branch '%s') in %.1fs (%.1fs waiting for lock)" % (
+                            mod_name, branch_name, elapsed, wait_time)
+            if options['jobs'] > 1:
+                pool.close()
+                pool.join()
+            print "Updated %d modules in %.1fs (%d failures)" % (len(jobs), time.time() - start, len(failures))
+            for failure in failures:
+                print "  failed: %s" % failure
 
+        print_profile(profiled)
         return "Update completed.\n"
@@ -21,9 +21,10 @@
 
 from __future__ import with_statement
 import os, sys, re, hashlib
+import errno, fcntl, socket, time, traceback
 import threading
 from time import sleep
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
@@ -31,14 +32,17 @@ from django.core.urlresolvers import reverse
 from django.utils.translation import ungettext, ugettext as _, ugettext_noop
 from django.utils import dateformat
 from django.utils.datastructures import SortedDict
-from django.db import models, connection
+from django.db import models, connection, transaction, IntegrityError
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 
 from common.fields import DictionaryField, JSONField
 from common.utils import is_site_admin
-from stats import utils, signals
+from stats import utils, signals, potdiff
 from stats.doap import update_doap_infos
 from people.models import Person
 from languages.models import Language
+from teams.models import Team, Role
 
 VCS_TYPE_CHOICES = (
     ('cvs', 'CVS'),
@@ -145,31 +149,382 @@ class Module(models.Model):
         else:
             return None
 
+    def mirror_path(self):
+        """ Returns the path of the bare mirror repository shared by all branches (git only) """
+        return os.path.join(settings.SCRATCHDIR, "git", self.name + ".git")
+
+    def update_mirror(self):
+        """ Create or fetch the bare mirror repository of the module (git only) """
+        mirror = self.mirror_path()
+        with ModuleLock(self):
+            if os.access(mirror, os.F_OK):
+                utils.run_command(["git", "fetch", "--prune", "--quiet", "origin"], cwd=mirror,
+                                  raise_on_error=True)
+            else:
+                try: os.makedirs(os.path.dirname(mirror))
+                except: pass
+                utils.run_command(["git", "clone", "--mirror", "--quiet", self.vcs_root, mirror],
+                                  raise_on_error=True)
+
+    def mirror_refs(self):
+        """ Returns a dict of branch name -> commit id from the mirror repository (git only) """
+        mirror = self.mirror_path()
+        if not os.access(mirror, os.F_OK):
+            return {}
+        status, output, errs = utils.run_command(
+            ["git", "for-each-ref", "--format=%(refname) %(objectname)", "refs/heads"], cwd=mirror)
+        refs = {}
+        for line in output.splitlines():
+            refname, rev = line.split()
+            refs[refname[len("refs/heads/"):]] = rev
+        return refs
+
     def can_edit_branches(self, user):
         """ Returns True for superusers, users with adequate permissions or maintainers of the module """
         if is_site_admin(user) or user.username in [ p.username for p in self.maintainers.all() ]:
             return True
         return False
 
-class ModuleLock(object):
-    """ Weird things happen when multiple updates run in parallel for the same module
-        We use filesystem directories creation/deletion to act as global lock mecanism
+class LockTimeout(Exception):
+    pass
+
+class UpdateLock(models.Model):
+    """ Lock held in the database (LOCK_BACKEND = 'db'), for deployments on multiple hosts """
+    name = models.CharField(max_length=150, unique=True)
+    host = models.CharField(max_length=100)
+    pid = models.IntegerField()
+    acquired = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'update_lock'
+
+    def __unicode__(self):
+        return u"%s (%s:%d)" % (self.name, self.host, self.pid)
+
+    def is_stale(self):
+        """ Locks of dead processes of this host, and locks older than LOCK_MAX_AGE seconds
+            (left by crashed processes of other hosts, which cannot be checked) are stale """
+        max_age = getattr(settings, 'LOCK_MAX_AGE', 12 * 3600)
+        if self.acquired < datetime.now() - timedelta(seconds=max_age):
+            return True
+        return is_dead_process(self.host, self.pid)
+
+def is_dead_process(host, pid):
+    """ Only processes of the current host can be checked """
+    if host != socket.gethostname():
+        return False
+    try:
+        os.kill(pid, 0)
+    except OSError, e:
+        return e.errno == errno.ESRCH
+    return False
+
+class NamedLock(object):
+    """ Lock shared by all processes of the site, identified by its name.
+        Two backends are available (LOCK_BACKEND setting):
+         - 'file': fcntl lock on a file in LOCK_DIR, released by the system if the process dies,
+         - 'db': UpdateLock row, stale locks (see UpdateLock.is_stale) are removed.
+        LockTimeout is raised after LOCK_TIMEOUT seconds (None: wait forever). The time spent
+        waiting for the lock is available in the wait_time attribute.
     """
-    def __init__(self, mod):
-        assert isinstance(mod, Module)
-        self.module = mod
+    poll_interval = 0.2
+
+    def __init__(self, name, timeout=None):
+        self.lock_name = name
+        self.timeout = timeout if timeout is not None else getattr(settings, 'LOCK_TIMEOUT', None)
+        self.backend = getattr(settings, 'LOCK_BACKEND', 'file')
+        self.wait_time = 0
 
     def __enter__(self):
-        self.dirpath = os.path.join("/tmp", "updating-%s" % (self.module.name,))
+        start = time.time()
+        if self.backend == 'db':
+            self._acquire_db(start)
+        else:
+            self._acquire_file(start)
+        self.wait_time = time.time() - start
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.backend == 'db':
+            with transaction.commit_on_success():
+                UpdateLock.objects.filter(pk=self.lock.pk).delete()
+        else:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+            self.lock_file.close()
+
+    def _check_timeout(self, start):
+        if self.timeout is not None and time.time() - start > self.timeout:
+            raise LockTimeout("Unable to get lock '%s' after %d seconds" % (self.lock_name, self.timeout))
+        sleep(self.poll_interval)
+
+    def _acquire_file(self, start):
+        lock_dir = getattr(settings, 'LOCK_DIR', "/tmp")
+        self.lock_file = open(os.path.join(lock_dir, self.lock_name + ".lock"), "a+")
+        try:
+            if self.timeout is None:
+                # Blocking call, woken up as soon as the lock is released
+                fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+            else:
+                while True:
+                    try:
+                        fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except IOError, e:
+                        if e.errno not in (errno.EAGAIN, errno.EACCES):
+                            raise
+                        self._check_timeout(start)
+        except:
+            self.lock_file.close()
+            raise
+        # Lock owner, for information only
+        self.lock_file.truncate(0)
+        self.lock_file.write("%s:%d\n" % (socket.gethostname(), os.getpid()))
+        self.lock_file.flush()
+
+    def _acquire_db(self, start):
         while True:
             try:
-                os.mkdir(self.dirpath)
-                break;
-            except OSError:
-                sleep(30)
+                with transaction.commit_on_success():
+                    self.lock = UpdateLock.objects.create(
+                        name=self.lock_name, host=socket.gethostname(), pid=os.getpid())
+                return
+            except IntegrityError:
+                pass
+            with transaction.commit_on_success():
+                for lock in UpdateLock.objects.filter(name=self.lock_name):
+                    if lock.is_stale():
+                        lock.delete()
+                        break
+                else:
+                    self._check_timeout(start)
 
-    def __exit__(self, *exc_info):
-        os.rmdir(self.dirpath)
+class ModuleLock(NamedLock):
+    """ Weird things happen when multiple updates run in parallel for the same module
+        When a branch is given, only this branch of the module is locked (the module
+        lock itself protects operations on the shared git mirror).
+    """
+    def __init__(self, mod, branch=None, timeout=None):
+        assert isinstance(mod, Module)
+        self.module = mod
+        self.branch = branch
+        if self.branch:
+            name = "updating-%s.%s" % (self.module.name, self.branch.name)
+        else:
+            name = "updating-%s" % (self.module.name,)
+        super(ModuleLock, self).__init__(name, timeout)
+
+def fetch_mirrors(modules, max_connections=None):
+    """ Fetch the mirror repositories of the git modules in modules, with at most
+        max_connections simultaneous fetches.
+        Returns a dict module id -> (set of names of branches whose head differs from their
+        last updated revision or whose statistics settings changed since (see
+        Branch.stats_settings_fingerprint), error or None). Branches whose last update failed
+        or was interrupted are thus outdated until they are successfully updated. """
+    def fetch(module):
+        try:
+            module.update_mirror()
+            refs = module.mirror_refs()
+        except Exception, e:
+            return module.id, set(), "%s: %s" % (e.__class__.__name__, e)
+        outdated = set([name for name, (rev, settings_changed) in branches[module.id].items()
+                        if settings_changed or refs.get(name) != rev])
+        return module.id, outdated, None
+
+    git_modules = [mod for mod in modules if mod.vcs_type == 'git']
+    # Read in this thread, worker threads only access the database for ModuleLock (with
+    # LOCK_BACKEND = 'db'), each with its own connection
+    branches = dict([(mod.id, {}) for mod in git_modules])
+    for branch in Branch.objects.filter(module__in=git_modules).select_related('module'):
+        branches[branch.module_id][branch.name] = (
+            branch.vcs_revision, branch.stats_settings_fingerprint() != branch.stats_fingerprint)
+    results = utils.run_in_pool(fetch, git_modules, workers=max_connections or utils.FETCH_CONNECTIONS)
+    return dict([(mod_id, (moved, error)) for mod_id, moved, error in results])
+
+JOB_STATUS_CHOICES = (
+    ('pending', 'Pending'),
+    ('running', 'Running'),
+    ('done', 'Done'),
+    ('failed', 'Failed'),
+)
+
+class StatsJob(models.Model):
+    """ Statistics update of a branch, queued in the database and run by the
+        run-stats-worker command, outside of the web processes.
+        Workers do not start a job of a module which already has a running job. """
+    branch   = models.ForeignKey('Branch')
+    force    = models.BooleanField(default=False)
+    fetch    = models.BooleanField(default=True)
+    # Comma-separated domain names and locales the update is limited to (all if empty)
+    domains   = models.TextField(blank=True)
+    languages = models.TextField(blank=True)
+    # The job is not started before this date (to coalesce successive requests)
+    not_before = models.DateTimeField(null=True, blank=True)
+    status   = models.CharField(max_length=10, choices=JOB_STATUS_CHOICES, default='pending', db_index=True)
+    created  = models.DateTimeField(default=datetime.now)
+    started  = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    error    = models.TextField(blank=True)
+    # Worker running the job
+    host     = models.CharField(max_length=100, blank=True)
+    pid      = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'stats_job'
+        ordering = ('created',)
+
+    def __unicode__(self):
+        return u"%s (%s)" % (self.branch, self.status)
+
+    @classmethod
+    def enqueue(cls, branch, force=False, fetch=True, domains=None, languages=None, delay=0):
+        """ Queue a statistics update of branch, possibly limited to some domains (names)
+            and languages (locales), and not started before delay seconds.
+            A job still pending for the branch is reused instead of adding a new one: its
+            scope is extended to the new one and, for a delayed job, it is postponed again
+            (at most by STATS_JOB_MAX_DELAY seconds after its creation). """
+        now = datetime.now()
+        try:
+            job = cls.objects.filter(branch=branch, status='pending')[0]
+        except IndexError:
+            job = cls(branch=branch, force=force, fetch=fetch, created=now,
+                      domains=",".join(domains or []), languages=",".join(languages or []))
+            if delay:
+                job.not_before = now + timedelta(seconds=delay)
+            job.save()
+            return job
+        job.force = job.force or force
+        job.fetch = job.fetch or fetch
+        job.domains = cls._merge_scope(job.domains, domains)
+        job.languages = cls._merge_scope(job.languages, languages)
+        if not delay:
+            job.not_before = None
+        elif job.not_before:
+            max_delay = timedelta(seconds=getattr(settings, 'STATS_JOB_MAX_DELAY', 600))
+            job.not_before = min(now + timedelta(seconds=delay), job.created + max_delay)
+        job.save()
+        return job
+
+    @staticmethod
+    def _merge_scope(current, names):
+        if not current or not names:
+            # One of the jobs is not limited
+            return ""
+        return ",".join(sorted(set(current.split(",")) | set(names)))
+
+    def get_domains(self):
+        return self.domains and self.domains.split(",") or None
+
+    def get_languages(self):
+        return self.languages and self.languages.split(",") or None
+
+    @classmethod
+    def claim_next(cls, timeout=None):
+        """ Mark the oldest pending job of a module without running job as running,
+            and return it (None if no job can be run now).
+            Claims are serialized by a lock (see NamedLock for timeout), so as two workers
+            cannot start jobs of the same module. """
+        for job in cls.objects.filter(status='running', host=socket.gethostname()):
+            if job.is_stale():
+                job.status = 'failed'
+                job.error = "The worker process %d died while running the job." % job.pid
+                job.finished = datetime.now()
+                job.save()
+        with NamedLock("claiming-stats-job", timeout):
+            with transaction.commit_on_success():
+                busy_modules = cls._busy_modules()
+                ready = models.Q(not_before__isnull=True) | models.Q(not_before__lte=datetime.now())
+                for job in cls.objects.filter(ready, status='pending').exclude(branch__module__in=busy_modules
+                        ).select_related('branch__module'):
+                    claimed = cls.objects.filter(pk=job.pk, status='pending').update(
+                        status='running', started=datetime.now(), host=socket.gethostname(), pid=os.getpid())
+                    if claimed:
+                        return cls.objects.select_related('branch__module').get(pk=job.pk)
+        return None
+
+    @classmethod
+    def _busy_modules(cls):
+        return list(cls.objects.filter(status='running').values_list('branch__module', flat=True))
+
+    def is_stale(self):
+        return is_dead_process(self.host, self.pid)
+
+    def run(self):
+        try:
+            self.branch.update_stats(self.force, fetch=self.fetch,
+                                     domains=self.get_domains(), languages=self.get_languages())
+            self.status = 'done'
+        except:
+            self.status = 'failed'
+            self.error = traceback.format_exc()
+        self.finished = datetime.now()
+        with transaction.commit_on_success():
+            self.save()
+
+    @classmethod
+    def queue_status(cls, since=None):
+        """ Return a dict with the number of pending and running jobs, the age of the
+            oldest pending job, and the average waiting and running times (in seconds)
+            of the jobs finished since the 'since' datetime (last 24 hours by default) """
+        now = datetime.now()
+        since = since or now - timedelta(days=1)
+        pending = cls.objects.filter(status='pending')
+        finished = cls.objects.filter(finished__gte=since).exclude(started__isnull=True)
+        waits, runs = [], []
+        for created, started, ended in finished.values_list('created', 'started', 'finished'):
+            waits.append(total_seconds(started - created))
+            runs.append(total_seconds(ended - started))
+        oldest = pending.order_by('created').values_list('created', flat=True)[:1]
+        return {
+            'pending': pending.count(),
+            'running': cls.objects.filter(status='running').count(),
+            'oldest_pending': oldest and total_seconds(now - oldest[0]) or 0,
+            'finished': len(runs),
+            'failed': finished.filter(status='failed').count(),
+            'avg_wait': waits and sum(waits) / len(waits) or 0,
+            'avg_run': runs and sum(runs) / len(runs) or 0,
+        }
+
+    @classmethod
+    def clean_old_jobs(cls, days):
+        """ Delete finished jobs older than days """
+        cls.objects.filter(status__in=('done', 'failed'),
+                           finished__lt=datetime.now() - timedelta(days=days)).delete()
+
+def total_seconds(delta):
+    # timedelta.total_seconds() is only available from Python 2.7
+    return delta.days * 86400 + delta.seconds + delta.microseconds / 1e6
+
+class StatsRun(models.Model):
+    """ Profile of a statistics update of a branch, recorded when profiling is enabled
+        (STATS_PROFILE setting or update-stats --profile) """
+    branch   = models.ForeignKey('Branch')
+    started  = models.DateTimeField()
+    duration = models.FloatField()
+    spawned_commands = models.IntegerField(default=0)
+    # List of (step name, calls, seconds), most time consuming steps first
+    steps    = JSONField(blank=True, null=True)
+    # List of (tool, calls, seconds, failures, timeouts), most time consuming tools first
+    commands = JSONField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'stats_run'
+        ordering = ('-started',)
+
+    def __unicode__(self):
+        return u"%s (%s, %.1fs)" % (self.branch, self.started, self.duration)
+
+    @classmethod
+    def record(cls, branch):
+        profiler = branch.profiler
+        commands = profiler.commands()
+        return cls.objects.create(
+            branch=branch, started=datetime.fromtimestamp(profiler.start),
+            duration=profiler.time_spent(), spawned_commands=sum([command[1] for command in commands]),
+            steps=profiler.ranked_steps(), commands=commands)
+
+    @classmethod
+    def clean_old_runs(cls, days):
+        cls.objects.filter(started__lt=datetime.now() - timedelta(days=days)).delete()
 
 class Branch(models.Model):
     """ Branch of a module """
@@ -179,6 +534,11 @@ class Branch(models.Model):
     module      = models.ForeignKey(Module)
     weight      = models.IntegerField(default=0, help_text="Smaller weight is displayed first")
     file_hashes = DictionaryField(default='', blank=True, editable=False)
+    # Commit id and settings fingerprint of the last statistics update (git only)
+    vcs_revision = models.CharField(max_length=40, null=True, blank=True, editable=False)
+    stats_fingerprint = models.CharField(max_length=40, null=True, blank=True, editable=False)
+    # Incremented each time statistics of the branch change (see stats_changed)
+    stats_generation = models.IntegerField(default=0, editable=False)
     # 'releases' is the backward relation name from Release model
 
     # May be set to False by test suite
@@ -193,12 +553,19 @@ class Branch(models.Model):
     def __init__(self, *args, **kwargs):
         models.Model.__init__(self, *args, **kwargs)
         self.checkout_lock = threading.Lock()
+        # Time spent waiting for the lock during the last update_stats call
+        self.lock_wait_time = 0
         self._ui_stats = None
         self._doc_stats = None
 
     def __unicode__(self):
         return "%s (%s)" % (self.name, self.module)
 
+    @classmethod
+    def stats_changed(cls, branches):
+        """ Increment the statistics generation of branches (a Branch queryset) """
+        branches.update(stats_generation=models.F('stats_generation') + 1)
+
     def clean(self):
         if self.checkout_on_creation:
             try:
@@ -209,9 +576,8 @@ class Branch(models.Model):
     def save(self, force_insert=False, force_update=False, update_statistics=True):
         super(Branch, self).save(force_insert, force_update)
         if update_statistics:
-            # The update command is launched asynchronously in a separate thread
-            upd_thread = threading.Thread(target=self.update_stats, kwargs={'force':True})
-            upd_thread.start()
+            # The update is run asynchronously by a stats worker (see StatsJob)
+            StatsJob.enqueue(self, force=True)
 
     def delete(self):
         import shutil # os.rmdir cannot delete non-empty dirs
@@ -220,15 +586,11 @@ class Branch(models.Model):
             if os.access(self.co_path(), os.W_OK):
                 shutil.rmtree(self.co_path())
         elif self.module.vcs_type == 'git':
-            if self.is_head():
-                if os.access(self.co_path(), os.W_OK):
-                    shutil.rmtree(self.co_path())
-            else:
-                cmd = "cd \"%(localdir)s\" && git checkout master && git branch -D %(branch)s" % {
-                    'localdir': self.co_path(),
-                    'branch': self.name,
-                }
-                utils.run_shell_command(cmd)
+            # Remove the worktree of the branch, the module mirror is kept
+            if os.access(self.co_path(), os.W_OK):
+                shutil.rmtree(self.co_path())
+            if os.access(self.module.mirror_path(), os.W_OK):
+                utils.run_command(["git", "worktree", "prune"], cwd=self.module.mirror_path())
         #To be implemented for hg/bzr
 
         # Remove the pot/po generated files
@@ -307,7 +669,7 @@ class Branch(models.Model):
 
     def co_path(self):
         """ Returns the path of the local checkout for the branch """
-        if self.module.vcs_type in ('hg', 'git'):
+        if self.module.vcs_type == 'hg' or (self.module.vcs_type == 'git' and self.is_head()):
             branch_dir = self.module.name
         else:
             branch_dir = self.module.name + "." + self.name
@@ -371,132 +733,136 @@ class Branch(models.Model):
             self._ui_stats = self.get_stats('ui', mandatory_langs)
         return self._ui_stats
 
-    def update_stats(self, force, checkout=True):
-        """ Update statistics for all po files from the branch """
-        with ModuleLock(self.module):
-            if checkout:
-                self.checkout()
-            domains = Domain.objects.filter(module=self.module).all()
-            string_frozen = self.has_string_frozen()
-            for dom in domains:
-                # 1. Initial settings
-                # *******************
-                domain_path = os.path.join(self.co_path(), dom.directory)
-                if not os.access(domain_path, os.X_OK):
-                    # Delete existing stats, if any
-                    Statistics.objects.filter(branch=self, domain=dom).delete()
+    def update_lock(self):
+        """ Return the lock protecting updates of the branch checkout: git branches have their
+            own worktree, branches of other VCS types share the checkout of the module """
+        if self.module.vcs_type == 'git':
+            return ModuleLock(self.module, self)
+        return ModuleLock(self.module)
+
+    def update_stats(self, force, checkout=True, fetch=True, domains=None, languages=None,
+                     reuse_pot=False, profile=None):
+        """ Update statistics for all po files from the branch
+            If fetch is False, the git mirror of the module is supposed to be already up to date
+            domains (domain names) and languages (locales) can limit the update to some po files.
+            POT files are still generated: if a POT file changed, all its po files are updated.
+            With reuse_pot (and languages), the POT files stored by the last update are reused
+            instead, when the checkout is known to contain the same sources.
+            The time spent in each step is available in the profiler attribute, and stored as
+            a StatsRun if profile is True (default: STATS_PROFILE setting). """
+        self.profiler = utils.Profiler()
+        if profile is None:
+            profile = getattr(settings, 'STATS_PROFILE', False)
+        try:
+            with self.update_lock() as lock:
+                self.lock_wait_time = lock.wait_time
+                self.profiler.add('lock wait', lock.wait_time)
+                revision = fingerprint = None
+                if checkout:
+                    if self.module.vcs_type == 'git':
+                        if fetch or not os.access(self.module.mirror_path(), os.F_OK):
+                            with self.profiler.step('fetch'):
+                                self.module.update_mirror()
+                            fetch = False
+                        revision = self.mirror_revision()
+                        fingerprint = self.stats_settings_fingerprint()
+                        if not force and revision and self._exists() and revision == self.vcs_revision \
+                           and fingerprint == self.stats_fingerprint:
+                            # Nothing changed since last update
+                            return
+                    with self.profiler.step('checkout'):
+                        self.checkout(fetch=fetch)
+                # Release summaries are refreshed once for all statistics of the branch
+                with SummaryBatch():
+                    self._update_stats(force, domains, languages, reuse_pot)
+                if revision and domains is None and languages is None:
+                    # Partial updates leave other files of the revision unprocessed
+                    self.vcs_revision, self.stats_fingerprint = revision, fingerprint
+                    self.save(update_statistics=False)
+        finally:
+            if profile:
+                StatsRun.record(self)
+
+    def mirror_revision(self):
+        """ Returns the commit id of the branch in the module mirror (git only) """
+        status, output, errs = utils.run_command(
+            ["git", "rev-parse", "--verify", "--quiet", "refs/heads/%s" % self.name],
+            cwd=self.module.mirror_path())
+        return status == utils.STATUS_OK and output.strip() or None
+
+    def stats_settings_fingerprint(self):
+        """ Returns a digest of everything influencing statistics beside the repository content:
+            tool versions, domain definitions and branch status """
+        h = hashlib.sha1(str(utils.StatsCache.version))
+        h.update(utils.get_tool_version("msgmerge"))
+        h.update(repr(self.is_archive_only()))
+        for dom in Domain.objects.filter(module=self.module).order_by('id'):
+            h.update(repr((dom.name, dom.dtype, dom.directory, dom.pot_method,
+                           dom.linguas_location, dom.red_filter)))
+        return h.hexdigest()
+
+    def _update_stats(self, force, domain_names=None, languages=None, reuse_pot=False):
+        """ Update statistics from the current checkout (called with the branch lock held) """
+        domains = Domain.objects.filter(module=self.module).all()
+        if domain_names is not None:
+            domains = domains.filter(name__in=domain_names)
+        string_frozen = self.has_string_frozen()
+        # Reduced po files are not generated for archived branches
+        reduce_po = not self.is_archive_only()
+        stats_cache = utils.StatsCache()
+        for dom in domains:
+            # 1. Initial settings
+            # *******************
+            domain_path = os.path.join(self.co_path(), dom.directory)
+            if not os.access(domain_path, os.X_OK):
+                # Delete existing stats, if any
+                Statistics.objects.filter(branch=self, domain=dom).delete()
+                continue
+            if dom.dtype not in ('ui', 'doc'):
+                print >> sys.stderr, "Unknown domain type '%s', ignoring domain '%s'" % (dom.dtype, dom.name)
+                continue
+            previous_pot = os.path.join(self.output_dir(dom.dtype), dom.potbase() + "." + self.name + ".pot")
+            pot_method = dom.pot_method
+            if not pot_method and dom.dtype == 'doc':
+                pot_method = utils.get_doc_format(domain_path)
+            linguas = dom.get_linguas(self.co_path())
+            if reuse_pot and languages is not None and os.access(previous_pot, os.R_OK):
+                # Only some po files are updated, the POT file of the last update is reused
+                potfile, changed_status = previous_pot, utils.NOT_CHANGED
+                pot_hash = utils.compute_md5(potfile)
+            else:
+                result = self._update_pot(dom, domain_path, previous_pot, pot_method, linguas,
+                                          force, string_frozen, stats_cache)
+                if result is None:
                     continue
-                errors = []
-
-                # 2. Pre-check, if available (intltool-update -m)
-                # **************************
-                if dom.dtype == 'ui' and not dom.pot_method:
-                    # Run intltool-update -m to check for some errors
-                    errors.extend(utils.check_potfiles(domain_path))
-
-                # 3. Generate a fresh pot file
-                # ****************************
-                pot_method = dom.pot_method
-                if dom.dtype == 'ui':
-                    potfile, errs = dom.generate_pot_file(self)
-                elif dom.dtype == 'doc':
-                    if dom.pot_method:
-                        potfile, errs = dom.generate_pot_file(self)
-                    else:
-                        # Standard gnome-doc-utils pot generation
-                        potfile, errs, pot_method = utils.generate_doc_pot_file(
-                            domain_path, dom.potbase(), self.module.name)
-                else:
-                    print >> sys.stderr, "Unknown domain type '%s', ignoring domain '%s'" % (dom.dtype, dom.name)
+                potfile, pot_method, pot_hash, changed_status = result
+
+            # 7. Update language po files and update DB
+            # *****************************************
+            stats_with_ext_errors = Statistics.objects.filter(branch=self, domain=dom, information__type__endswith='-ext')
+            langs_with_ext_errors = [stat.language.locale for stat in stats_with_ext_errors]
+            dom_langs = dom.get_lang_files(self.co_path())
+            lang_jobs = []
+            pot_changed = changed_status not in (utils.NOT_CHANGED, utils.CHANGED_ONLY_FORMATTING)
+            for lang, pofile in dom_langs:
+                if languages is not None and lang not in languages and not pot_changed:
                     continue
-                errors.extend(errs)
-                linguas = dom.get_linguas(self.co_path())
-                if linguas['langs'] is None and linguas['error']:
-                    errors.append(("warn", linguas['error']))
-
-                # Prepare statistics object
-                try:
-                    pot_stat = Statistics.objects.get(language=None, branch=self, domain=dom)
-                    Information.objects.filter(statistics=pot_stat).delete() # Reset errors
-                except Statistics.DoesNotExist:
-                    pot_stat = Statistics(language=None, branch=self, domain=dom)
-                    pot_stat.save()
-
-                # 4. Compare with old pot files, various checks
-                # *****************************
-                previous_pot = os.path.join(self.output_dir(dom.dtype), dom.potbase() + "." + self.name + ".pot")
-                if not potfile:
-                    if settings.DEBUG: print >> sys.stderr, "Can't generate POT file for %s/%s." % (self.module.name, dom.directory)
-                    if os.access(previous_pot, os.R_OK):
-                        # Use old POT file
-                        potfile = previous_pot
-                        errors.append(("error", ugettext_noop("Can't generate POT file, using old one.")))
-                    else:
-                        errors.append(("error", ugettext_noop("Can't generate POT file, statistics aborted.")))
-                        pot_stat.set_errors(errors)
-                        continue
-
-                # 5. Check if pot changed
-                # ***********************************
-                changed_status = utils.CHANGED_WITH_ADDITIONS
-
-                if os.access(previous_pot, os.R_OK):
-                    # Compare old and new POT
-                    changed_status, diff = utils.pot_diff_status(previous_pot, potfile)
-                    if string_frozen and dom.dtype == 'ui' and changed_status == utils.CHANGED_WITH_ADDITIONS:
-                        utils.notify_list("%s.%s" % (self.module.name, self.name), diff)
-
-                # 6. Generate pot stats and update DB
-                # ***********************************
-                pot_stats = utils.po_file_stats(potfile, msgfmt_checks=False)
-                fig_stats = utils.get_fig_stats(potfile, pot_method, trans_stats=False)
-                errors.extend(pot_stats['errors'])
-                if potfile != previous_pot and not utils.copy_file(potfile, previous_pot):
-                    errors.append(('error', ugettext_noop("Can't copy new POT file to public location.")))
-
-                pot_stat.set_translation_stats(
-                    previous_pot,
-                    untranslated=int(pot_stats['untranslated']),
-                    untranslated_words = int(pot_stats['untranslated_words']),
-                    figstats = fig_stats,
-                )
-                pot_stat.set_errors(errors)
+                outpo = os.path.join(self.output_dir(dom.dtype), dom.potbase() + "." + self.name + "." + lang + ".po")
 
-                # Send pot_has_changed signal
-                if os.access(previous_pot, os.R_OK) and changed_status != utils.NOT_CHANGED:
-                    signals.pot_has_changed.send(sender=self, potfile=potfile, branch=self, domain=dom)
-
-                # 7. Update language po files and update DB
-                # *****************************************
-                command = "msgmerge --previous -o %(outpo)s %(pofile)s %(potfile)s"
-                stats_with_ext_errors = Statistics.objects.filter(branch=self, domain=dom, information__type__endswith='-ext')
-                langs_with_ext_errors = [stat.language.locale for stat in stats_with_ext_errors]
-                dom_langs = dom.get_lang_files(self.co_path())
-                for lang, pofile in dom_langs:
-                    outpo = os.path.join(self.output_dir(dom.dtype), dom.potbase() + "." + self.name + "." + lang + ".po")
-
-                    if not force and changed_status in (utils.NOT_CHANGED, utils.CHANGED_ONLY_FORMATTING) and os.access(outpo, os.R_OK) \
-                       and os.stat(pofile)[8] < os.stat(outpo)[8] and not lang in langs_with_ext_errors :
-                        continue
-
-                    realcmd = command % {
-                        'outpo' : outpo,
-                        'pofile' : pofile,
-                        'potfile' : potfile,
-                        }
-                    utils.run_shell_command(realcmd)
-
-                    langstats = utils.po_file_stats(outpo, msgfmt_checks=True)
-                    if linguas['langs'] is not None and lang not in linguas['langs']:
-                        langstats['errors'].append(("warn-ext", linguas['error']))
-                    fig_stats = None
-                    if dom.dtype == "doc":
-                        fig_stats = utils.get_fig_stats(outpo, pot_method)
-                        fig_errors = utils.check_identical_figures(fig_stats, domain_path, lang)
-                        langstats['errors'].extend(fig_errors)
-
-                    if settings.DEBUG: print >>sys.stderr, lang + ":\n" + str(langstats)
-                    # Save in DB
+                if not force and not pot_changed and os.access(outpo, os.R_OK) \
+                   and os.stat(pofile)[8] < os.stat(outpo)[8] and not lang in langs_with_ext_errors :
+                    continue
+                lang_jobs.append((lang, pofile, outpo))
+
+            # msgmerge, msgfmt and friends are run in parallel for each language,
+            # database is only updated afterwards, in a single transaction.
+            lang_results = utils.run_in_pool(
+                lambda job: self._update_lang_file(dom, job[0], job[1], job[2], potfile, pot_method,
+                                                   linguas, domain_path, reduce_po, stats_cache, pot_hash),
+                lang_jobs)
+            db_start = time.time()
+            with transaction.commit_on_success():
+                for lang, outpo, langstats, fig_stats, reduced in lang_results:
                     try:
                         stat = Statistics.objects.get(language__locale=lang, branch=self, domain=dom)
                         Information.objects.filter(statistics=stat).delete()
@@ -509,6 +875,8 @@ class Branch(models.Model):
                                 language.save()
                             else:
                                 # Do not create language (and therefore ignore stats) for an 'old' branch
+                                if reduced:
+                                    os.remove(reduced[0])
                                 continue
                         stat = Statistics(language = language, branch = self, domain = dom)
                         stat.save()
@@ -519,30 +887,210 @@ class Branch(models.Model):
                                                translated_words = int(langstats['translated_words']),
                                                fuzzy_words = int(langstats['fuzzy_words']),
                                                untranslated_words = int(langstats['untranslated_words']),
-                                               figstats=fig_stats)
+                                               figstats=fig_stats,
+                                               reduced=reduced)
                     for err in langstats['errors']:
                         stat.information_set.add(Information(type=err[0], description=err[1]))
-                # Delete stats for unexisting langs
-                Statistics.objects.filter(branch=self, domain=dom
-                    ).exclude(models.Q(language__isnull=True) | models.Q(language__locale__in=[dl[0] for dl in dom_langs])
-                    ).delete()
-            # Check if doap file changed
-            if self.is_head() and self.file_changed("%s.doap" % self.module.name):
-                update_doap_infos(self.module)
+            self.profiler.add('db write', time.time() - db_start, calls=len(lang_results))
+            # Delete stats for unexisting langs
+            Statistics.objects.filter(branch=self, domain=dom
+                ).exclude(models.Q(language__isnull=True) | models.Q(language__locale__in=[dl[0] for dl in dom_langs])
+                ).delete()
+        # Check if doap file changed
+        if self.is_head() and self.file_changed("%s.doap" % self.module.name):
+            update_doap_infos(self.module)
+
+    def _update_pot(self, dom, domain_path, previous_pot, pot_method, linguas, force, string_frozen, stats_cache):
+        """ Steps 2 to 6 of _update_stats: generate the POT file of dom and update its statistics.
+            Returns a (potfile, pot_method, pot_hash, changed_status) tuple, or None
+            if no POT file is available """
+        errors = []
+        # When the inputs of the standard POT generation did not change since
+        # the last run, steps 2 and 3 are skipped and the previous POT is reused.
+        pot_inputs = None
+        if not dom.pot_method:
+            if dom.dtype == 'doc':
+                pot_inputs = utils.pot_inputs_fingerprint(domain_path, pot_method)
+            else:
+                pot_inputs = utils.pot_inputs_fingerprint(domain_path, None, self.module.get_bugs_enter_url())
+        inputs_key = "%s:pot-inputs" % dom.name
+        previous_inputs = self.file_hashes.get(inputs_key)
+        if not force and pot_inputs and previous_inputs and previous_inputs['hash'] == pot_inputs \
+           and os.access(previous_pot, os.R_OK):
+            potfile = previous_pot
+            errors.extend([tuple(err) for err in previous_inputs['errors']])
+        else:
+            # 2. Pre-check, if available (intltool-update -m)
+            # **************************
+            if dom.dtype == 'ui' and not dom.pot_method:
+                # Run intltool-update -m to check for some errors
+                with self.profiler.step('potfiles check'):
+                    errors.extend(utils.check_potfiles(domain_path))
+
+            # 3. Generate a fresh pot file
+            # ****************************
+            with self.profiler.step('pot generation'):
+                if dom.dtype == 'ui' or dom.pot_method:
+                    potfile, errs = dom.generate_pot_file(self)
+                else:
+                    # Standard gnome-doc-utils pot generation
+                    potfile, errs, pot_method = utils.generate_doc_pot_file(
+                        domain_path, dom.potbase(), self.module.name)
+            errors.extend(errs)
+            if pot_inputs and potfile:
+                self.file_hashes[inputs_key] = {'hash': pot_inputs, 'errors': errors[:]}
+                self.save(update_statistics=False)
+            elif inputs_key in self.file_hashes:
+                del self.file_hashes[inputs_key]
+                self.save(update_statistics=False)
+
+        if linguas['langs'] is None and linguas['error']:
+            errors.append(("warn", linguas['error']))
+
+        # Prepare statistics object
+        try:
+            pot_stat = Statistics.objects.get(language=None, branch=self, domain=dom)
+            Information.objects.filter(statistics=pot_stat).delete() # Reset errors
+        except Statistics.DoesNotExist:
+            pot_stat = Statistics(language=None, branch=self, domain=dom)
+            pot_stat.save()
+
+        # 4. Compare with old pot files, various checks
+        # *****************************
+        if not potfile:
+            if settings.DEBUG: print >> sys.stderr, "Can't generate POT file for %s/%s." % (self.module.name, dom.directory)
+            if os.access(previous_pot, os.R_OK):
+                # Use old POT file
+                potfile = previous_pot
+                errors.append(("error", ugettext_noop("Can't generate POT file, using old one.")))
+            else:
+                errors.append(("error", ugettext_noop("Can't generate POT file, statistics aborted.")))
+                pot_stat.set_errors(errors)
+                return None
+
+        # 5. Check if pot changed
+        # ***********************************
+        changed_status = utils.CHANGED_WITH_ADDITIONS
+        with self.profiler.step('pot diff'):
+            try:
+                pot_fingerprint = potdiff.fingerprint(potfile)
+            except ValueError:
+                # Unparsable POT file, errors are reported by po_file_stats
+                pot_fingerprint = None
+
+            if pot_fingerprint and os.access(previous_pot, os.R_OK):
+                # Compare old and new POT
+                changed_status, diff = utils.pot_diff_status(previous_pot, potfile, pot_fingerprint)
+                if string_frozen and dom.dtype == 'ui' and changed_status == utils.CHANGED_WITH_ADDITIONS:
+                    utils.notify_list("%s.%s" % (self.module.name, self.name), diff)
+
+        # 6. Generate pot stats and update DB
+        # ***********************************
+        pot_hash = utils.compute_md5(potfile)
+        pot_key = stats_cache.make_key('pot', pot_hash, pot_method)
+        cached = stats_cache.get(pot_key)
+        if cached:
+            pot_stats, fig_stats = cached['stats'], cached['figures']
+            pot_stats['errors'] = [tuple(err) for err in pot_stats['errors']]
+        else:
+            with self.profiler.step('pot stats'):
+                pot_stats = utils.po_file_stats(potfile, msgfmt_checks=False)
+            with self.profiler.step('figures'):
+                fig_stats = utils.get_fig_stats(potfile, pot_method, trans_stats=False)
+            stats_cache.set(pot_key, {'stats': pot_stats, 'figures': fig_stats})
+        errors.extend(pot_stats['errors'])
+        if potfile != previous_pot and not utils.copy_file(potfile, previous_pot):
+            errors.append(('error', ugettext_noop("Can't copy new POT file to public location.")))
+        elif pot_fingerprint:
+            potdiff.save_fingerprint(previous_pot, pot_fingerprint[0])
+
+        pot_stat.set_translation_stats(
+            previous_pot,
+            untranslated=int(pot_stats['untranslated']),
+            untranslated_words = int(pot_stats['untranslated_words']),
+            figstats = fig_stats,
+        )
+        pot_stat.set_errors(errors)
+
+        # Send pot_has_changed signal
+        if os.access(previous_pot, os.R_OK) and changed_status != utils.NOT_CHANGED:
+            signals.pot_has_changed.send(sender=self, potfile=potfile, branch=self, domain=dom)
+        return potfile, pot_method, pot_hash, changed_status
+
+    def _update_lang_file(self, dom, lang, pofile, outpo, potfile, pot_method, linguas, domain_path,
+                          reduce_po, stats_cache, pot_hash):
+        """ Merge the po file of lang with the pot file and compute its statistics.
+            No database access happens here, so as this can run in a worker thread.
+            Returns a (lang, outpo, langstats, fig_stats, reduced) tuple, where
+            reduced is the result of utils.generate_reduced_po, or False when there is no
+            reduced po file (never None, so as the reduction is not run again) """
+        # outpo is part of the key: the cached entry refers to files of this branch only
+        cache_key = stats_cache.make_key('po', outpo, utils.compute_md5(pofile), pot_hash, dom.dtype,
+                                         pot_method, reduce_po and dom.red_filter)
+        cached = stats_cache.get(cache_key)
+        if cached and not self._cached_files_valid(cached, outpo):
+            cached = None
+        if cached:
+            langstats, fig_stats = cached['stats'], cached['figures']
+            langstats['errors'] = [tuple(err) for err in langstats['errors']]
+            reduced = cached['reduced'] and tuple(cached['reduced'][:2]) or False
+        else:
+            with self.profiler.step('msgmerge'):
+                utils.run_command(["msgmerge", "--previous", "-o", outpo, pofile, potfile])
+
+            with self.profiler.step('po stats'):
+                langstats = utils.po_file_stats(outpo, msgfmt_checks=True)
+            fig_stats = None
+            reduced = False
+            if dom.dtype == "doc":
+                with self.profiler.step('figures'):
+                    fig_stats = utils.get_fig_stats(outpo, pot_method)
+            elif reduce_po and (langstats['fuzzy'] + langstats['untranslated']) > 0:
+                with self.profiler.step('reduce'):
+                    reduced = utils.generate_reduced_po(outpo, dom.red_filter,
+                        langstats['translated'] + langstats['fuzzy'] + langstats['untranslated']) or False
+            if os.access(outpo, os.R_OK):
+                stats_cache.set(cache_key, {
+                    'stats': langstats,
+                    'figures': fig_stats,
+                    'output_hash': utils.compute_md5(outpo),
+                    'reduced': reduced and [reduced[0], reduced[1], utils.compute_md5(reduced[0])] or None,
+                })
+
+        # Those checks depend on other files than the po file
+        if linguas['langs'] is not None and lang not in linguas['langs']:
+            langstats['errors'].append(("warn-ext", linguas['error']))
+        if dom.dtype == "doc":
+            fig_errors = utils.check_identical_figures(fig_stats, domain_path, lang)
+            langstats['errors'].extend(fig_errors)
+
+        if settings.DEBUG: print >>sys.stderr, lang + ":\n" + str(langstats)
+        return lang, outpo, langstats, fig_stats, reduced
+
+    def _cached_files_valid(self, cached, outpo):
+        """ Check that the files produced when the cache entry was computed are still in place """
+        if not os.access(outpo, os.R_OK) or utils.compute_md5(outpo) != cached['output_hash']:
+            return False
+        if cached['reduced']:
+            reduced_path = cached['reduced'][0]
+            if not os.access(reduced_path, os.R_OK) or utils.compute_md5(reduced_path) != cached['reduced'][2]:
+                return False
+        return True
 
     def _exists(self):
         """ Determine if branch (self) already exists (i.e. already checked out) on local FS """
         if self.module.vcs_type == 'git':
-            command = "cd %s && git branch | grep %s" % (self.co_path(), self.name)
-            status, output, errs = utils.run_shell_command(command)
-            return output != ""
+            # A worktree has a .git file pointing to the mirror repository
+            return os.path.isfile(os.path.join(self.co_path(), ".git"))
         elif self.module.vcs_type == 'hg':
             return self.id != None and os.access(self.co_path(), os.X_OK | os.W_OK)
         else:
             return os.access(self.co_path(), os.X_OK | os.W_OK)
 
-    def checkout(self):
+    def checkout(self, fetch=True):
         """ Do a checkout or an update of the VCS files """
+        if self.module.vcs_type == "git":
+            return self._checkout_git(fetch)
         module_name = self.module.name
         vcs_type = self.module.vcs_type
         localroot = os.path.join(settings.SCRATCHDIR, vcs_type)
@@ -567,12 +1115,6 @@ class Branch(models.Model):
                 commandList.append("cd \"%(localdir)s\" && hg revert --all" % {
                     "localdir" : modulepath,
                     })
-            elif vcs_type == "git":
-                # tester "cd \"%(localdir)s\" && git checkout %(branch)s && git clean -dfq && git pull origin/%(branch)s"
-                commandList.append("cd \"%(localdir)s\" && git checkout %(branch)s && git fetch && git reset --hard origin/%(branch)s && git clean -dfq" % {
-                    "localdir" : modulepath,
-                    "branch" : self.name,
-                    })
             elif vcs_type == "bzr":
                 commandList.append("cd \"%(localdir)s\" && bzr up" % {
                     "localdir" : modulepath,
@@ -580,7 +1122,7 @@ class Branch(models.Model):
         else:
             # Checkout
             vcs_path = self.get_vcs_url()
-            if vcs_type in ('hg', 'git'):
+            if vcs_type == 'hg':
                 moduledir = self.module.name
             else:
                 moduledir = self.module.name + "." + self.name
@@ -609,23 +1151,6 @@ class Branch(models.Model):
                     "localdir" : modulepath,
                     "branch" : self.name,
                     })
-            elif vcs_type == "git":
-                # We are assuming here that master is the first branch created
-                if self.name == "master":
-                    commandList.append("cd \"%(localroot)s\" && git clone %(gitpath)s \"%(dir)s\"" % {
-                        "localroot" : localroot,
-                        "gitpath" : vcs_path,
-                        "dir" : moduledir,
-                        })
-                    commandList.append("cd \"%(localdir)s\" && git remote update && git checkout %(branch)s" % {
-                        "localdir" : modulepath,
-                        "branch" : self.name,
-                        })
-                else:
-                    commandList.append("cd \"%(localdir)s\" && git pull && git checkout --track -b %(branch)s  origin/%(branch)s" % {
-                        "localdir" : modulepath,
-                        "branch" : self.name,
-                        })
             elif vcs_type == "bzr":
                 commandList.append("cd \"%(localroot)s\" && bzr co --lightweight %(bzrpath)s \"%(dir)s\"" % {
                     "localroot" : localroot,
@@ -645,6 +1170,37 @@ class Branch(models.Model):
             self.checkout_lock.release()
         return 1
 
+    def _checkout_git(self, fetch=True):
+        """ Update the worktree of the branch from the module mirror repository.
+            All branches share the objects of the mirror, each one having its own
+            worktree, so as different branches can be updated in parallel. """
+        mirror = self.module.mirror_path()
+        modulepath = self.co_path()
+        if fetch or not os.access(mirror, os.F_OK):
+            self.module.update_mirror()
+        if os.path.isdir(os.path.join(modulepath, ".git")):
+            # Full clone from before mirror repositories were used
+            import shutil
+            shutil.rmtree(modulepath)
+
+        if settings.DEBUG:
+            print >>sys.stdout, "Checking '%s.%s' out to '%s'..." % (self.module.name, self.name, modulepath)
+        # Do not allow 2 checkouts to run in parallel on the same branch
+        self.checkout_lock.acquire()
+        try:
+            if self._exists():
+                utils.run_command(["git", "reset", "--hard", "--quiet", "refs/heads/%s" % self.name],
+                                  cwd=modulepath, raise_on_error=True)
+                utils.run_command(["git", "clean", "-dfq"], cwd=modulepath, raise_on_error=True)
+            else:
+                with ModuleLock(self.module):
+                    utils.run_command(["git", "worktree", "prune"], cwd=mirror, raise_on_error=True)
+                    utils.run_command(["git", "worktree", "add", "--detach", modulepath,
+                                       "refs/heads/%s" % self.name], cwd=mirror, raise_on_error=True)
+        finally:
+            self.checkout_lock.release()
+        return 1
+
     def commit_po(self, po_file, domain, language, user):
         """ Commit the file 'po_file' in the branch VCS repository """
         if self.is_vcs_readonly():
@@ -657,25 +1213,20 @@ class Branch(models.Model):
         commit_dir = os.path.join(self.co_path(), domain.directory)
         dest_filename = "%s.po" % locale
         dest_path = os.path.join(commit_dir, dest_filename)
-        already_exist = os.access(dest_path, os.F_OK)
-
-        # Copy file in repo
-        utils.copy_file(po_file, dest_path)
 
         if vcs_type == "git":
-            var_dict = {
-                'dest':    commit_dir,
-                'branch':  self.name,
-                'po_file': dest_filename,
-                'lg_file': "LINGUAS",
-                'name':    user.name,
-                'email':   user.email,
-                'msg':     "Updated %s translation" % language.name,
-            }
-            with ModuleLock(self.module):
-                utils.run_shell_command("cd \"%(dest)s\" && git checkout %(branch)s" % var_dict, raise_on_error=True)
+            def git(*args):
+                utils.run_command(["git"] + list(args), cwd=commit_dir, raise_on_error=True)
+            msg = u"Updated %s translation" % language.name
+            with self.update_lock():
+                # Reset the worktree to the freshly fetched head of the branch, so as the
+                # commit is not based on a stale revision
+                self.checkout(fetch=True)
+                already_exist = os.access(dest_path, os.F_OK)
+                # Copy file in repo
+                utils.copy_file(po_file, dest_path)
                 # git add file.po
-                utils.run_shell_command("cd \"%(dest)s\" && git add %(po_file)s" % var_dict, raise_on_error=True)
+                git("add", dest_filename)
                 if not already_exist:
                     # Add locale to LINGUAS
                     linguas_file = os.path.join(commit_dir, "LINGUAS")
@@ -691,15 +1242,19 @@ class Branch(models.Model):
                         fout.close()
                         fin.close()
                         os.rename(linguas_file+"~", linguas_file)
-                        utils.run_shell_command("cd \"%(dest)s\" && git add %(lg_file)s" % var_dict, raise_on_error=True)
-                    var_dict['msg'] = "Added %s translation" % language.name
+                        git("add", "LINGUAS")
+                    msg = u"Added %s translation" % language.name
                 # git commit -m "Updated %s translation."
-                utils.run_shell_command("cd \"%(dest)s\" && git commit -m \"%(msg)s\" --author \"%(name)s <%(email)s>\"" % var_dict,
-                    raise_on_error=True)
-                # git push
-                utils.run_shell_command("cd \"%(dest)s\" && git push" % var_dict, raise_on_error=True)
-        # Finish by updating stats
-        self.update_stats(force=False)
+                git("commit", "-m", msg.encode('utf-8'),
+                    "--author", (u"%s <%s>" % (user.name, user.email)).encode('utf-8'))
+                # git push (the mirror has no regular remote branches, so push to the URL)
+                git("push", self.module.vcs_root, "HEAD:refs/heads/%s" % self.name)
+                # Update the mirror ref without waiting for the next fetch
+                git("update-ref", "refs/heads/%s" % self.name, "HEAD")
+        # Finish by updating stats of the committed file (the mirror ref is already up to date).
+        # Commits of other languages following shortly are coalesced in the same update.
+        StatsJob.enqueue(self, fetch=False, domains=[domain.name], languages=[locale],
+                         delay=getattr(settings, 'STATS_COMMIT_DELAY', 60))
 
 
 DOMAIN_TYPE_CHOICES = (
@@ -781,7 +1336,7 @@ class Domain(models.Model):
         env = None
         if not self.pot_method: # default is intltool
             env = {"XGETTEXT_ARGS": "\"--msgid-bugs-address=%s\"" % self.module.get_bugs_enter_url()}
-            pot_command = "intltool-update -g '%(domain)s' -p" % {'domain': self.potbase()}
+            pot_command = ["intltool-update", "-g", self.potbase(), "-p"]
         elif self.pot_method.startswith('http://'):
             # Get POT from URL and save file locally
             import urllib2
@@ -793,17 +1348,19 @@ class Domain(models.Model):
             potfile = os.path.join(vcs_path, self.potbase() + ".pot")
             with open(potfile, 'w') as f:
                 f.write(handle.read())
-            pot_command = ":" # noop
+            pot_command = None
         elif self.module.name == 'damned-lies':
             # special case for d-l, pot file should be generated from running instance dir
             podir = "."
             vcs_path = "./po"
 
-        command = "cd \"%(dir)s\" && %(pot_command)s" % {
-            "dir" : podir,
-            "pot_command" : pot_command,
-            }
-        (status, output, errs) = utils.run_shell_command(command, env=env)
+        if pot_command is None:
+            status, output, errs = utils.STATUS_OK, "", ""
+        elif isinstance(pot_command, list):
+            (status, output, errs) = utils.run_command(pot_command, cwd=podir, env=env)
+        else:
+            # Command configured in the database
+            (status, output, errs) = utils.run_shell_command(pot_command, cwd=podir, env=env)
 
         potfile = os.path.join(vcs_path, self.potbase() + ".pot")
         if not os.access(potfile, os.R_OK):
@@ -815,7 +1372,7 @@ class Domain(models.Model):
         if status != utils.STATUS_OK or not os.access(potfile, os.R_OK):
             return "", (("error", ugettext_noop("Error regenerating POT file for %(file)s:\n<pre>%(cmd)s\n%(output)s</pre>")
                                  % {'file': self.potbase(),
-                                    'cmd': pot_command,
+                                    'cmd': isinstance(pot_command, list) and utils.command_line(pot_command) or pot_command,
                                     'output': errs.decode('utf-8')}),
                        )
         else:
@@ -860,6 +1417,8 @@ class Release(models.Model):
     # weight is used to sort releases, higher on top, below 0 in archives
     weight   = models.IntegerField(default=0)
     branches = models.ManyToManyField(Branch, through='Category', related_name='releases')
+    # Incremented each time statistics of the release change (see stats_changed)
+    stats_generation = models.IntegerField(default=0, editable=False)
 
     class Meta:
         db_table = 'release'
@@ -871,6 +1430,11 @@ class Release(models.Model):
     def get_description(self):
         return _(self.description)
 
+    @classmethod
+    def stats_changed(cls, releases):
+        """ Increment the statistics generation of releases (a Release queryset) """
+        releases.update(stats_generation=models.F('stats_generation') + 1)
+
     @classmethod
     def total_by_releases(cls, dtype, releases):
         """ Get summary stats for all languages and 'releases', and return a 'stats' dict with
@@ -958,65 +1522,120 @@ class Release(models.Model):
                 total_doc = row[1]
         return (total_doc, total_ui)
 
+    def _total_part_for_langs(self, lang=None):
+        """ Compute total partial UI strings by language locale (for lang only if not None).
+            The total of a language is the sum of all POT sizes, corrected by the difference
+            between the language reduced po size and the POT size for each domain having
+            a po file for that language, so all languages are summed in one pass. """
+        pot_sizes = dict([((st['branch_id'], st['domain_id']), st['part_po__untranslated'])
+            for st in Statistics.objects.filter(language__isnull=True, branch__releases=self, domain__dtype='ui'
+            ).values('branch_id', 'domain_id', 'part_po__untranslated')])
+        base = sum(pot_sizes.values())
+        if lang is None:
+            totals = dict.fromkeys(Language.objects.values_list('locale', flat=True), base)
+            lang_stats = Statistics.objects.filter(language__isnull=False, branch__releases=self, domain__dtype='ui')
+        else:
+            totals = {lang.locale: base}
+            lang_stats = Statistics.objects.filter(language=lang, branch__releases=self, domain__dtype='ui')
+        for st in lang_stats.values('branch_id', 'domain_id', 'language__locale', 'part_po__translated',
+                                    'part_po__fuzzy', 'part_po__untranslated'):
+            pot_size = pot_sizes.get((st['branch_id'], st['domain_id']))
+            if pot_size is None:
+                continue
+            totals[st['language__locale']] += (st['part_po__translated'] + st['part_po__fuzzy'] +
+                                               st['part_po__untranslated'] - pot_size)
+        return totals
+
     def total_part_for_all_langs(self):
         """ Return total partial UI strings for each language """
-        total_part_ui_strings = {}
-        all_ui_pots = Statistics.objects.select_related('part_po').filter(language__isnull=True, branch__releases=self, domain__dtype='ui')
-        all_ui_stats = Statistics.objects.select_related('part_po', 'language'
-            ).filter(language__isnull=False, branch__releases=self, domain__dtype='ui'
-            ).values('branch_id', 'domain_id', 'language__locale', 'part_po__translated', 'part_po__fuzzy', 'part_po__untranslated')
-        stats_d = dict([("%d-%d-%s" % (st['branch_id'], st['domain_id'], st['language__locale']),
-                        st['part_po__translated'] + st['part_po__fuzzy'] + st['part_po__untranslated']) for st in all_ui_stats])
-        for lang in Language.objects.all():
-            total_part_ui_strings[lang.locale] = self.total_part_for_lang(lang, all_ui_pots, stats_d)
-        return total_part_ui_strings
-
-    def total_part_for_lang(self, lang, all_pots=None, all_stats_d=None):
-        """ For partial UI stats, the total number can differ from lang to lang, so we
-            are bound to iterate each stats to sum it """
-        if all_pots is None:
-            all_pots = Statistics.objects.select_related('part_po').filter(language__isnull=True, branch__releases=self, domain__dtype='ui')
-        if all_stats_d is None:
-            all_stats = Statistics.objects.select_related('part_po', 'language'
-                ).filter(language=lang, branch__releases=self, domain__dtype='ui'
-                ).values('branch_id', 'domain_id', 'language__locale', 'part_po__translated', 'part_po__fuzzy', 'part_po__untranslated')
-            all_stats_d = dict([("%d-%d-%s" % (st['branch_id'], st['domain_id'], st['language__locale']),
-                                st['part_po__translated'] + st['part_po__fuzzy'] + st['part_po__untranslated']) for st in all_stats])
-        total = 0
-        for stat in all_pots:
-            key = "%d-%d-%s" % (stat.branch_id, stat.domain_id, lang.locale)
-            total += all_stats_d.get(key, stat.part_po.untranslated)
-        return total
+        return self._total_part_for_langs()
+
+    def total_part_for_lang(self, lang):
+        """ For partial UI stats, the total number can differ from lang to lang, as the
+            reduced po file of each language may differ from the reduced POT file """
+        return self._total_part_for_langs(lang)[lang.locale]
 
     def total_for_lang(self, lang):
         """ Returns total translated/fuzzy/untranslated strings for a specific
             language """
+        return Release.total_for_lang_by_releases([self], lang)[0]
 
-        total_doc, total_ui = self.total_strings()
-        total_ui_part = self.total_part_for_lang(lang)
+    @classmethod
+    def total_for_lang_by_releases(cls, releases, lang):
+        """ Returns the total_for_lang(lang) stats of each release of releases (in the same
+            order), with a constant number of queries whatever the number of releases """
+        releases = list(releases)
+        if not releases:
+            return []
+        rel_ids = [str(rel.id) for rel in releases]
+        cursor = connection.cursor()
+
+        # Total strings by release and domain type (from POT stats)
         query = """
-            SELECT domain.dtype,
+            SELECT category.release_id, domain.dtype,
+                   SUM(pofull.untranslated)
+            FROM statistics AS stat
+            LEFT JOIN domain
+                   ON domain.id = stat.domain_id
+            LEFT JOIN category
+                   ON category.branch_id = stat.branch_id
+            LEFT JOIN pofile AS pofull
+                   ON pofull.id = stat.full_po_id
+            WHERE category.release_id IN (%s)
+              AND stat.language_id IS NULL
+            GROUP BY category.release_id, domain.dtype""" % (",".join(rel_ids),)
+        cursor.execute(query)
+        totals = {}
+        for rel_id, dtype, total in cursor.fetchall():
+            totals[(rel_id, dtype)] = total or 0
+
+        # Total partial UI strings by release (see _total_part_for_langs)
+        branch_releases = {}
+        for rel_id, branch_id in Category.objects.filter(release__in=releases).values_list('release_id', 'branch_id'):
+            branch_releases.setdefault(branch_id, []).append(rel_id)
+        lang_sizes = dict([((st['branch_id'], st['domain_id']),
+                            st['part_po__translated'] + st['part_po__fuzzy'] + st['part_po__untranslated'])
+            for st in Statistics.objects.filter(language=lang, branch__in=branch_releases.keys(), domain__dtype='ui'
+            ).values('branch_id', 'domain_id', 'part_po__translated', 'part_po__fuzzy', 'part_po__untranslated')])
+        part_totals = {}
+        for st in Statistics.objects.filter(language__isnull=True, branch__in=branch_releases.keys(), domain__dtype='ui'
+                ).values('branch_id', 'domain_id', 'part_po__untranslated'):
+            size = lang_sizes.get((st['branch_id'], st['domain_id']), st['part_po__untranslated'])
+            for rel_id in branch_releases[st['branch_id']]:
+                part_totals[rel_id] = part_totals.get(rel_id, 0) + size
+
+        # Translated strings by release and domain type
+        query = """
+            SELECT category.release_id, domain.dtype,
                    SUM(pofull.translated) AS trans,
                    SUM(pofull.fuzzy),
                    SUM(popart.translated) AS trans_p,
-                   SUM(popart.fuzzy) AS fuzzy_p,
-                   SUM(popart.untranslated) AS untrans_p
+                   SUM(popart.fuzzy) AS fuzzy_p
             FROM statistics AS stat
             LEFT JOIN domain
                    ON stat.domain_id = domain.id
-            LEFT JOIN branch
-                   ON stat.branch_id = branch.id
             LEFT JOIN category
-                   ON category.branch_id = branch.id
+                   ON category.branch_id = stat.branch_id
             LEFT JOIN pofile AS pofull
                    ON pofull.id = stat.full_po_id
             LEFT JOIN pofile AS popart
                    ON popart.id = stat.part_po_id
-            WHERE language_id = %s
-              AND category.release_id = %s
-            GROUP BY domain.dtype"""
-        cursor = connection.cursor()
-        cursor.execute(query, (lang.id, self.id))
+            WHERE language_id = %%s
+              AND category.release_id IN (%s)
+            GROUP BY category.release_id, domain.dtype""" % (",".join(rel_ids),)
+        cursor.execute(query, (lang.id,))
+        lang_rows = {}
+        for row in cursor.fetchall():
+            lang_rows.setdefault(row[0], []).append(row[1:])
+        cursor.close()
+
+        return [rel._lang_stats(totals.get((rel.id, 'doc'), 0), totals.get((rel.id, 'ui'), 0),
+                                part_totals.get(rel.id, 0), lang_rows.get(rel.id, []))
+                for rel in releases]
+
+    def _lang_stats(self, total_doc, total_ui, total_ui_part, rows):
+        """ Build the total_for_lang stats structure from the totals of the release and
+            the (dtype, translated, fuzzy, part translated, part fuzzy) sums of the language """
         stats = {'id': self.id, 'name': self.name, 'description': _(self.description),
                  'ui':  {'translated': 0, 'fuzzy': 0, 'total': total_ui,
                          'translated_perc': 0, 'fuzzy_perc': 0, 'untranslated_perc': 0,
@@ -1028,7 +1647,7 @@ class Release(models.Model):
                          'translated_perc': 0, 'fuzzy_perc': 0, 'untranslated_perc': 0
                         },
                 }
-        for res in cursor.fetchall():
+        for res in rows:
             if res[0] == 'ui':
                 stats['ui']['translated'] = res[1]
                 stats['ui']['fuzzy'] = res[2]
@@ -1057,6 +1676,11 @@ class Release(models.Model):
     def get_global_stats(self):
         """ Get statistics for all languages in a release, grouped by language
             Returns a sorted list: (language name and locale, ui, ui-part and doc stats dictionaries) """
+        return ReleaseSummary.get_global_stats(self)
+
+    def compute_global_stats(self):
+        """ Compute the get_global_stats() data from the statistics tables, as a dict with
+            the language locale as key (used to fill the ReleaseSummary table) """
 
         query = """
             SELECT MIN(lang.name),
@@ -1124,10 +1748,7 @@ class Release(models.Model):
                     stats[locale]['ui_part']['fuzzy_perc'] = int(100*fuzzy_p/total_uistrings_part[locale])
                     stats[locale]['ui_part']['untranslated_perc'] = int(100*stats[locale]['ui_part']['untranslated']/total_uistrings_part[locale])
         cursor.close()
-
-        results = stats.values()
-        results.sort(self.compare_stats)
-        return results
+        return stats
 
     def compare_stats(self, a, b):
         res = cmp(b['ui']['translated'], a['ui']['translated'])
@@ -1152,18 +1773,20 @@ class Release(models.Model):
         partial = False
         if dtype == "ui-part":
             dtype, partial = "ui", True
-        pot_stats = Statistics.objects.filter(
+        pot_stats = Statistics.objects.select_related('branch__module', 'domain', 'full_po').filter(
             language=None, branch__releases=self, domain__dtype=dtype, full_po__isnull=False)
         po_stats = dict([("%s-%s" % (st.branch_id, st.domain_id), st)
-                         for st in Statistics.objects.filter(language=lang, branch__releases=self, domain__dtype=dtype)])
+                         for st in Statistics.objects.select_related('branch__module', 'domain', 'language', 'full_po'
+                             ).filter(language=lang, branch__releases=self, domain__dtype=dtype)])
         lang_files = []
         last_modif_date = datetime(1970, 01, 01)
         # Create list of files
         for stat in pot_stats:
-            if stat.full_po.updated > last_modif_date:
-                last_modif_date = stat.full_po.updated
             key = "%s-%s" % (stat.branch_id, stat.domain_id)
             lang_stat = po_stats.get(key, stat)
+            for st in (stat, lang_stat):
+                if st.full_po and st.full_po.updated > last_modif_date:
+                    last_modif_date = st.full_po.updated
             file_path = lang_stat.po_path(reduced=partial)
             if os.access(file_path, os.R_OK):
                 lang_files.append(file_path)
@@ -1198,6 +1821,174 @@ class Category(models.Model):
                 return _(entry[1])
         return key
 
+SUMMARY_SCOPE_CHOICES = (
+    ('full', 'Full'),
+    ('part', 'Partial'),
+)
+SUMMARY_KEYS = (('ui', 'full', 'ui'), ('ui', 'part', 'ui_part'), ('doc', 'full', 'doc'))
+
+class ReleaseSummary(models.Model):
+    """ Precomputed translation totals by release and language, used by the release pages.
+        Rows with a NULL language hold the release totals and mark the release summary as
+        computed. Rows of a language are refreshed when its statistics change, and the whole
+        release summary is recomputed when the totals of a POT file change (both by the
+        process updating the statistics). The summary is only computed on page access when
+        it is missing (new release, release content changed). """
+    release = models.ForeignKey(Release)
+    language = models.ForeignKey(Language, null=True)
+    dtype = models.CharField(max_length=5, choices=DOMAIN_TYPE_CHOICES)
+    scope = models.CharField(max_length=4, choices=SUMMARY_SCOPE_CHOICES)
+    translated = models.IntegerField(default=0)
+    fuzzy = models.IntegerField(default=0)
+    untranslated = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'release_summary'
+        unique_together = ('release', 'language', 'dtype', 'scope')
+
+    _pending = threading.local()
+
+    def as_dict(self):
+        """ Same structure as the stats dicts of Release.get_global_stats """
+        res = {'translated': self.translated, 'fuzzy': self.fuzzy, 'untranslated': self.untranslated,
+               'translated_perc': 0, 'fuzzy_perc': 0, 'untranslated_perc': 100}
+        if self.total > 0:
+            res['translated_perc'] = int(100*self.translated/self.total)
+            res['fuzzy_perc'] = int(100*self.fuzzy/self.total)
+            res['untranslated_perc'] = int(100*self.untranslated/self.total)
+        return res
+
+    @classmethod
+    def lock(cls, release):
+        """ Lock serializing the computations of the summary of release """
+        return NamedLock("release-summary-%d" % release.id)
+
+    @classmethod
+    def get_global_stats(cls, release):
+        rows = list(cls.objects.select_related('language').filter(release=release))
+        if not rows:
+            with cls.lock(release):
+                # Concurrent requests wait for the first one instead of computing it again
+                if not cls.objects.filter(release=release, language__isnull=True).exists():
+                    cls._compute_release(release)
+            rows = list(cls.objects.select_related('language').filter(release=release))
+        stats = {}
+        for row in rows:
+            if row.language is None:
+                continue
+            locale = row.language.locale
+            if locale not in stats:
+                stats[locale] = {'lang_name': row.language.name, 'lang_locale': locale}
+            key = row.scope == 'part' and 'ui_part' or row.dtype
+            stats[locale][key] = row.as_dict()
+        results = stats.values()
+        results.sort(release.compare_stats)
+        return results
+
+    @classmethod
+    def _store_language(cls, release, language_id, lang_stats):
+        for dtype, scope, key in SUMMARY_KEYS:
+            values = lang_stats[key]
+            cls.objects.create(release=release, language_id=language_id, dtype=dtype, scope=scope,
+                translated=values['translated'] or 0, fuzzy=values['fuzzy'] or 0,
+                untranslated=values['untranslated'] or 0,
+                total=(values['translated'] or 0) + (values['fuzzy'] or 0) + (values['untranslated'] or 0))
+
+    @classmethod
+    def refresh_release(cls, release):
+        """ Compute all summary rows of release """
+        with cls.lock(release):
+            cls._compute_release(release)
+
+    @classmethod
+    def _compute_release(cls, release):
+        total_doc, total_ui = release.total_strings()
+        stats = release.compute_global_stats()
+        lang_ids = dict(Language.objects.filter(locale__in=stats.keys()).values_list('locale', 'id'))
+        with transaction.commit_on_success():
+            cls.objects.filter(release=release).delete()
+            for dtype, total in (('ui', total_ui), ('doc', total_doc)):
+                cls.objects.create(release=release, language=None, dtype=dtype, scope='full',
+                                   untranslated=total or 0, total=total or 0)
+            for locale, lang_stats in stats.items():
+                cls._store_language(release, lang_ids[locale], lang_stats)
+
+    @classmethod
+    def refresh_language(cls, release, language):
+        """ Recompute the rows of language in release (if the release summary exists) """
+        with cls.lock(release):
+            if not cls.objects.filter(release=release, language__isnull=True).exists():
+                return
+            with transaction.commit_on_success():
+                cls.objects.filter(release=release, language=language).delete()
+                if Statistics.objects.filter(language=language, branch__releases=release).exists():
+                    cls._store_language(release, language.id, release.total_for_lang(language))
+
+    @classmethod
+    def drop_release(cls, release_id):
+        cls.objects.filter(release__id=release_id).delete()
+
+    @classmethod
+    def stats_changed(cls, branch_id, language_id, totals_changed=True):
+        """ Called when statistics of a branch change (language_id is None for POT statistics).
+            Summary rows are only refreshed if totals_changed, other changes (e.g. errors)
+            only invalidate cached pages. The refresh is deferred when running inside a
+            SummaryBatch. """
+        pending = getattr(cls._pending, 'changes', None)
+        if pending is not None:
+            pending.add((branch_id, language_id, totals_changed))
+        else:
+            cls.apply_changes([(branch_id, language_id, totals_changed)])
+
+    @classmethod
+    def apply_changes(cls, changes):
+        by_branch = {}
+        for branch_id, language_id, totals_changed in changes:
+            language_ids = by_branch.setdefault(branch_id, set())
+            if totals_changed:
+                language_ids.add(language_id)
+        if by_branch:
+            Branch.stats_changed(Branch.objects.filter(id__in=by_branch.keys()))
+            Release.stats_changed(Release.objects.filter(category__branch__id__in=by_branch.keys()))
+            StatsGeneration.bump()
+        # POT totals are part of the figures of all languages
+        full_refresh = {}
+        lang_refresh = {}
+        for branch_id, language_ids in by_branch.items():
+            for release in Release.objects.filter(category__branch__id=branch_id):
+                if None in language_ids:
+                    full_refresh[release.id] = release
+                elif language_ids:
+                    lang_refresh.setdefault(release.id, (release, set()))[1].update(language_ids)
+        for release in full_refresh.values():
+            cls.refresh_release(release)
+        for release_id, (release, language_ids) in lang_refresh.items():
+            if release_id not in full_refresh:
+                for language in Language.objects.filter(id__in=language_ids):
+                    cls.refresh_language(release, language)
+
+class SummaryBatch(object):
+    """ Context manager grouping ReleaseSummary refreshes until the end of the block
+        (e.g. for all statistics of a branch update) """
+    def __enter__(self):
+        self.outer = getattr(ReleaseSummary._pending, 'changes', None) is not None
+        if not self.outer:
+            ReleaseSummary._pending.changes = set()
+        return self
+
+    def __exit__(self, *exc_info):
+        if not self.outer:
+            changes = ReleaseSummary._pending.changes
+            ReleaseSummary._pending.changes = None
+            ReleaseSummary.apply_changes(changes)
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, instance, **kwargs):
+    ReleaseSummary.drop_release(instance.release_id)
+    Release.stats_changed(Release.objects.filter(pk=instance.release_id))
+
 class PoFile(models.Model):
     # File type fields of Django may not be flexible enough for our use case
     path         = models.CharField(max_length=255, blank=True, null=True)
@@ -1501,43 +2292,41 @@ class Statistics(models.Model):
     def pot_url(self):
         return self.po_url(potfile=True)
 
-    def set_translation_stats(self, po_path, translated=0, fuzzy=0, untranslated=0, translated_words=0, fuzzy_words=0, untranslated_words=0, figstats=None):
-        if not self.full_po:
-            self.full_po = PoFile.objects.create(path=po_path)
-            self.save()
-        self.full_po.path = po_path
-        self.full_po.translated = translated
-        self.full_po.fuzzy = fuzzy
-        self.full_po.untranslated = untranslated
-        self.full_po.translated_words = translated_words
-        self.full_po.fuzzy_words = fuzzy_words
-        self.full_po.untranslated_words = untranslated_words
-        self.full_po.figures = figstats
-        self.full_po.updated = datetime.now()
-        self.full_po.save()
-        if self.domain.dtype == "ui":
-            def part_po_equals_full_po():
-                if self.part_po == self.full_po:
-                    return
-                if self.part_po and self.part_po != self.full_po:
-                    self.part_po.delete()
-                self.part_po = self.full_po
+    def set_translation_stats(self, po_path, translated=0, fuzzy=0, untranslated=0, translated_words=0, fuzzy_words=0, untranslated_words=0, figstats=None, reduced=None):
+        """ Store statistics of po_path in the database. reduced can contain the result of a previous
+            call to utils.generate_reduced_po(), otherwise the reduced po file is generated here """
+        previous_totals = self._totals()
+        try:
+            if not self.full_po:
+                self.full_po = PoFile.objects.create(path=po_path)
                 self.save()
-            # Try to compute a reduced po file
-            if (self.full_po.fuzzy + self.full_po.untranslated) > 0 and not self.branch.is_archive_only():
-                # Generate partial_po and store partial stats
-                if self.full_po.path.endswith('.pot'):
-                    part_po_path = self.full_po.path[:-3] + "reduced.pot"
-                else:
-                    part_po_path = self.full_po.path[:-3] + ".reduced.po"
-                utils.po_grep(self.full_po.path, part_po_path, self.domain.red_filter)
-                part_stats = utils.po_file_stats(part_po_path, msgfmt_checks=False)
-                if part_stats['translated'] + part_stats['fuzzy'] + part_stats['untranslated'] == translated + fuzzy + untranslated:
+            self.full_po.path = po_path
+            self.full_po.translated = translated
+            self.full_po.fuzzy = fuzzy
+            self.full_po.untranslated = untranslated
+            self.full_po.translated_words = translated_words
+            self.full_po.fuzzy_words = fuzzy_words
+            self.full_po.untranslated_words = untranslated_words
+            self.full_po.figures = figstats
+            self.full_po.updated = datetime.now()
+            self.full_po.save()
+            if self.domain.dtype == "ui":
+                if reduced is None:
+                    # Try to compute a reduced po file
+                    reduced = False
+                    if (self.full_po.fuzzy + self.full_po.untranslated) > 0 and not self.branch.is_archive_only():
+                        reduced = utils.generate_reduced_po(self.full_po.path, self.domain.red_filter,
+                                                            translated + fuzzy + untranslated)
+                if not reduced:
                     # No possible gain, set part_po = full_po so it is possible to compute complete stats at database level
-                    part_po_equals_full_po()
-                    os.remove(part_po_path)
+                    if self.part_po == self.full_po:
+                        return
+                    if self.part_po and self.part_po != self.full_po:
+                        self.part_po.delete()
+                    self.part_po = self.full_po
+                    self.save()
                     return
-                utils.add_custom_header(part_po_path, "X-DamnedLies-Scope", "partial")
+                part_po_path, part_stats = reduced
                 if not self.part_po or self.part_po == self.full_po:
                     self.part_po = PoFile.objects.create(path=part_po_path)
                     self.save()
@@ -1550,8 +2339,14 @@ class Statistics(models.Model):
                 self.part_po.untranslated_words = part_stats['untranslated_words']
                 self.part_po.updated = datetime.now()
                 self.part_po.save()
-            else:
-                part_po_equals_full_po()
+        finally:
+            # Release summaries depend on POT totals, not on the POT file itself
+            ReleaseSummary.stats_changed(self.branch_id, self.language_id,
+                self.language_id is not None or self._totals() != previous_totals)
+            StatisticsRow.refresh(self.branch_id, self.domain_id, self.language_id)
+
+    def _totals(self):
+        return tuple([po and (po.translated, po.fuzzy, po.untranslated) for po in (self.full_po, self.part_po)])
 
     def set_errors(self, errors):
         for err in errors:
@@ -1615,9 +2410,6 @@ class Statistics(models.Model):
                 'all_errors':[]
             }
         """
-        # Import here to prevent a circular dependency
-        from vertimus.models import State, Action
-
         if dtype.endswith('-part'):
             dtype = dtype[:-5]
             scope = "part"
@@ -1627,59 +2419,48 @@ class Statistics(models.Model):
         stats = {'dtype':dtype, 'totaltrans':0, 'totalfuzzy':0, 'totaluntrans':0,
                  'totaltransperc': 0, 'totalfuzzyperc': 0, 'totaluntransperc': 0,
                  'categs':{}, 'all_errors':[]}
-        # Sorted by module to allow grouping ('fake' stats)
-        pot_stats = Statistics.objects.select_related('domain', 'branch__module', 'full_po', 'part_po')
-        if release:
-            pot_stats = pot_stats.extra(select={'categ_name': "category.name"}).filter(language=None, branch__releases=release, domain__dtype=dtype).order_by('branch__module__id')
+        # POT and language rows are read from the denormalized StatisticsRow table
+        rows = StatisticsRow.objects.filter(dtype=dtype)
+        if lang:
+            rows = rows.filter(models.Q(language__isnull=True) | models.Q(language=lang))
         else:
-            pot_stats = pot_stats.filter(language=None, domain__dtype=dtype).order_by('branch__module__id')
-
-        tr_stats = Statistics.objects.select_related('domain', 'language', 'branch__module', 'full_po', 'part_po')
+            rows = rows.filter(language__isnull=True)
         if release:
-            tr_stats = tr_stats.filter(language=lang, branch__releases=release, domain__dtype=dtype).order_by('branch__module__id')
-        else:
-            tr_stats = tr_stats.filter(language=lang, domain__dtype=dtype).order_by('branch__module__id')
-        tr_stats_dict = dict([("%d-%d" % (st.branch.id, st.domain.id),st) for st in tr_stats])
+            rows = rows.extra(select={'categ_name': "category.name"}).filter(branch__releases=release)
+        pot_rows = []
+        lang_rows = {}
+        for row in rows:
+            if row.language_id is None:
+                pot_rows.append(row)
+            else:
+                row.language = lang
+                lang_rows[(row.branch_id, row.domain_id)] = row
 
         infos_dict = Information.get_info_dict(lang)
 
-        # Prepare State objects in a dict (with "branch_id-domain_id" as key), to save database queries later
-        vt_states = State.objects.select_related('branch','domain')
-        if release:
-            vt_states = vt_states.filter(language=lang, branch__releases=release, domain__dtype=dtype)
-        else:
-            vt_states = vt_states.filter(language=lang, domain__dtype=dtype)
-        vt_states_dict = dict([("%d-%d" % (vt.branch.id, vt.domain.id),vt) for vt in vt_states])
-
-        # Get comments from last action of State objects
-        actions = Action.objects.filter(state_db__in=vt_states, comment__isnull=False).order_by('created')
-        actions_dict = dict([(act.state_db_id, act) for act in actions])
-        for vt_state in vt_states_dict.values():
-            if vt_state.id in actions_dict:
-                vt_state.last_comment = actions_dict[vt_state.id].comment
-
-        for stat in pot_stats:
+        multi_domains = [] # Module-branch domain lists needing a FakeSummaryStatistics
+        for stat in pot_rows:
             categdescr = "default"
             if release:
                 categdescr = stat.categ_name
-            domname = stat.domain.description and _(stat.domain.description) or ""
-            branchname = stat.branch.name
-            modname = stat.branch.module.name
+            domname = stat.domain_description and _(stat.domain_description) or ""
+            branchname = stat.branch_name
+            modname = stat.module_name
             if categdescr not in stats['categs']:
                 stats['categs'][categdescr] = {'cattrans':0, 'catfuzzy':0, 'catuntrans':0,
                                                'cattransperc':0, 'modules':{}}
             # Try to get translated stat, else stick with POT stat
-            br_dom_key = "%d-%d" % (stat.branch.id, stat.domain.id)
-            if br_dom_key in tr_stats_dict:
-                stat = tr_stats_dict[br_dom_key]
+            lang_row = lang_rows.get((stat.branch_id, stat.domain_id))
+            if lang_row is not None and lang_row.stat_id is not None:
+                stat = lang_row
             # Match stat with error list
-            if stat.id in infos_dict:
-                stat.info_list = infos_dict[stat.id]
+            if stat.stat_id in infos_dict:
+                stat.info_list = infos_dict[stat.stat_id]
                 stats['all_errors'].extend(stat.info_list)
 
             # Search if a state exists for this statistic
-            if br_dom_key in vt_states_dict:
-                stat.state = vt_states_dict[br_dom_key]
+            if lang_row is not None:
+                stat.state = lang_row.get_state()
 
             stats['totaltrans'] += stat.translated(scope)
             stats['totalfuzzy'] += stat.fuzzy(scope)
@@ -1695,12 +2476,18 @@ class Statistics(models.Model):
                 stats['categs'][categdescr]['modules'][modname][branchname] = [[' fake', None], (domname, stat)]
             else:
                 # Here we add the 2nd or more stat to the same module-branch
-                if len(stats['categs'][categdescr]['modules'][modname][branchname]) == 2:
-                    # Create a fake statistics object for module summary
-                    stats['categs'][categdescr]['modules'][modname][branchname][0][1] = FakeSummaryStatistics(stat.domain.module, stat.branch, dtype)
-                    stats['categs'][categdescr]['modules'][modname][branchname][0][1].trans(stats['categs'][categdescr]['modules'][modname][branchname][1][1])
-                stats['categs'][categdescr]['modules'][modname][branchname].append((domname, stat))
-                stats['categs'][categdescr]['modules'][modname][branchname][0][1].trans(stat)
+                doms = stats['categs'][categdescr]['modules'][modname][branchname]
+                if len(doms) == 2:
+                    multi_domains.append((stat.branch_id, doms))
+                doms.append((domname, stat))
+
+        # Create fake statistics objects for module summaries
+        branches = Branch.objects.select_related('module').in_bulk([br_id for br_id, doms in multi_domains])
+        for branch_id, doms in multi_domains:
+            branch = branches[branch_id]
+            doms[0][1] = FakeSummaryStatistics(branch.module, branch, dtype)
+            for domname, stat in doms[1:]:
+                doms[0][1].trans(stat)
 
         # Compute percentages and sorting
         stats['total'] = stats['totaltrans'] + stats['totalfuzzy'] + stats['totaluntrans']
@@ -1759,7 +2546,8 @@ class FakeSummaryStatistics(object):
     def __init__(self, module, branch, dtype):
         self.module = module
         self.branch = branch
-        self.domain = module.domain_set.filter(dtype=dtype)[0]
+        self.dtype = dtype
+        self._domain = None
         self._translated = 0
         self._fuzzy      = 0
         self._untranslated = 0
@@ -1768,6 +2556,12 @@ class FakeSummaryStatistics(object):
         self._fuzzy_words      = 0
         self._untranslated_words = 0
 
+    @property
+    def domain(self):
+        if self._domain is None:
+            self._domain = self.module.domain_set.filter(dtype=self.dtype)[0]
+        return self._domain
+
     def translated(self, scope=None):
         return self._translated
 
@@ -1814,6 +2608,250 @@ class FakeSummaryStatistics(object):
             return int(100*self._untranslated/self.pot_size())
 
 
+class StatisticsRow(models.Model):
+    """ Denormalized statistics of a branch, domain and language (NULL for POT statistics),
+        with the vertimus state of the translation, used by the language pages (see
+        Statistics.get_lang_stats_by_type) so they are read from a single table.
+        A row exists for each Statistics object and for each vertimus State, and is
+        refreshed by the statistics and vertimus write paths (see refresh()). """
+    branch = models.ForeignKey(Branch)
+    domain = models.ForeignKey(Domain)
+    language = models.ForeignKey(Language, null=True)
+    stat = models.OneToOneField(Statistics, null=True, on_delete=models.SET_NULL) # None if only a state exists
+
+    module_name = models.CharField(max_length=50)
+    module_description = models.TextField() # Module name if the module has no description
+    branch_name = models.CharField(max_length=50)
+    domain_name = models.CharField(max_length=50)
+    domain_description = models.TextField(blank=True)
+    potbase = models.CharField(max_length=100)
+    dtype = models.CharField(max_length=5, choices=DOMAIN_TYPE_CHOICES, db_index=True)
+    domain_type = models.CharField(max_length=10) # See Domain.get_type
+
+    full_translated = models.IntegerField(default=0)
+    full_fuzzy = models.IntegerField(default=0)
+    full_untranslated = models.IntegerField(default=0)
+    # Reduced po file figures, NULL when there is no reduced po file
+    part_translated = models.IntegerField(null=True)
+    part_fuzzy = models.IntegerField(null=True)
+    part_untranslated = models.IntegerField(null=True)
+
+    state_name = models.CharField(max_length=20, null=True)
+    state_updated = models.DateTimeField(null=True)
+    last_comment = models.TextField(null=True)
+
+    class Meta:
+        db_table = 'statistics_row'
+        unique_together = ('branch', 'domain', 'language')
+
+    def __init__(self, *args, **kwargs):
+        models.Model.__init__(self, *args, **kwargs)
+        self.partial_po = False # True if part of a multiple po module
+        self.info_list = []
+        self.state = None
+
+    def _counts(self, scope):
+        if scope == 'part' and self.part_translated is not None:
+            return self.part_translated, self.part_fuzzy, self.part_untranslated
+        return self.full_translated, self.full_fuzzy, self.full_untranslated
+
+    def translated(self, scope='full'):
+        return self._counts(scope)[0]
+
+    def fuzzy(self, scope='full'):
+        return self._counts(scope)[1]
+
+    def untranslated(self, scope='full'):
+        return self._counts(scope)[2]
+
+    def _percentage(self, scope, index):
+        if scope == 'part' and self.part_translated is None:
+            return 0
+        counts = self._counts(scope)
+        pot_size = sum(counts)
+        if pot_size == 0:
+            return 0
+        return int(100*counts[index]/pot_size)
+
+    def tr_percentage(self, scope='full'):
+        return self._percentage(scope, 0)
+
+    def fu_percentage(self, scope='full'):
+        return self._percentage(scope, 1)
+
+    def un_percentage(self, scope='full'):
+        return self._percentage(scope, 2)
+
+    def is_fake(self):
+        return False
+
+    def filename(self, reduced=False):
+        if self.language_id:
+            return "%s.%s.%s.%spo" % (self.potbase, self.branch_name, self.language.locale, reduced and "reduced." or "")
+        else:
+            return "%s.%s.%spot" % (self.potbase, self.branch_name, reduced and "reduced." or "")
+
+    def po_url(self, reduced=False):
+        """ Same as Statistics.po_url """
+        subdir = ""
+        if self.dtype == "doc":
+            subdir = "docs/"
+        return utils.url_join("/POT/", "%s.%s" % (self.module_name, self.branch_name), subdir, self.filename(reduced))
+
+    def vcs_web_path(self):
+        return utils.url_join(self.branch.get_vcs_web_url(), self.domain.directory)
+
+    def get_state(self):
+        """ Return a (not saved) State object with the state information of the row """
+        # Import here to prevent a circular dependency
+        from vertimus.models import State
+        if self.state_name is None:
+            return None
+        state = State(name=self.state_name, updated=self.state_updated)
+        state.last_comment = self.last_comment
+        return state
+
+    @classmethod
+    def refresh(cls, branch_id, domain_id, language_id):
+        """ Recompute the row of branch, domain and language from the Statistics and State tables """
+        # Import here to prevent a circular dependency
+        from vertimus.models import State, Action
+        try:
+            stat = Statistics.objects.select_related('branch__module', 'domain', 'full_po', 'part_po').get(
+                branch__id=branch_id, domain__id=domain_id, language__id=language_id)
+        except Statistics.DoesNotExist:
+            stat = None
+        state = None
+        if language_id is not None:
+            try:
+                state = State.objects.get(branch__id=branch_id, domain__id=domain_id, language__id=language_id)
+            except State.DoesNotExist:
+                pass
+        try:
+            row = cls.objects.get(branch__id=branch_id, domain__id=domain_id, language__id=language_id)
+        except cls.DoesNotExist:
+            if stat is None and state is None:
+                return
+            row = cls(branch_id=branch_id, domain_id=domain_id, language_id=language_id)
+        if stat is None and state is None:
+            row.delete()
+            return
+
+        if stat is not None:
+            branch, domain = stat.branch, stat.domain
+        else:
+            branch = Branch.objects.select_related('module').get(pk=branch_id)
+            domain = Domain.objects.get(pk=domain_id)
+        row.set_labels(branch.module, domain)
+        row.branch_name = branch.name
+        row.domain_type = domain.get_type(branch)
+
+        row.stat = stat
+        full_po = stat and stat.full_po
+        row.full_translated = getattr(full_po, 'translated', 0)
+        row.full_fuzzy = getattr(full_po, 'fuzzy', 0)
+        row.full_untranslated = getattr(full_po, 'untranslated', 0)
+        part_po = stat and stat.part_po
+        row.part_translated = getattr(part_po, 'translated', None)
+        row.part_fuzzy = getattr(part_po, 'fuzzy', None)
+        row.part_untranslated = getattr(part_po, 'untranslated', None)
+
+        row.state_name = row.state_updated = row.last_comment = None
+        if state is not None:
+            row.state_name, row.state_updated = state.name, state.updated
+            actions = Action.objects.filter(state_db=state, comment__isnull=False).order_by('-created', '-id')[:1]
+            if actions:
+                row.last_comment = actions[0].comment
+        row.save()
+
+    def set_labels(self, module, domain):
+        self.module_name = module.name
+        self.module_description = module.description or module.name
+        self.domain_name = domain.name
+        self.domain_description = domain.description or ""
+        self.potbase = domain.potbase()
+        self.dtype = domain.dtype
+
+    @classmethod
+    def refresh_labels(cls, module):
+        """ Update the module and domain labels of all rows of module """
+        for domain in module.domain_set.all():
+            row = cls()
+            row.set_labels(module, domain)
+            cls.objects.filter(domain=domain).update(
+                module_name=row.module_name, module_description=row.module_description,
+                domain_name=row.domain_name, domain_description=row.domain_description,
+                potbase=row.potbase, dtype=row.dtype)
+
+    @classmethod
+    def rebuild(cls):
+        """ Recompute all rows """
+        # Import here to prevent a circular dependency
+        from vertimus.models import State
+        keys = set(Statistics.objects.values_list('branch_id', 'domain_id', 'language_id'))
+        keys.update(State.objects.values_list('branch_id', 'domain_id', 'language_id'))
+        if not keys:
+            return
+        cls.objects.all().delete()
+        for key in keys:
+            cls.refresh(*key)
+
+@receiver(post_save, sender=Statistics)
+def statistics_created(sender, instance, created, **kwargs):
+    if created:
+        StatisticsRow.refresh(instance.branch_id, instance.domain_id, instance.language_id)
+
+@receiver(post_delete, sender=Statistics)
+def statistics_deleted(sender, instance, **kwargs):
+    ReleaseSummary.stats_changed(instance.branch_id, instance.language_id)
+    StatisticsRow.refresh(instance.branch_id, instance.domain_id, instance.language_id)
+
+@receiver(post_save, sender=Module)
+def module_saved(sender, instance, **kwargs):
+    StatisticsRow.refresh_labels(instance)
+    # Module data (e.g. VCS URLs) is part of release exports
+    Release.stats_changed(Release.objects.filter(category__branch__module=instance))
+    Branch.stats_changed(instance.branch_set.all())
+
+@receiver(post_save, sender=Domain)
+def domain_saved(sender, instance, **kwargs):
+    StatisticsRow.refresh_labels(instance.module)
+    # The domain directory is part of release exports
+    Release.stats_changed(Release.objects.filter(category__branch__module=instance.module))
+    Branch.stats_changed(instance.module.branch_set.all())
+
+class StatsGeneration(models.Model):
+    """ Counter incremented each time data displayed by the statistics pages changes,
+        so these pages can answer conditional requests without computing their content
+        (see common.utils.stats_condition) """
+    name = models.CharField(max_length=50, unique=True)
+    value = models.IntegerField(default=0)
+    updated = models.DateTimeField(default=datetime.now)
+
+    class Meta:
+        db_table = 'stats_generation'
+
+    @classmethod
+    def bump(cls, name='global'):
+        if not cls.objects.filter(name=name).update(value=models.F('value') + 1, updated=datetime.now()):
+            cls.objects.create(name=name, value=1)
+
+    @classmethod
+    def current(cls, name='global'):
+        """ Return the generation as a (value, last update datetime) tuple """
+        try:
+            gen = cls.objects.get(name=name)
+        except cls.DoesNotExist:
+            return (0, None)
+        return (gen.value, gen.updated)
+
+@receiver(post_save)
+@receiver(post_delete)
+def stats_data_changed(sender, **kwargs):
+    """ Changes of the statistics themselves are counted by ReleaseSummary.apply_changes """
+    if sender in (Module, Branch, Domain, Release, Category, Language, Team, Role, Person):
+        StatsGeneration.bump()
+
 class StatisticsArchived(models.Model):
     module = models.TextField()
     type = models.CharField(max_length=3, choices=DOMAIN_TYPE_CHOICES)
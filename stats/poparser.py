@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Damned Lies.
+#
+# Damned Lies is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# Damned Lies is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Damned Lies; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+""" Streaming parser for po/pot files, reading each message as a PoEntry object.
+    Strings are kept escaped as in the file (they are only unescaped to count words). """
+
+import os, re
+
+class ParseError(ValueError):
+    pass
+
+ESCAPES_REGEX = re.compile(r'\\(.)')
+ESCAPES = {'n': '\n', 't': '\t', 'r': '\r'}
+CHARSET_REGEX = re.compile(r'charset=([\w-]+)')
+
+def unescape(string):
+    return ESCAPES_REGEX.sub(lambda m: ESCAPES.get(m.group(1), m.group(1)), string)
+
+def word_count(string):
+    """ Count words the same way as translate-toolkit (pocount) does """
+    return len(unescape(string).split())
+
+
+class PoEntry(object):
+    """ A message of a po file """
+    def __init__(self):
+        self.lines = [] # Raw lines of the entry, as read in the file
+        self.msgctxt = None
+        self.msgid = None
+        self.msgid_plural = None
+        self.msgstr = []
+        self.flags = []
+        self.locations = []
+        self.comments = []
+        self.obsolete = False
+
+    def is_empty(self):
+        return not self.lines
+
+    def is_header(self):
+        return self.msgid == "" and self.msgctxt is None and not self.obsolete
+
+    def is_fuzzy(self):
+        return 'fuzzy' in self.flags
+
+    def is_translated(self):
+        """ Same rule as msgfmt: the first msgstr decides of the translated status """
+        return bool(self.msgstr and self.msgstr[0])
+
+    def key(self):
+        return (self.msgctxt, self.msgid)
+
+    def source_words(self):
+        words = word_count(self.msgid)
+        if self.msgid_plural is not None:
+            words += word_count(self.msgid_plural)
+        return words
+
+    def header_value(self, name):
+        """ Return the value of the header field 'name' (only for the header entry) """
+        for line in unescape("".join(self.msgstr)).split('\n'):
+            if line.startswith(name + ":"):
+                return line[len(name)+1:].strip()
+        return None
+
+
+def parse(po_file):
+    """ Generator yielding each PoEntry of po_file (a path or an iterable of lines) """
+    if isinstance(po_file, basestring):
+        po_file = open(po_file, 'r')
+        close_file = True
+    else:
+        close_file = False
+    try:
+        entry = PoEntry()
+        section = None # Keyword which following "string" lines belong to
+        for line in po_file:
+            stripped = line.strip()
+            if not stripped:
+                if not entry.is_empty():
+                    yield entry
+                    entry = PoEntry()
+                    section = None
+                continue
+
+            if stripped.startswith('#~'):
+                stripped = stripped[2:].strip()
+                if entry.msgstr and (not entry.obsolete or not stripped or stripped[0] == '|'):
+                    # No blank line between two entries
+                    yield entry
+                    entry = PoEntry()
+                    section = None
+                entry.obsolete = True
+                if not stripped or stripped[0] == '|':
+                    entry.lines.append(line)
+                    continue
+            elif stripped[0] == '#':
+                if entry.msgstr:
+                    # No blank line between two entries
+                    yield entry
+                    entry = PoEntry()
+                    section = None
+                entry.lines.append(line)
+                if stripped[:2] == '#,':
+                    entry.flags.extend([f.strip() for f in stripped[2:].split(',')])
+                elif stripped[:2] == '#:':
+                    entry.locations.extend(stripped[2:].split())
+                elif stripped[:2] != '#|':
+                    entry.comments.append(stripped[1:].strip())
+                continue
+
+            if stripped[0] == '"':
+                if section is None or len(stripped) < 2 or stripped[-1] != '"':
+                    raise ParseError("Unexpected line: %s" % stripped)
+                value = stripped[1:-1]
+                if section == 'msgctxt':
+                    entry.msgctxt += value
+                elif section == 'msgid':
+                    entry.msgid += value
+                elif section == 'msgid_plural':
+                    entry.msgid_plural += value
+                else:
+                    entry.msgstr[-1] += value
+                entry.lines.append(line)
+                continue
+
+            keyword, sep, value = stripped.partition(' ')
+            value = value.strip()
+            if len(value) < 2 or value[0] != '"' or value[-1] != '"':
+                raise ParseError("Unexpected line: %s" % stripped)
+            value = value[1:-1]
+            if keyword in ('msgctxt', 'msgid') and entry.msgstr:
+                # No blank line between two entries
+                obsolete = entry.obsolete
+                yield entry
+                entry = PoEntry()
+                entry.obsolete = obsolete
+            if keyword == 'msgctxt':
+                entry.msgctxt = value
+            elif keyword == 'msgid':
+                entry.msgid = value
+            elif keyword == 'msgid_plural':
+                entry.msgid_plural = value
+            elif keyword == 'msgstr' or keyword.startswith('msgstr['):
+                if entry.msgid is None:
+                    raise ParseError("msgstr without msgid: %s" % stripped)
+                keyword = 'msgstr'
+                entry.msgstr.append(value)
+            else:
+                raise ParseError("Unknown keyword: %s" % keyword)
+            section = keyword
+            entry.lines.append(line)
+        if not entry.is_empty():
+            yield entry
+    finally:
+        if close_file:
+            po_file.close()
+
+def _empty_stats():
+    return {
+        'translated' : 0,
+        'fuzzy' : 0,
+        'untranslated' : 0,
+        'translated_words': 0,
+        'fuzzy_words': 0,
+        'untranslated_words': 0,
+        'utf8': True,
+    }
+
+def _count_entry(res, entry):
+    """ Add entry to the res statistics, with the msgfmt counting rules """
+    if entry.msgid is None or entry.obsolete or entry.is_header():
+        return
+    if not entry.is_translated():
+        status = 'untranslated'
+    elif entry.is_fuzzy():
+        status = 'fuzzy'
+    else:
+        status = 'translated'
+    res[status] += 1
+    res[status + '_words'] += entry.source_words()
+
+def po_stats(po_file, check_utf8=False):
+    """ Compute message and word statistics of po_file in a single pass, with the
+        same message counting rules as msgfmt --statistics.
+        If check_utf8 is True, 'utf8' is set to False in the result when the file
+        is not (declared as) UTF-8 encoded """
+    res = _empty_stats()
+    for entry in parse(po_file):
+        if entry.msgid is None or entry.obsolete:
+            continue
+        if check_utf8 and res['utf8']:
+            try:
+                "".join(entry.lines).decode('utf-8')
+            except UnicodeDecodeError:
+                res['utf8'] = False
+        if entry.is_header():
+            if check_utf8:
+                match = CHARSET_REGEX.search(entry.header_value("Content-Type") or "")
+                if not match or match.group(1).lower() not in ('utf-8', 'utf8'):
+                    res['utf8'] = False
+            continue
+        _count_entry(res, entry)
+    return res
+
+FILTER_FIELDS = {
+    'locations': lambda entry: entry.locations,
+    'msgid':     lambda entry: [unescape(entry.msgid), unescape(entry.msgid_plural or "")],
+    'msgstr':    lambda entry: [unescape(s) for s in entry.msgstr],
+    'msgctxt':   lambda entry: [unescape(entry.msgctxt or "")],
+    'notes':     lambda entry: entry.comments,
+}
+FILTER_FIELDS['source'] = FILTER_FIELDS['msgid']
+FILTER_FIELDS['target'] = FILTER_FIELDS['msgstr']
+FILTER_FIELDS['comment'] = FILTER_FIELDS['notes']
+
+def _set_headers(entry, headers):
+    """ Set (add or replace) header fields of the header entry lines """
+    lines = [line for line in entry.lines
+             if not any([line.strip().startswith('"%s:' % name) for name in headers])]
+    for name, value in sorted(headers.items()):
+        lines.append('"%s: %s\\n"\n' % (name, value))
+    entry.lines = lines
+
+def filter_po(in_file, out_path, field, regex, headers=None):
+    """ Write to out_path the entries of in_file whose field (see FILTER_FIELDS) does not
+        match regex (the header and obsolete entries are always kept), setting the header
+        fields of the headers dict on the way.
+        Returns the statistics of the written file (like po_stats). out_path is
+        left untouched if an error occurs. """
+    get_values = FILTER_FIELDS[field]
+    regex = re.compile(regex)
+    res = _empty_stats()
+    tmp_path = out_path + ".tmp"
+    out = open(tmp_path, 'w')
+    try:
+        first = True
+        for entry in parse(in_file):
+            if entry.is_header():
+                if headers:
+                    _set_headers(entry, headers)
+            elif not entry.obsolete and entry.msgid is not None and \
+                    any([regex.search(value) for value in get_values(entry)]):
+                continue
+            if not first:
+                out.write("\n")
+            out.writelines(entry.lines)
+            first = False
+            _count_entry(res, entry)
+    except:
+        out.close()
+        os.remove(tmp_path)
+        raise
+    out.close()
+    os.rename(tmp_path, out_path)
+    return res
+
+def _entry_key(entry):
+    return (entry.obsolete,) + entry.key()
+
+def _entry_content(entry):
+    return (entry.msgid_plural, entry.msgstr, sorted(entry.flags))
+
+def diff_po(old_file, new_file):
+    """ Generator yielding (old_entry, new_entry) tuples for each message whose translation
+        (msgstr or flags) differs between old_file and new_file, messages being matched by
+        their msgctxt/msgid. old_entry (resp. new_entry) is None for a message only present
+        in new_file (resp. old_file). Changed and added messages come in the new_file order,
+        followed by removed messages. """
+    old_entries = {}
+    old_keys = []
+    for entry in parse(old_file):
+        if entry.msgid is None:
+            continue
+        old_entries[_entry_key(entry)] = entry
+        old_keys.append(_entry_key(entry))
+    for entry in parse(new_file):
+        if entry.msgid is None:
+            continue
+        old_entry = old_entries.pop(_entry_key(entry), None)
+        if old_entry is None:
+            yield None, entry
+        elif _entry_content(old_entry) != _entry_content(entry):
+            yield old_entry, entry
+    for key in old_keys:
+        if key in old_entries:
+            yield old_entries.pop(key), None
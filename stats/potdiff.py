@@ -21,6 +21,12 @@
 
 # Output differences between two POT files
 
+import os
+import hashlib
+from django.utils import simplejson
+
+import poparser
+
 USE_DIFFLIB = 0
 
 def diff(pota, potb):
@@ -65,6 +71,76 @@ def diff(pota, potb):
         return onlydiffs
 
 
+def _entry_repr(entry):
+    """ Same format as the _parse_contents result items """
+    onemsg = ""
+    if entry.msgctxt: onemsg += ('"' + entry.msgctxt + '"::')
+    onemsg += ('"' + entry.msgid + '"')
+    if entry.msgid_plural: onemsg += ('/"' + entry.msgid_plural + '"')
+    return onemsg
+
+def _entry_hash(onemsg):
+    return hashlib.sha1(onemsg).hexdigest()[:16]
+
+def fingerprint(pot_path):
+    """ Compute the fingerprint of a POT file in a single pass. Returns a (fingerprint, entries)
+        tuple, fingerprint being a dict with:
+         - content: digest of the file, ignoring the POT-Creation-Date header
+         - msgids: digest of the sorted list of messages
+         - entries: sorted list of message hashes
+        and entries a dict of message hash -> message (in _parse_contents format). """
+    content = hashlib.sha1()
+    entries = {}
+    for entry in poparser.parse(pot_path):
+        for line in entry.lines:
+            if not line.startswith('"POT-Creation-Date:'):
+                content.update(line)
+        content.update("\n")
+        if entry.msgid and not entry.obsolete:
+            onemsg = _entry_repr(entry)
+            entries[_entry_hash(onemsg)] = onemsg
+    msgids = hashlib.sha1("\n".join(sorted(entries.values()))).hexdigest()
+    return {'content': content.hexdigest(), 'msgids': msgids, 'entries': sorted(entries.keys())}, entries
+
+def _fingerprint_path(pot_path):
+    return pot_path + ".fingerprint"
+
+def save_fingerprint(pot_path, fprint):
+    """ Store fprint next to pot_path, which should not be modified afterwards """
+    stat = os.stat(pot_path)
+    fprint = dict(fprint, size=stat.st_size, mtime=stat.st_mtime)
+    f = open(_fingerprint_path(pot_path), "w")
+    simplejson.dump(fprint, f)
+    f.close()
+
+def load_fingerprint(pot_path):
+    """ Return the stored fingerprint of pot_path, computing it if there is no
+        up-to-date stored fingerprint (None if pot_path cannot be parsed) """
+    try:
+        f = open(_fingerprint_path(pot_path))
+        try:
+            fprint = simplejson.load(f)
+        finally:
+            f.close()
+        stat = os.stat(pot_path)
+        if fprint['size'] == stat.st_size and fprint['mtime'] == stat.st_mtime:
+            return fprint
+    except (IOError, OSError, ValueError, KeyError):
+        pass
+    try:
+        return fingerprint(pot_path)[0]
+    except poparser.ParseError:
+        return None
+
+def diff_fingerprints(old_fprint, new_fprint, new_entries):
+    """ Same result as diff(), but based on the old POT fingerprint. As removed messages
+        are only known by their hash, they are reported as '- [hash]' lines. """
+    old_hashes = set(old_fprint['entries'])
+    new_hashes = set(new_fprint['entries'])
+    result_add_only = ["+ " + msg for msg in sorted([new_entries[h] for h in new_hashes - old_hashes])]
+    result_removed = ["- [%s]" % h for h in sorted(old_hashes - new_hashes)]
+    return result_removed + result_add_only, result_add_only
+
 def _parse_contents(contents):
     """Parse PO file data, returning a list of msgid's.
 
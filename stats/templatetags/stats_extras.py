@@ -3,7 +3,7 @@ from django.conf import settings
 from django.utils.safestring import mark_safe
 from django.utils.translation import get_language_bidi
 
-from stats.models import PoFile, Statistics, FakeLangStatistics, FakeSummaryStatistics
+from stats.models import PoFile, Statistics, StatisticsRow, FakeLangStatistics, FakeSummaryStatistics
 
 register = template.Library()
 
@@ -30,6 +30,8 @@ def escapeat(value):
 
 @register.filter
 def domain_type(stat):
+    if isinstance(stat, StatisticsRow):
+        return stat.domain_type
     return stat.domain.get_type(stat.branch)
 
 @register.filter
@@ -39,7 +41,7 @@ def browse_bugs(module, content):
 @register.filter
 def num_stats(stat, scope='full'):
     """ Produce stat numbers as in: 85% (1265/162/85) """
-    if isinstance(stat, (Statistics, FakeLangStatistics, FakeSummaryStatistics)):
+    if isinstance(stat, (Statistics, StatisticsRow, FakeLangStatistics, FakeSummaryStatistics)):
         stats = {
             'prc':          stat.tr_percentage(scope),
             'translated':   stat.translated(scope),
@@ -97,7 +99,7 @@ def num_word_stats(stat, scope='full'):
 @register.filter
 def vis_stats(stat, scope='full'):
     """ Produce visual stats with green/red bar """
-    if isinstance(stat, (Statistics, FakeLangStatistics, FakeSummaryStatistics)):
+    if isinstance(stat, (Statistics, StatisticsRow, FakeLangStatistics, FakeSummaryStatistics)):
         trans, fuzzy, untrans = stat.tr_percentage(scope), stat.fu_percentage(scope), stat.un_percentage(scope)
     elif isinstance(stat, PoFile):
         trans, fuzzy, untrans = stat.tr_percentage(), stat.fu_percentage(), stat.un_percentage()
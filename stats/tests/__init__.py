@@ -19,17 +19,21 @@
 # 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
 import os, shutil
-from datetime import date
+import time
+from time import sleep
+from datetime import date, datetime, timedelta
 from django.test import TestCase
 from django.test.client import Client
+from django.core.cache import cache
 from django.core import mail
 from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse
 from django.conf import settings
 
-from stats.models import Module, Domain, Branch, Category, Release, Statistics, FakeLangStatistics, Information
-from stats.utils import check_program_presence, run_shell_command
+from stats.models import Module, Domain, Branch, Category, Release, Statistics, FakeLangStatistics, Information, ReleaseSummary, StatisticsRow, StatsGeneration
+from stats.utils import check_program_presence, run_shell_command, run_command
 from languages.models import Language
+from people.models import Person
 
 from fixture_factory import *
 
@@ -104,8 +108,7 @@ class ModuleTestCase(TestCase):
         checkout_path = branch.co_path()
         branch = Branch.objects.get(name="gnome-hello-1-4", module = self.mod)
         branch.delete()
-        # FIXME: deleting a git branch doesn't delete the repo
-        #self.assertFalse(os.access(checkout_path, os.F_OK))
+        self.assertFalse(os.access(checkout_path, os.F_OK))
 
     def testBranchSorting(self):
         b1 = Branch(name='a-branch', module=self.mod)
@@ -227,6 +230,33 @@ class StatisticsTests(TestCase):
         self.assertEqual(total_for_lang['ui']['untranslated'], 183)
         self.assertEqual(total_for_lang['ui_part']['untranslated'], 175)
 
+    def testTotalForLangByReleases(self):
+        lang = Language.objects.get(locale='bem')
+        releases = list(Release.objects.all())
+        self.assertTrue(len(releases) > 1)
+        with self.assertNumQueries(5):
+            stats = Release.total_for_lang_by_releases(releases, lang)
+        self.assertEqual(stats, [rel.total_for_lang(lang) for rel in releases])
+        rel_stats = [st for st in lang.get_release_stats() if st['name'] == 'gnome-2-30'][0]
+        self.assertEqual(rel_stats['ui']['untranslated'], 183)
+        self.assertEqual(rel_stats['ui_part']['untranslated'], 175)
+
+    def testTotalPartForAllLangs(self):
+        rel  = Release.objects.get(name="gnome-2-30")
+        pot_stats = Statistics.objects.filter(language__isnull=True, branch__releases=rel, domain__dtype='ui')
+        totals = rel.total_part_for_all_langs()
+        self.assertEqual(len(totals), Language.objects.count())
+        for lang in Language.objects.all():
+            expected = 0
+            for pot_stat in pot_stats:
+                try:
+                    stat = Statistics.objects.get(branch=pot_stat.branch, domain=pot_stat.domain, language=lang)
+                    expected += stat.part_po.translated + stat.part_po.fuzzy + stat.part_po.untranslated
+                except Statistics.DoesNotExist:
+                    expected += pot_stat.part_po.untranslated
+            self.assertEqual(totals[lang.locale], expected)
+            self.assertEqual(rel.total_part_for_lang(lang), expected)
+
     def testStatsLinks(self):
         pot_stats = Statistics.objects.get(
             branch__module__name='zenity', branch__name='gnome-2-30',
@@ -257,6 +287,543 @@ class StatisticsTests(TestCase):
         self.assertEqual(len(state), 1)
         self.assertTrue(isinstance(state[0], StateTranslating))
 
+    def testReleaseSummary(self):
+        def computed(rel):
+            results = rel.compute_global_stats().values()
+            results.sort(rel.compare_stats)
+            return results
+        rel = Release.objects.get(name="gnome-2-30")
+        self.assertEqual(ReleaseSummary.objects.filter(release=rel).count(), 0)
+        self.assertEqual(rel.get_global_stats(), computed(rel))
+        self.assertTrue(ReleaseSummary.objects.filter(release=rel, language__isnull=True).exists())
+        # Changing language stats refreshes the summary rows of that language
+        stat = Statistics.objects.get(branch__module__name='zenity', branch__name='gnome-2-30', language__locale='it', domain__dtype='ui')
+        stat.set_translation_stats('dummy', 100, 20, 16, reduced=False)
+        self.assertEqual(rel.get_global_stats(), computed(rel))
+        # Storing the same POT totals keeps the summary rows
+        pot_stat = Statistics.objects.get(branch=stat.branch, domain=stat.domain, language__isnull=True)
+        row_ids = set(ReleaseSummary.objects.filter(release=rel).values_list('id', flat=True))
+        pot_stat.set_translation_stats('dummy', 0, 0, pot_stat.full_po.untranslated, reduced=False)
+        self.assertEqual(set(ReleaseSummary.objects.filter(release=rel).values_list('id', flat=True)), row_ids)
+        # Changing the POT totals recomputes the summary at once
+        pot_stat.set_translation_stats('dummy', 0, 0, 140, reduced=False)
+        self.assertEqual(ReleaseSummary.objects.get(release=rel, language__isnull=True, dtype='ui').total,
+                         rel.total_strings()[1])
+        self.assertEqual(rel.get_global_stats(), computed(rel))
+
+    def testStatisticsRows(self):
+        from vertimus.models import StateTranslating, ActionWC
+        rel = Release.objects.get(name="gnome-2-30")
+        lang = Language.objects.get(locale='it')
+        self.assertEqual(StatisticsRow.objects.count(), Statistics.objects.count())
+        with self.assertNumQueries(2):
+            stats = Statistics.get_lang_stats_by_type(lang, 'ui', rel)
+        zenity = dict(stats['categs']['desktop']['modules'])['zenity']['gnome-2-30'][1][1]
+        stat = Statistics.objects.get(branch__module__name='zenity', branch__name='gnome-2-30', language=lang, domain__dtype='ui')
+        self.assertEqual(zenity.stat_id, stat.id)
+        self.assertEqual((zenity.translated(), zenity.fuzzy(), zenity.untranslated()),
+                         (stat.translated(), stat.fuzzy(), stat.untranslated()))
+        self.assertEqual(zenity.tr_percentage('part'), stat.tr_percentage('part'))
+        self.assertEqual(zenity.po_url(), stat.po_url())
+        self.assertEqual(zenity.state, None)
+        # Rows follow statistics and vertimus changes
+        stat.set_translation_stats('dummy', 100, 20, 16, reduced=False)
+        pers = Person.objects.create(username="toto")
+        state = StateTranslating.objects.create(branch=stat.branch, domain=stat.domain, language=lang, person=pers)
+        ActionWC.objects.create(state_db=state, person=pers, comment="Hi!")
+        stats = Statistics.get_lang_stats_by_type(lang, 'ui', rel)
+        zenity = dict(stats['categs']['desktop']['modules'])['zenity']['gnome-2-30'][1][1]
+        self.assertEqual((zenity.translated(), zenity.fuzzy(), zenity.untranslated()), (100, 20, 16))
+        self.assertEqual(zenity.state.name, 'Translating')
+        self.assertEqual(zenity.state.last_comment, "Hi!")
+        state.delete()
+        row = StatisticsRow.objects.get(branch=stat.branch, domain=stat.domain, language=lang)
+        self.assertEqual((row.stat_id, row.state_name, row.last_comment), (stat.id, None, None))
+        stat.delete()
+        self.assertFalse(StatisticsRow.objects.filter(branch=stat.branch, domain=stat.domain, language=lang).exists())
+
+    def testConditionalStatsPages(self):
+        url = reverse('stats.views.release', args=['gnome-2-30'])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+        # New translation stats change the generation
+        stat = Statistics.objects.get(branch__module__name='zenity', branch__name='gnome-2-30', language__locale='it', domain__dtype='ui')
+        stat.set_translation_stats('dummy', 100, 20, 16, reduced=False)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        # So do changes of the displayed objects
+        etag = response['ETag']
+        generation = StatsGeneration.current()[0]
+        Module.objects.get(name='zenity').save()
+        self.assertEqual(StatsGeneration.current()[0], generation + 1)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        Branch.objects.get(module__name='zenity', name='gnome-2-30').save(update_statistics=False)
+        self.assertEqual(StatsGeneration.current()[0], generation + 2)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def testBranchStatsFragments(self):
+        cache.clear()
+        url = reverse('stats.views.module', args=['zenity'])
+        response = self.client.get(url)
+        self.assertContains(response, "French (fr)")
+        self.assertNotContains(response, "Bemba (bem)")
+        # Missing languages of the user are merged into the cached tables
+        lang = Language.objects.get(locale='bem')
+        lang.team = Language.objects.get(locale='fr').team
+        lang.save()
+        bob = Person.objects.get(username='bob')
+        bob.set_password('bob')
+        bob.save()
+        self.client.login(username='bob', password='bob')
+        response = self.client.get(url)
+        self.assertContains(response, "Bemba (bem)")
+        # New statistics render the table again
+        stat = Statistics.objects.get(branch__module__name='zenity', branch__name='gnome-2-30', language__locale='it', domain__dtype='ui')
+        stat.set_translation_stats('dummy', 100, 20, 16, reduced=False)
+        response = self.client.get(url)
+        self.assertContains(response, '<span class="num1">   100</span> <span class="num2">   20</span>')
+
+    def testStatsCache(self):
+        import tempfile
+        from stats.utils import StatsCache
+        cache_dir = tempfile.mkdtemp()
+        try:
+            cache = StatsCache(cache_dir)
+            key = cache.make_key('po', 'abc', 'def', 'ui')
+            self.assertNotEqual(key, cache.make_key('po', 'abc', 'xyz', 'ui'))
+            self.assertEqual(cache.get(key), None)
+            cache.set(key, {'stats': {'translated': 3, 'errors': [["warn", "Warning"]]}})
+            self.assertEqual(StatsCache(cache_dir).get(key)['stats']['translated'], 3)
+            # Entries unused for some days are deleted, a hit marks the entry as used
+            other_key = cache.make_key('pot', 'abc')
+            cache.set(other_key, {})
+            old = time.time() - 40 * 24 * 3600
+            for k in (key, other_key):
+                os.utime(cache._path(k), (old, old))
+            cache.get(key)
+            cache.clean(30)
+            self.assertNotEqual(cache.get(key), None)
+            self.assertEqual(cache.get(other_key), None)
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def testPotInputsFingerprint(self):
+        import tempfile
+        from stats.utils import pot_inputs_fingerprint
+        src_dir = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(src_dir, "src"))
+            os.makedirs(os.path.join(src_dir, "po"))
+            po_path = os.path.join(src_dir, "po")
+            open(os.path.join(src_dir, "src", "main.c"), "w").write('_("Hello")')
+            open(os.path.join(po_path, "POTFILES.in"), "w").write("# Sources\n[encoding: UTF-8]src/main.c\n")
+            fprint = pot_inputs_fingerprint(po_path)
+            self.assertTrue(fprint)
+            # Translations and generated files are not inputs
+            open(os.path.join(po_path, "fr.po"), "w").write("")
+            self.assertEqual(pot_inputs_fingerprint(po_path), fprint)
+            open(os.path.join(src_dir, "src", "main.c"), "w").write('_("Hello world")')
+            fprint2 = pot_inputs_fingerprint(po_path)
+            self.assertNotEqual(fprint2, fprint)
+            open(os.path.join(src_dir, "src", "other.c"), "w").write('int i;')
+            fprint3 = pot_inputs_fingerprint(po_path)
+            self.assertNotEqual(fprint3, fprint2)
+            # Unlisted sources gaining translatable strings are reported by intltool-update -m
+            open(os.path.join(src_dir, "src", "other.c"), "w").write('_("Unlisted")')
+            self.assertNotEqual(pot_inputs_fingerprint(po_path), fprint3)
+            os.remove(os.path.join(po_path, "POTFILES.in"))
+            self.assertEqual(pot_inputs_fingerprint(po_path), None)
+        finally:
+            shutil.rmtree(src_dir)
+
+class GitMirrorTests(TestCase):
+    """ Tests with a local git repository as remote """
+    def setUp(self):
+        import tempfile
+        self.tmp_dir = tempfile.mkdtemp()
+        self.old_SCRATCHDIR, self.old_POTDIR = settings.SCRATCHDIR, settings.POTDIR
+        settings.SCRATCHDIR = os.path.join(self.tmp_dir, "scratch")
+        settings.POTDIR = os.path.join(settings.SCRATCHDIR, "POT")
+        self.repo = os.path.join(self.tmp_dir, "repo")
+        self._git("git init -q %s && cd %s && git config user.email a@b.c && git config user.name Tester"
+                  " && git checkout -q -b master" % (self.repo, self.repo))
+        self._commit("README")
+        self._git("cd %s && git branch gnome-2-30" % self.repo)
+        self.mod = Module.objects.create(name="testmod", vcs_type="git",
+            vcs_root="file://%s" % self.repo, vcs_web="http://example.org/")
+        for name in ("master", "gnome-2-30"):
+            Branch(name=name, module=self.mod).save(update_statistics=False)
+
+    def tearDown(self):
+        settings.SCRATCHDIR, settings.POTDIR = self.old_SCRATCHDIR, self.old_POTDIR
+        shutil.rmtree(self.tmp_dir)
+
+    def _git(self, command):
+        status, output, errs = run_shell_command(command)
+        self.assertEqual(status, 0, errs)
+
+    def _commit(self, file_name):
+        open(os.path.join(self.repo, file_name), "a").write("Line\n")
+        self._git("cd %s && git add %s && git commit -q -m Commit" % (self.repo, file_name))
+
+    def testFetchMirrors(self):
+        from stats.models import fetch_mirrors
+        if not check_program_presence("git"):
+            return
+        self.assertEqual(fetch_mirrors([self.mod]), {self.mod.id: (set(["master", "gnome-2-30"]), None)})
+        # Branches stay outdated until they are updated
+        self.assertEqual(fetch_mirrors([self.mod]), {self.mod.id: (set(["master", "gnome-2-30"]), None)})
+        for branch in self.mod.branch_set.all():
+            branch.vcs_revision = branch.mirror_revision()
+            branch.stats_fingerprint = branch.stats_settings_fingerprint()
+            branch.save(update_statistics=False)
+        self.assertEqual(fetch_mirrors([self.mod]), {self.mod.id: (set(), None)})
+        self._commit("NEWS")
+        self.assertEqual(fetch_mirrors([self.mod]), {self.mod.id: (set(["master"]), None)})
+        # Changed statistics settings also make branches outdated
+        Domain.objects.create(module=self.mod, name="po", directory="po", dtype="ui")
+        self.assertEqual(fetch_mirrors([self.mod]), {self.mod.id: (set(["master", "gnome-2-30"]), None)})
+        # Errors are reported by module
+        self.mod.vcs_root = "file:///nonexistent/repo"
+        shutil.rmtree(self.mod.mirror_path())
+        outdated, error = fetch_mirrors([self.mod])[self.mod.id]
+        self.assertNotEqual(error, None)
+
+    def testWorktrees(self):
+        if not check_program_presence("git"):
+            return
+        master = Branch.objects.get(module=self.mod, name="master")
+        stable = Branch.objects.get(module=self.mod, name="gnome-2-30")
+        self._commit("NEWS")
+        master.checkout()
+        stable.checkout(fetch=False)
+        self.assertNotEqual(master.co_path(), stable.co_path())
+        self.assertTrue(os.access(os.path.join(master.co_path(), "NEWS"), os.F_OK))
+        self.assertFalse(os.access(os.path.join(stable.co_path(), "NEWS"), os.F_OK))
+        stable.delete()
+        self.assertFalse(os.access(stable.co_path(), os.F_OK))
+
+    def testCommitPo(self):
+        from people.models import Person
+        from stats.models import StatsJob
+        if not check_program_presence("git"):
+            return
+        os.makedirs(os.path.join(self.repo, "po"))
+        self._commit("po/POTFILES.in")
+        self._git("cd %s && git branch -f gnome-2-30 master" % self.repo)
+        stable = Branch.objects.get(module=self.mod, name="gnome-2-30")
+        domain = Domain.objects.create(module=self.mod, name="po", directory="po", dtype="ui")
+        stable.checkout()
+        self._git("cd %s && git config user.email a@b.c && git config user.name Tester" % self.mod.mirror_path())
+        # The branch moved upstream since the checkout, and the worktree has local changes
+        self._commit("NEWS")
+        self._git("cd %s && git branch -f gnome-2-30 master" % self.repo)
+        open(os.path.join(stable.co_path(), "README"), "a").write("Local change\n")
+        po_file = os.path.join(self.tmp_dir, "fr.po")
+        open(po_file, "w").write('msgid ""\nmsgstr ""\n')
+        stable.is_vcs_readonly = lambda: False
+        stable.commit_po(po_file, domain, Language.objects.create(name="French", locale="fr"),
+                         Person.objects.create(username="john", first_name="John", email="john@example.org"))
+        # The commit is based on the current head of the branch, and only contains the po file
+        status, output, errs = run_shell_command(
+            "cd %s && git diff --name-only master gnome-2-30 && git log -1 --format=%%s gnome-2-30^" % self.repo)
+        self.assertEqual(output, "po/fr.po\nCommit\n")
+        self.assertEqual(StatsJob.objects.get(branch=stable).languages, "fr")
+
+    def testUpdateStatsUnchangedRevision(self):
+        if not check_program_presence("git"):
+            return
+        master = Branch.objects.get(module=self.mod, name="master")
+        master.update_stats(force=False)
+        revision = Branch.objects.get(pk=master.pk).vcs_revision
+        self.assertEqual(len(revision), 40)
+        # The checkout is not even touched when the head did not move
+        dummy_path = os.path.join(master.co_path(), "dummy")
+        open(dummy_path, "w").write("")
+        master.update_stats(force=False)
+        self.assertTrue(os.access(dummy_path, os.F_OK))
+        self._commit("NEWS")
+        master.update_stats(force=False)
+        self.assertFalse(os.access(dummy_path, os.F_OK))
+        self.assertNotEqual(Branch.objects.get(pk=master.pk).vcs_revision, revision)
+
+    def testStatsJobs(self):
+        from stats.models import StatsJob
+        if not check_program_presence("git"):
+            return
+        master = Branch.objects.get(module=self.mod, name="master")
+        stable = Branch.objects.get(module=self.mod, name="gnome-2-30")
+        job = StatsJob.enqueue(master, fetch=False)
+        # Pending jobs of a branch are merged
+        self.assertEqual(StatsJob.enqueue(master, force=True).pk, job.pk)
+        job = StatsJob.objects.get(pk=job.pk)
+        self.assertTrue(job.force and job.fetch)
+        StatsJob.enqueue(stable)
+        self.assertEqual(StatsJob.queue_status()['pending'], 2)
+        # Only one job of a module can run at a time
+        job = StatsJob.claim_next()
+        self.assertEqual((job.branch, job.status), (master, 'running'))
+        self.assertEqual(StatsJob.claim_next(), None)
+        job.run()
+        self.assertEqual(StatsJob.objects.get(pk=job.pk).status, 'done', job.error)
+        self.assertEqual(len(Branch.objects.get(pk=master.pk).vcs_revision), 40)
+        self.assertEqual(StatsJob.claim_next().branch, stable)
+        status = StatsJob.queue_status()
+        self.assertEqual((status['pending'], status['running'], status['finished']), (0, 1, 1))
+
+    def testProfiledUpdate(self):
+        from stats.models import StatsRun
+        if not check_program_presence("git"):
+            return
+        master = Branch.objects.get(module=self.mod, name="master")
+        master.update_stats(force=False, fetch=False, profile=True)
+        run = StatsRun.objects.get(branch=master)
+        steps = dict([(name, (calls, seconds)) for name, calls, seconds in run.steps])
+        self.assertEqual(steps['checkout'][0], 1)
+        self.assertTrue(run.spawned_commands > 0)
+        self.assertEqual(run.steps, sorted(run.steps, key=lambda step: step[2], reverse=True))
+        # Not recorded by default
+        master.update_stats(force=True, fetch=False)
+        self.assertEqual(StatsRun.objects.count(), 1)
+
+    def testConcurrentStatsJobClaims(self):
+        from stats.models import StatsJob, LockTimeout
+        master = Branch.objects.get(module=self.mod, name="master")
+        stable = Branch.objects.get(module=self.mod, name="gnome-2-30")
+        StatsJob.enqueue(master)
+        StatsJob.enqueue(stable)
+        # A second worker tries to claim a job while the first one is claiming
+        busy_modules = StatsJob._busy_modules
+        original = StatsJob.__dict__['_busy_modules']
+        concurrent = []
+        def racing_busy_modules():
+            result = busy_modules()
+            try:
+                concurrent.append(StatsJob.claim_next(timeout=0.5))
+            except LockTimeout, e:
+                concurrent.append(e)
+            return result
+        StatsJob._busy_modules = staticmethod(racing_busy_modules)
+        try:
+            job = StatsJob.claim_next()
+        finally:
+            StatsJob._busy_modules = original
+        self.assertEqual(job.branch, master)
+        self.assertTrue(isinstance(concurrent[0], LockTimeout))
+        self.assertEqual(StatsJob.objects.filter(status='running').count(), 1)
+
+    def testCoalescedStatsJobs(self):
+        from stats.models import StatsJob
+        master = Branch.objects.get(module=self.mod, name="master")
+        job = StatsJob.enqueue(master, fetch=False, domains=["po"], languages=["fr"], delay=60)
+        self.assertNotEqual(job.not_before, None)
+        self.assertEqual(StatsJob.claim_next(), None)
+        job = StatsJob.enqueue(master, fetch=False, domains=["po"], languages=["de"], delay=60)
+        self.assertEqual((job.get_domains(), job.get_languages()), (["po"], ["de", "fr"]))
+        self.assertEqual(StatsJob.objects.filter(status='pending').count(), 1)
+        # A full update is not delayed
+        job = StatsJob.enqueue(master, force=True)
+        self.assertEqual((job.get_domains(), job.get_languages(), job.not_before), (None, None, None))
+        self.assertEqual(StatsJob.claim_next().pk, job.pk)
+
+    def testPartialUpdateReusesPot(self):
+        if not check_program_presence("git"):
+            return
+        os.mkdir(os.path.join(self.repo, "po"))
+        open(os.path.join(self.repo, "po", "testmod.pot"), "w").write('msgid "One"\nmsgstr ""\n')
+        self._git("cd %s && git add po && git commit -q -m Pot" % self.repo)
+        runs_path = os.path.join(self.tmp_dir, "pot-runs")
+        Domain.objects.create(module=self.mod, name="po", dtype="ui", directory="po",
+                              pot_method="echo run >> %s" % runs_path)
+        master = Branch.objects.get(module=self.mod, name="master")
+        pot_runs = lambda: len(open(runs_path).readlines())
+        master.update_stats(force=False)
+        self.assertEqual(pot_runs(), 1)
+        master.update_stats(force=True, languages=["fr"], reuse_pot=True)
+        self.assertEqual(pot_runs(), 1)
+        master.update_stats(force=True, domains=["po"])
+        self.assertEqual(pot_runs(), 2)
+
+    def testPartialUpdate(self):
+        if not check_program_presence("git") or not check_program_presence("msgmerge"):
+            return
+        po_dir = os.path.join(self.repo, "po")
+        os.mkdir(po_dir)
+        entry = 'msgid "%s"\nmsgstr "%s"\n\n'
+        open(os.path.join(po_dir, "testmod.pot"), "w").write(entry % ("", "Content-Type: text/plain; charset=UTF-8\\n") +
+                                                              entry % ("One", "") + entry % ("Two", ""))
+        for lang in ("fr", "de"):
+            open(os.path.join(po_dir, "%s.po" % lang), "w").write(
+                entry % ("", "Content-Type: text/plain; charset=UTF-8\\n") + entry % ("One", "Un"))
+        self._git("cd %s && git add po && git commit -q -m Po" % self.repo)
+        Domain.objects.create(module=self.mod, name="po", dtype="ui", directory="po", pot_method=":")
+        master = Branch.objects.get(module=self.mod, name="master")
+        master.update_stats(force=False)
+        revision = Branch.objects.get(pk=master.pk).vcs_revision
+        for lang in ("fr", "de"):
+            open(os.path.join(po_dir, "%s.po" % lang), "a").write(entry % ("Two", "Deux"))
+        self._git("cd %s && git commit -q -a -m Translated" % self.repo)
+        master.update_stats(force=False, domains=["po"], languages=["fr"])
+        get_stat = lambda locale: Statistics.objects.get(branch=master, language__locale=locale)
+        self.assertEqual((get_stat("fr").translated(), get_stat("de").translated()), (2, 1))
+        # The branch revision is only stored after a complete update
+        self.assertEqual(Branch.objects.get(pk=master.pk).vcs_revision, revision)
+
+    def testCommitJobPotChange(self):
+        from stats.models import StatsJob
+        if not check_program_presence("git") or not check_program_presence("msgmerge"):
+            return
+        po_dir = os.path.join(self.repo, "po")
+        os.mkdir(po_dir)
+        entry = 'msgid "%s"\nmsgstr "%s"\n\n'
+        header = entry % ("", "Content-Type: text/plain; charset=UTF-8\\n")
+        open(os.path.join(po_dir, "testmod.pot"), "w").write(header + entry % ("One", ""))
+        for lang in ("fr", "de"):
+            open(os.path.join(po_dir, "%s.po" % lang), "w").write(header + entry % ("One", "Un"))
+        self._git("cd %s && git add po && git commit -q -m Po" % self.repo)
+        Domain.objects.create(module=self.mod, name="po", dtype="ui", directory="po", pot_method=":")
+        master = Branch.objects.get(module=self.mod, name="master")
+        master.update_stats(force=False)
+        # A new string comes with the next commit of a translation
+        open(os.path.join(po_dir, "testmod.pot"), "a").write(entry % ("Two", ""))
+        open(os.path.join(po_dir, "fr.po"), "a").write(entry % ("Two", "Deux"))
+        self._git("cd %s && git commit -q -a -m Translated" % self.repo)
+        job = StatsJob.enqueue(master, domains=["po"], languages=["fr"])
+        job.run()
+        self.assertEqual(job.status, 'done', job.error)
+        # The POT file changed, so all po files were merged again
+        get_stat = lambda locale: Statistics.objects.get(branch=master, language__locale=locale)
+        self.assertEqual((get_stat("fr").translated(), get_stat("fr").untranslated()), (2, 0))
+        self.assertEqual((get_stat("de").translated(), get_stat("de").untranslated()), (1, 1))
+
+class ModuleLockTests(TestCase):
+    def setUp(self):
+        self.mod = Module.objects.create(name="testmod", vcs_type="git",
+            vcs_root="file:///tmp/testmod", vcs_web="http://example.org/")
+        self.old_backend = getattr(settings, 'LOCK_BACKEND', 'file')
+
+    def tearDown(self):
+        settings.LOCK_BACKEND = self.old_backend
+
+    def _test_timeout(self):
+        from stats.models import ModuleLock, LockTimeout
+        with ModuleLock(self.mod):
+            self.assertRaises(LockTimeout, ModuleLock(self.mod, timeout=0.5).__enter__)
+            # timeout=0 fails immediately
+            self.assertRaises(LockTimeout, ModuleLock(self.mod, timeout=0).__enter__)
+            # A lock on a branch is independent from the module lock
+            branch = Branch(name="master", module=self.mod)
+            with ModuleLock(self.mod, branch, timeout=0.5) as branch_lock:
+                self.assertTrue(branch_lock.wait_time < 0.5)
+        # Released lock can be taken again
+        with ModuleLock(self.mod, timeout=0.5):
+            pass
+
+    def testBranchLock(self):
+        git_branch = Branch(name="master", module=self.mod)
+        self.assertEqual(git_branch.update_lock().lock_name, "updating-testmod.master")
+        # Branches of other VCS types share the module checkout
+        svn_mod = Module(name="svnmod", vcs_type="svn", vcs_root="http://example.org/svn")
+        svn_branch = Branch(name="trunk", module=svn_mod)
+        self.assertEqual(svn_branch.update_lock().lock_name, "updating-svnmod")
+
+    def testFileLock(self):
+        import threading
+        from stats.models import ModuleLock
+        settings.LOCK_BACKEND = 'file'
+        self._test_timeout()
+        # The waiter is woken up as soon as the lock is released
+        lock = ModuleLock(self.mod)
+        lock.__enter__()
+        waiter = ModuleLock(self.mod)
+        thread = threading.Thread(target=waiter.__enter__)
+        thread.start()
+        sleep(0.5)
+        lock.__exit__()
+        thread.join(5)
+        waiter.__exit__()
+        self.assertTrue(0.4 < waiter.wait_time < 2)
+
+    def testDbLock(self):
+        from stats.models import UpdateLock
+        import socket
+        settings.LOCK_BACKEND = 'db'
+        self._test_timeout()
+        self.assertEqual(UpdateLock.objects.count(), 0)
+        # Lock left by a dead process on this host
+        dead_pid = 2**22 + 1
+        UpdateLock.objects.create(name="updating-testmod", host=socket.gethostname(), pid=dead_pid)
+        from stats.models import ModuleLock, LockTimeout
+        with ModuleLock(self.mod, timeout=1):
+            self.assertEqual(UpdateLock.objects.get(name="updating-testmod").pid, os.getpid())
+        # Lock left by a crashed process of another host, stale once it is too old
+        lock = UpdateLock.objects.create(name="updating-testmod", host="otherhost", pid=os.getpid())
+        self.assertRaises(LockTimeout, ModuleLock(self.mod, timeout=0.5).__enter__)
+        UpdateLock.objects.filter(pk=lock.pk).update(acquired=datetime.now() - timedelta(days=1))
+        with ModuleLock(self.mod, timeout=1):
+            self.assertEqual(UpdateLock.objects.get(name="updating-testmod").host, socket.gethostname())
+
+class CommandTests(TestCase):
+    def testRunCommand(self):
+        from stats.utils import Profiler, STATUS_NOT_FOUND
+        profiler = Profiler()
+        # Arguments are not interpreted by a shell
+        status, output, errs = run_command(["echo", "a  b", "$HOME;"])
+        self.assertEqual((status, output), (0, "a  b $HOME;\n"))
+        # The environment is only given to the command
+        status, output, errs = run_command(["sh", "-c", "echo $DL_TEST_VAR"], env={'DL_TEST_VAR': "value"})
+        self.assertEqual(output, "value\n")
+        self.assertFalse('DL_TEST_VAR' in os.environ)
+        self.assertEqual(run_command(["pwd"], cwd="/")[1], "/\n")
+        self.assertEqual(run_command(["cat"], input_data="data")[1], "data")
+        self.assertEqual(run_command(["dl-unknown-command"])[0], STATUS_NOT_FOUND)
+        self.assertRaises(OSError, run_command, ["false"], raise_on_error=True)
+        # Commands are killed after timeout
+        start = time.time()
+        status, output, errs = run_command(["sleep", "10"], timeout=0.5)
+        self.assertTrue(time.time() - start < 5)
+        self.assertNotEqual(status, 0)
+        status, output, errs = run_shell_command("sleep 10 | cat", timeout=0.5)
+        self.assertTrue(time.time() - start < 10)
+        # Children of the command keeping its output open are also killed
+        start = time.time()
+        status, output, errs = run_command(["sh", "-c", "sleep 10; echo done"], timeout=0.5)
+        self.assertTrue(time.time() - start < 5)
+        self.assertEqual(output, "")
+        commands = dict([(c[0], c[1:]) for c in profiler.commands()])
+        self.assertEqual(commands['echo'][0], 1)
+        self.assertEqual(commands['false'][2], 1) # failures
+        self.assertEqual(commands['sleep'][3], 2) # timeouts
+        self.assertEqual(profiler.spawned_commands(), 9)
+
+    def testSharedCommandSlots(self):
+        from multiprocessing import Process
+        from stats import utils
+        old_slots, old_max = utils._command_slots, utils.MAX_RUNNING_COMMANDS
+        utils.MAX_RUNNING_COMMANDS = 1
+        try:
+            utils.share_command_slots()
+            # Commands of forked processes are run one after the other
+            start = time.time()
+            workers = [Process(target=run_command, args=(["sleep", "0.5"],)) for i in range(2)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            self.assertTrue(time.time() - start >= 1)
+        finally:
+            utils._command_slots, utils.MAX_RUNNING_COMMANDS = old_slots, old_max
+
 class FigureTests(TestCase):
     fixtures = ['sample_data.json']
     def testFigureView(self):
@@ -285,3 +852,136 @@ class FigureTests(TestCase):
         errs = check_identical_figures(doc_stat.get_figures(), os.path.join(branch.co_path(), 'help'), 'fr')
         self.assertEqual(len(errs), 1)
         self.assertTrue(errs[0][1].startswith("Figures should not be copied"))
+
+class PoParserTests(TestCase):
+    po_content = """# Test file
+msgid ""
+msgstr ""
+"Content-Type: text/plain; charset=UTF-8\\n"
+
+#: src/main.c:12
+msgid "Hello world"
+msgstr "Bonjour le monde"
+
+#: src/main.c:15
+#, fuzzy, c-format
+msgid "%d file"
+msgid_plural "%d files"
+msgstr[0] "%d fichier"
+msgstr[1] "%d fichiers"
+
+msgctxt "menu"
+msgid ""
+"Open a "
+"new window"
+msgstr ""
+
+#~ msgid "Obsolete string"
+#~ msgstr "Chaîne obsolète"
+"""
+
+    def testParse(self):
+        from stats import poparser
+        entries = list(poparser.parse(self.po_content.splitlines(True)))
+        self.assertEqual(len(entries), 5)
+        self.assertTrue(entries[0].is_header())
+        self.assertEqual(entries[0].header_value("Content-Type"), "text/plain; charset=UTF-8")
+        self.assertEqual(entries[1].locations, ['src/main.c:12'])
+        self.assertTrue(entries[2].is_fuzzy())
+        self.assertEqual(entries[2].msgstr, ["%d fichier", "%d fichiers"])
+        self.assertEqual(entries[3].key(), ("menu", "Open a new window"))
+        self.assertFalse(entries[3].is_header())
+        self.assertTrue(entries[4].obsolete)
+        self.assertRaises(poparser.ParseError, list, poparser.parse(['msgid "a"\n', 'bogus "b"\n']))
+        # Obsolete entries without a blank line before them
+        entries = list(poparser.parse(['msgid "a"\n', 'msgstr "b"\n', '#~ msgid "c"\n', '#~ msgstr "d"\n',
+                                       '#~| msgid "e"\n', '#~ msgid "f"\n', '#~ msgstr ""\n']))
+        self.assertEqual([(e.msgid, e.obsolete) for e in entries], [("a", False), ("c", True), ("f", True)])
+
+    def testDiff(self):
+        from stats import poparser
+        new_content = self.po_content.replace('msgstr "Bonjour le monde"', 'msgstr "Salut le monde"'
+            ).replace('#, fuzzy, c-format', '#, c-format').replace('#: src/main.c:15', '#: src/other.c:15')
+        new_content += '\nmsgid "New string"\nmsgstr ""\n'
+        new_content = new_content.replace('msgctxt "menu"', 'msgctxt "toolbar"')
+        diff = list(poparser.diff_po(self.po_content.splitlines(True), new_content.splitlines(True)))
+        self.assertEqual([(old and old.msgid, new and new.msgid) for old, new in diff], [
+            ("Hello world", "Hello world"),
+            ("%d file", "%d file"),
+            (None, "Open a new window"),
+            (None, "New string"),
+            ("Open a new window", None),
+        ])
+        self.assertEqual(list(poparser.diff_po(self.po_content.splitlines(True),
+            self.po_content.replace("#: ", "#: moved/").splitlines(True))), [])
+
+    def testStats(self):
+        from stats import poparser
+        stats = poparser.po_stats(self.po_content.splitlines(True), check_utf8=True)
+        self.assertEqual((stats['translated'], stats['fuzzy'], stats['untranslated']), (1, 1, 1))
+        self.assertEqual((stats['translated_words'], stats['fuzzy_words'], stats['untranslated_words']), (2, 4, 4))
+        self.assertTrue(stats['utf8'])
+        latin1 = self.po_content.replace("UTF-8", "ISO-8859-1").decode('utf-8').encode('latin-1')
+        self.assertFalse(poparser.po_stats(latin1.splitlines(True), check_utf8=True)['utf8'])
+
+    def testPotDiffStatus(self):
+        import tempfile
+        from stats import potdiff
+        from stats.utils import pot_diff_status, NOT_CHANGED, CHANGED_ONLY_FORMATTING, CHANGED_WITH_ADDITIONS
+        pot_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "help_mallard", "gnome-help-itstool.pot")
+        content = open(pot_path).read()
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            old_pot, new_pot = os.path.join(tmp_dir, "old.pot"), os.path.join(tmp_dir, "new.pot")
+            open(old_pot, "w").write(content)
+            potdiff.save_fingerprint(old_pot, potdiff.fingerprint(old_pot)[0])
+            open(new_pot, "w").write(content.replace("POT-Creation-Date: 20", "POT-Creation-Date: 19"))
+            self.assertEqual(pot_diff_status(old_pot, new_pot), (NOT_CHANGED, ""))
+            open(new_pot, "w").write(content.replace("#: ", "#: moved/"))
+            self.assertEqual(pot_diff_status(old_pot, new_pot), (CHANGED_ONLY_FORMATTING, ""))
+            open(new_pot, "w").write(content + '\nmsgctxt "ctx"\nmsgid "New string"\nmsgstr ""\n')
+            status, diff = pot_diff_status(old_pot, new_pot)
+            self.assertEqual(status, CHANGED_WITH_ADDITIONS)
+            self.assertEqual(diff, ['+ "ctx"::"New string"'])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def testReducedPo(self):
+        import tempfile
+        from stats.utils import generate_reduced_po, is_po_reduced, po_file_stats
+        po_content = self.po_content + """
+#: data/org.gnome.app.gschema.xml.in.h:1
+msgid "Window width"
+msgstr ""
+"""
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            po_path = os.path.join(tmp_dir, "fr.po")
+            open(po_path, "w").write(po_content)
+            part_po_path, part_stats = generate_reduced_po(po_path, None, 4)
+            self.assertEqual(part_po_path, os.path.join(tmp_dir, "fr.reduced.po"))
+            self.assertEqual((part_stats['translated'], part_stats['fuzzy'], part_stats['untranslated']), (1, 1, 1))
+            self.assertEqual(part_stats['untranslated_words'], 4)
+            self.assertTrue(is_po_reduced(part_po_path))
+            self.assertFalse(is_po_reduced(po_path))
+            content = open(part_po_path).read()
+            self.assertFalse("Window width" in content)
+            self.assertTrue("Chaîne obsolète" in content)
+            stats = po_file_stats(part_po_path, msgfmt_checks=False)
+            self.assertEqual(stats['untranslated_words'], 4)
+            # Nothing to strip
+            self.assertEqual(generate_reduced_po(po_path, "locations|nomatch", 4), None)
+            self.assertFalse(os.access(part_po_path, os.F_OK))
+            self.assertEqual(generate_reduced_po(po_path, "-", 4), None)
+            self.assertEqual(generate_reduced_po(po_path, "badfield|gschema", 4), None)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def testPotFileStats(self):
+        from stats.utils import po_file_stats
+        pot_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "help_mallard", "gnome-help-itstool.pot")
+        stats = po_file_stats(pot_path, msgfmt_checks=False)
+        self.assertEqual(stats['errors'], [])
+        self.assertEqual(stats['translated'], 0)
+        self.assertTrue(stats['untranslated'] > 0)
+        self.assertTrue(stats['untranslated_words'] > stats['untranslated'])
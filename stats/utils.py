@@ -20,24 +20,23 @@
 # 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
 import sys, os, re, time
-import hashlib
+import glob, hashlib, pipes, signal
 from itertools import islice
 from subprocess import Popen, PIPE
+from multiprocessing.pool import ThreadPool
 import errno
-
-try:
-    from translate.tools import pogrep, pocount
-    has_toolkit = True
-except ImportError:
-    has_toolkit = False
+import thread, threading
+import multiprocessing
 
 from django.conf import settings
 from django.contrib.sites.models import Site
 from django.core.files.base import File
 from django.core.mail import send_mail
+from django.utils import simplejson
 from django.utils.translation import ugettext_noop
 
 import potdiff
+import poparser
 
 STATUS_OK = 0
 
@@ -47,6 +46,23 @@ CHANGED_WITH_ADDITIONS  = 2
 CHANGED_NO_ADDITIONS    = 3
 
 ITSTOOL_PATH = getattr(settings, 'ITSTOOL_PATH', '')
+# Number of threads used to process the language files of a domain
+UPDATE_STATS_WORKERS = getattr(settings, 'UPDATE_STATS_WORKERS', 4)
+# Maximum number of simultaneous connections when fetching VCS repositories
+FETCH_CONNECTIONS = getattr(settings, 'FETCH_CONNECTIONS', 4)
+
+# Maximum number of commands running at the same time (in all processes sharing the
+# budget, see share_command_slots)
+MAX_RUNNING_COMMANDS = getattr(settings, 'MAX_RUNNING_COMMANDS', 8)
+# Default number of seconds after which a command is killed
+COMMAND_TIMEOUT = getattr(settings, 'COMMAND_TIMEOUT', 1800)
+# Status returned when a command cannot be started (as /bin/sh does)
+STATUS_NOT_FOUND = 127
+
+_command_slots = threading.BoundedSemaphore(MAX_RUNNING_COMMANDS)
+# Commands run in this process: tool name -> [calls, seconds, failures, timeouts] (see Profiler)
+_command_stats = {}
+_command_lock = threading.Lock()
 
 class DocFormat(object):
     itstool_regex = re.compile("^msgid \"external ref=\'(?P<path>[^\']*)\' md5=\'(?P<hash>[^\']*)\'\"")
@@ -55,14 +71,18 @@ class DocFormat(object):
         self.format = is_mallard and "mallard" or "docbook"
         self.tool = is_itstool and "itstool" or "xml2po"
 
-    @property
-    def command(self):
+    def __repr__(self):
+        # Stable representation, used in StatsCache keys
+        return "DocFormat(%s, %s)" % (self.tool, self.format)
+
+    def command(self, potfile, files):
+        """ Return the argv of the pot generation command """
         if self.tool == "itstool":
-            return "cd \"%%(dir)s\" && %sitstool -o %%(potfile)s %%(files)s" % ITSTOOL_PATH
+            return [ITSTOOL_PATH + "itstool", "-o", potfile] + files
         elif self.format == "mallard":
-            return "cd \"%(dir)s\" && xml2po -m mallard -o %(potfile)s -e %(files)s"
+            return ["xml2po", "-m", "mallard", "-o", potfile, "-e"] + files
         else:
-            return "cd \"%(dir)s\" && xml2po -o %(potfile)s -e %(files)s"
+            return ["xml2po", "-o", potfile, "-e"] + files
 
     @property
     def module_var(self):
@@ -122,65 +142,162 @@ def ellipsize(val, length):
         val = "%s..." % val[:length]
     return val
 
-def run_shell_command(cmd, env=None, input_data=None, raise_on_error=False):
-    if settings.DEBUG: print >>sys.stderr, cmd
+def share_command_slots():
+    """ Make the MAX_RUNNING_COMMANDS budget global to this process and the processes it
+        forks afterwards (worker pools), and return the shared semaphore """
+    global _command_slots
+    _command_slots = multiprocessing.BoundedSemaphore(MAX_RUNNING_COMMANDS)
+    return _command_slots
+
+def command_line(argv):
+    """ Return argv as a (shell quoted) command line, for display """
+    return " ".join([pipes.quote(arg) for arg in argv])
+
+def run_command(argv, cwd=None, env=None, input_data=None, raise_on_error=False, timeout=None):
+    """ Run the argv command (a list of arguments, no shell involved) and return a
+        (status, output, errout) tuple.
+        env items are added to the environment of the command (os.environ is not modified),
+        the command is killed after timeout seconds (default COMMAND_TIMEOUT setting).
+        At most MAX_RUNNING_COMMANDS commands run at the same time in the process (or in all
+        worker processes, see share_command_slots), others are waiting. """
+    return _run(argv, os.path.basename(argv[0]), False, cwd, env, input_data, raise_on_error, timeout)
+
+def run_shell_command(cmd, env=None, input_data=None, raise_on_error=False, timeout=None, cwd=None):
+    """ Same as run_command, for a command line which needs the shell (pipes, redirections,
+        commands configured in the database). Prefer run_command otherwise. """
+    return _run(cmd, cmd.split(" ", 1)[0], True, cwd, env, input_data, raise_on_error, timeout)
+
+def _kill_command(pipe):
+    try:
+        # The command runs in its own process group, so as its children (shell pipelines,
+        # git helpers keeping the output open...) are also killed
+        os.killpg(pipe.pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+def _run(cmd, tool, shell, cwd, env, input_data, raise_on_error, timeout):
+    if settings.DEBUG: print >>sys.stderr, shell and cmd or command_line(cmd)
 
-    stdin = None
-    if input_data:
-        stdin = PIPE
     if env:
-        os.environ.update(env)
-        env = os.environ
-    pipe = Popen(cmd, shell=True, env=env, stdin=stdin, stdout=PIPE, stderr=PIPE)
-    if input_data:
+        env = dict(os.environ, **env)
+    if timeout is None:
+        timeout = COMMAND_TIMEOUT
+    timed_out = []
+    with _command_slots:
+        start = time.time()
         try:
-            pipe.stdin.write(input_data)
-        except IOError, e:
-            if e.errno != errno.EPIPE:
+            pipe = Popen(cmd, shell=shell, cwd=cwd, env=env, stdin=input_data and PIPE or None,
+                         stdout=PIPE, stderr=PIPE, close_fds=True, preexec_fn=os.setpgrp)
+        except OSError, e:
+            # Unknown command or cwd
+            pipe = None
+            status, output, errout = STATUS_NOT_FOUND, "", str(e)
+        if pipe is not None:
+            def kill_on_timeout():
+                timed_out.append(True)
+                _kill_command(pipe)
+            timer = None
+            if timeout:
+                timer = threading.Timer(timeout, kill_on_timeout)
+                timer.start()
+            try:
+                if input_data:
+                    try:
+                        pipe.stdin.write(input_data)
+                    except IOError, e:
+                        if e.errno != errno.EPIPE:
+                            raise
+                (output, errout) = pipe.communicate()
+            except:
+                _kill_command(pipe)
                 raise
-    (output, errout) = pipe.communicate()
-    status = pipe.returncode
+            finally:
+                if timer:
+                    timer.cancel()
+            status = pipe.returncode
+            if timed_out:
+                errout += "\nCommand killed after %d seconds." % timeout
+        _record_command(tool, time.time() - start, status, bool(timed_out))
     if settings.DEBUG: print >>sys.stderr, output + errout
     if raise_on_error and status != STATUS_OK:
         raise OSError(status, errout)
 
     return (status, output, errout)
 
+def _record_command(tool, seconds, status, timed_out):
+    with _command_lock:
+        stats = _command_stats.setdefault(tool, [0, 0.0, 0, 0])
+        stats[0] += 1
+        stats[1] += seconds
+        stats[2] += int(status != STATUS_OK)
+        stats[3] += int(timed_out)
+
+def run_in_pool(func, items, workers=None):
+    """ Apply func to each item of items in a pool of threads and return the list of results.
+        Threads are sufficient as the heavy work is done in child processes. """
+    workers = min(workers or UPDATE_STATS_WORKERS, len(items))
+    if workers <= 1:
+        return map(func, items)
+    pool = ThreadPool(workers)
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.close()
+        pool.join()
+
 def check_program_presence(prog_name):
     """ Test if prog_name is an available command on the system """
-    status, output, err = run_shell_command("which %s" % prog_name)
+    status, output, err = run_command(["which", prog_name])
     return status == 0
 
-def po_grep(in_file, out_file, filter_):
-    if not has_toolkit or filter_ == u"-":
-        return
+def po_grep(in_file, out_file, filter_, headers=None):
+    """ Write to out_file the entries of in_file not matching filter_ ("location|regex",
+        the default filter strips gsettings schemas strings), adding headers to the po header.
+        Returns the statistics of out_file, or None if nothing was written ("-" filter). """
+    if filter_ == u"-":
+        return None
     if not filter_:
         filter_loc, filter_str = "locations", "gschema.xml.in|schemas.in"
     else:
         try:
-            filter_loc, filter_str = filter_.split("|")
-        except:
+            filter_loc, filter_str = filter_.split("|", 1)
+            if filter_loc not in poparser.FILTER_FIELDS:
+                raise ValueError
+        except ValueError:
             # Probably bad filter syntax in DB (TODO: log it)
-            return
-    grepfilter = pogrep.GrepFilter(filter_str, filter_loc, useregexp=True, invertmatch=True, keeptranslations=True)
-    out = open(out_file, "w")
-    pogrep.rungrep(in_file, out, None, grepfilter)
-    out.close()
-    # command-line variant:
-    """
-    cmd = "pogrep --invert-match --header --search=locations --regexp \"gschema\\.xml\\.in|schemas\\.in\" %(full_po)s %(part_po)s" % {
-        'full_po': in_file,
-        'part_po': out_file,
-    }
-    run_shell_command(cmd)"""
+            return None
+    try:
+        return poparser.filter_po(in_file, out_file, filter_loc, filter_str, headers)
+    except (re.error, poparser.ParseError):
+        return None
+
+def generate_reduced_po(full_path, filter_, full_total):
+    """ Generate the reduced po file of full_path (stripped from unprioritized strings).
+        Return a (reduced_path, stats) tuple, or None if no string could be stripped """
+    if full_path.endswith('.pot'):
+        part_po_path = full_path[:-3] + "reduced.pot"
+    else:
+        part_po_path = full_path[:-3] + ".reduced.po"
+    if os.access(part_po_path, os.F_OK):
+        os.remove(part_po_path)
+    part_stats = po_grep(full_path, part_po_path, filter_, {"X-DamnedLies-Scope": "partial"})
+    if part_stats is None:
+        return None
+    if part_stats['translated'] + part_stats['fuzzy'] + part_stats['untranslated'] == full_total:
+        os.remove(part_po_path)
+        return None
+    part_stats['errors'] = []
+    return part_po_path, part_stats
 
 def check_potfiles(po_path):
     """Check if there were any problems regenerating a POT file (intltool-update -m).
        Return a list of errors """
     errors = []
 
-    command = "cd \"%(dir)s\" && rm -f missing notexist && intltool-update -m" % { "dir" : po_path, }
-    (status, output, errs) = run_shell_command(command)
+    for name in ("missing", "notexist"):
+        if os.access(os.path.join(po_path, name), os.F_OK):
+            os.remove(os.path.join(po_path, name))
+    (status, output, errs) = run_command(["intltool-update", "-m"], cwd=po_path)
 
     if status != STATUS_OK:
         errors.append( ("error", ugettext_noop("Errors while running 'intltool-update -m' check.")) )
@@ -204,13 +321,17 @@ def check_potfiles(po_path):
                        + "</li>\n</ul>")))
     return errors
 
+def get_doc_format(vcs_path):
+    """ Return the DocFormat of the document in vcs_path """
+    doc_id = read_makefile_variable([vcs_path], "HELP_ID")
+    has_index_page = os.access(os.path.join(vcs_path, "C", "index.page"), os.R_OK)
+    return DocFormat(bool(doc_id), has_index_page)
+
 def generate_doc_pot_file(vcs_path, potbase, moduleid):
     """ Return the pot file for a document-type domain, and the error if any """
     errors = []
 
-    doc_id = read_makefile_variable([vcs_path], "HELP_ID")
-    has_index_page = os.access(os.path.join(vcs_path, "C", "index.page"), os.R_OK)
-    doc_format = DocFormat(bool(doc_id), has_index_page)
+    doc_format = get_doc_format(vcs_path)
 
     files = []
     if doc_format.format == "mallard":
@@ -235,16 +356,16 @@ def generate_doc_pot_file(vcs_path, potbase, moduleid):
     includes = read_makefile_variable([vcs_path], doc_format.include_var)
     if includes:
         files.extend(filter(lambda x:x not in ("", "$(NULL)"), includes.split()))
-    files = " ".join([os.path.join("C", f) for f in files])
+    files = [os.path.join("C", f) for f in files]
     potfile = os.path.join(vcs_path, "C", potbase + ".pot")
-    command = doc_format.command % {'dir': vcs_path, 'potfile': potfile, 'files': files}
-    (status, output, errs) = run_shell_command(command)
+    command = doc_format.command(potfile, files)
+    (status, output, errs) = run_command(command, cwd=vcs_path)
 
     if status != STATUS_OK:
         errors.append(("error",
                        ugettext_noop("Error regenerating POT file for document %(file)s:\n<pre>%(cmd)s\n%(output)s</pre>")
                              % {'file': potbase,
-                                'cmd': command.replace(settings.SCRATCHDIR, "&lt;scratchdir&gt;"),
+                                'cmd': command_line(command).replace(settings.SCRATCHDIR, "&lt;scratchdir&gt;"),
                                 'output': errs})
                      )
         potfile = ""
@@ -254,6 +375,78 @@ def generate_doc_pot_file(vcs_path, potbase, moduleid):
     else:
         return potfile, errors, doc_format
 
+_tool_versions = {}
+
+def get_tool_version(tool):
+    """ Return the first line of 'tool --version' (cached for the process lifetime) """
+    if tool not in _tool_versions:
+        status, output, errs = run_command([tool, "--version"])
+        _tool_versions[tool] = (output or errs).split("\n")[0].strip()
+    return _tool_versions[tool]
+
+def _tree_files(root):
+    """ Generator of the relative paths of all files below root, VCS metadata excluded """
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted([d for d in dirnames if not d.startswith('.')])
+        for filename in sorted(filenames):
+            yield os.path.relpath(os.path.join(dirpath, filename), root)
+
+# Extensions of the files searched by 'intltool-update -m'
+INTLTOOL_SOURCE_EXTENSIONS = ('.c', '.h', '.cc', '.cpp', '.cxx', '.c++', '.hh', '.y', '.gob', '.vala',
+                              '.py', '.js', '.pl', '.pm', '.glade', '.glade2', '.ui', '.in', '.xml')
+
+def pot_inputs_fingerprint(domain_path, doc_format=None, *extra):
+    """ Return a digest of everything the standard POT generation of a domain depends on,
+        or None if it cannot be determined.
+        For ui domains (doc_format is None): the tool version, POTFILES.in/skip, the content
+        of listed files, the list of files in the source tree and the content of those which
+        'intltool-update -m' searches for translatable strings not listed in POTFILES.in.
+        For doc domains: the tool version, Makefile.am and the content of the C/ directory.
+        extra values (e.g. tool environment) are also part of the digest. """
+    h = hashlib.sha1()
+    for value in extra:
+        h.update(repr(value) + "\0")
+    if doc_format is None:
+        potfiles_in = os.path.join(domain_path, "POTFILES.in")
+        if not os.access(potfiles_in, os.R_OK):
+            return None
+        h.update(get_tool_version("intltool-update"))
+        src_root = os.path.dirname(os.path.normpath(domain_path))
+        listed = []
+        for name in ("POTFILES.in", "POTFILES.skip"):
+            path = os.path.join(domain_path, name)
+            if os.access(path, os.R_OK):
+                h.update(compute_md5(path))
+                if name == "POTFILES.in":
+                    for line in open(path):
+                        line = re.sub(r"^\[[^\]]*\]", "", line.strip())
+                        if line and not line.startswith('#'):
+                            listed.append(line)
+        for rel_path in listed:
+            full_path = os.path.join(src_root, rel_path)
+            h.update(rel_path + "\0")
+            h.update(os.path.isfile(full_path) and compute_md5(full_path) or "-")
+        po_dir = os.path.relpath(domain_path, src_root) + os.sep
+        for rel_path in _tree_files(src_root):
+            # Files of the po directory are not sources (and include generated files)
+            if rel_path.startswith(po_dir):
+                continue
+            h.update(rel_path + "\0")
+            # Unlisted files are reported depending on their content (e.g. new _() calls)
+            if os.path.splitext(rel_path)[1] in INTLTOOL_SOURCE_EXTENSIONS:
+                h.update(compute_md5(os.path.join(src_root, rel_path)))
+    else:
+        h.update(get_tool_version(doc_format.tool == "itstool" and ITSTOOL_PATH + "itstool" or "xml2po"))
+        makefile = os.path.join(domain_path, "Makefile.am")
+        h.update(os.access(makefile, os.R_OK) and compute_md5(makefile) or "-")
+        c_path = os.path.join(domain_path, "C")
+        if not os.path.isdir(c_path):
+            return None
+        for rel_path in _tree_files(c_path):
+            if not rel_path.endswith(".pot"): # Generated file
+                h.update(rel_path + "\0" + compute_md5(os.path.join(c_path, rel_path)))
+    return h.hexdigest()
+
 def read_makefile_variable(vcs_paths, variable):
     """ vcs_paths is a list of potential path where Makefile.am could be found """
     makefiles = [os.path.join(path, "Makefile.am") for path in vcs_paths]
@@ -298,13 +491,22 @@ def search_variable_in_file(file_path, variable):
     file.close()
     return found
 
-def pot_diff_status(pota, potb):
-    (status, output, errs) = run_shell_command("diff %s %s|wc -l" % (pota, potb))
-    # POT generation date always change and produce a 4 line diff
-    if int(output) <= 4:
+def pot_diff_status(pota, potb, potb_fingerprint=None):
+    """ Compare the old POT file pota with the new POT file potb. The stored fingerprint of
+        pota is used, so only potb has to be read (potb_fingerprint is the result of
+        potdiff.fingerprint(potb), when already computed by the caller) """
+    old_fprint = potdiff.load_fingerprint(pota)
+    new_fprint, new_entries = potb_fingerprint or potdiff.fingerprint(potb)
+    if old_fprint is None:
+        # Previous content is unknown
+        return CHANGED_NO_ADDITIONS, ""
+    # POT generation date always change, it is not part of the content digest
+    if old_fprint['content'] == new_fprint['content']:
         return NOT_CHANGED, ""
+    if old_fprint['msgids'] == new_fprint['msgids']:
+        return CHANGED_ONLY_FORMATTING, ""
 
-    result_all, result_add_only = potdiff.diff(pota, potb)
+    result_all, result_add_only = potdiff.diff_fingerprints(old_fprint, new_fprint, new_entries)
     if not len(result_all) and not len(result_add_only):
         return CHANGED_ONLY_FORMATTING, ""
     elif len(result_add_only):
@@ -333,63 +535,37 @@ def po_file_stats(pofile, msgfmt_checks=True):
             return res
         input_data = None
         input_file = pofile
-
-        if has_toolkit:
-            status = pocount.calcstats_old(pofile)
-            res['fuzzy_words'] = status['fuzzysourcewords']
-            res['translated_words'] = status['translatedsourcewords']
-            res['untranslated_words'] = status['untranslatedsourcewords']
-
+        po_lines = pofile
     elif isinstance(pofile, File):
         filename = pofile.name
         input_data = pofile.read()
         input_file = "-"
+        po_lines = input_data.splitlines(True)
     else:
         raise ValueError("pofile type not recognized")
 
-    if msgfmt_checks:
-        command = "msgfmt -cv -o /dev/null %s" % input_file
-    else:
-        command = "msgfmt --statistics -o /dev/null %s" % input_file
-
-    (status, output, errs) = run_shell_command(command, env=c_env, input_data=input_data)
-
-    if status != STATUS_OK:
-        if msgfmt_checks:
-            res['errors'].append(("error", ugettext_noop("PO file '%s' doesn't pass msgfmt check: not updating.") % (filename)))
-        else:
-            res['errors'].append(("error", ugettext_noop("Can't get statistics for POT file '%s'.") % (pofile)))
-
-    if msgfmt_checks and input_file != "-" and os.access(pofile, os.X_OK):
-        res['errors'].append(("warn", ugettext_noop("This PO file has an executable bit set.")))
-
-    # msgfmt output stats on stderr
-    r_tr = re.search(r"([0-9]+) translated", errs)
-    r_un = re.search(r"([0-9]+) untranslated", errs)
-    r_fz = re.search(r"([0-9]+) fuzzy", errs)
-
-    if r_tr:
-        res['translated'] = int(r_tr.group(1))
-    if r_un:
-        res['untranslated'] = int(r_un.group(1))
-    if r_fz:
-        res['fuzzy'] = int(r_fz.group(1))
+    try:
+        stats = poparser.po_stats(po_lines, check_utf8=msgfmt_checks)
+    except poparser.ParseError:
+        stats = None
+    if stats is not None:
+        for key in res.keys():
+            if key in stats:
+                res[key] = stats[key]
 
     if msgfmt_checks:
-        # Check if PO file is in UTF-8
-        if input_file == "-":
-            try:
-                input_data.decode('UTF-8')
-                status = STATUS_OK
-            except:
-                status = STATUS_OK+1
-        else:
-            command = ("msgconv -t UTF-8 %s | diff -i -I '^#~' -u %s - >/dev/null") % (pofile,
-                                                                              pofile)
-            (status, output, errs) = run_shell_command(command, env=c_env)
-        if status != STATUS_OK:
+        # Statistics are computed in-process, msgfmt is only run for its validity checks
+        command = ["msgfmt", "-c", "-o", "/dev/null", input_file]
+        (status, output, errs) = run_command(command, env=c_env, input_data=input_data)
+        if status != STATUS_OK or stats is None:
+            res['errors'].append(("error", ugettext_noop("PO file '%s' doesn't pass msgfmt check: not updating.") % (filename)))
+        if input_file != "-" and os.access(pofile, os.X_OK):
+            res['errors'].append(("warn", ugettext_noop("This PO file has an executable bit set.")))
+        if stats is not None and not stats['utf8']:
             res['errors'].append(("warn",
                               ugettext_noop("PO file '%s' is not UTF-8 encoded.") % (filename)))
+    elif stats is None:
+        res['errors'].append(("error", ugettext_noop("Can't get statistics for POT file '%s'.") % (pofile)))
     return res
 
 def read_linguas_file(full_path):
@@ -414,8 +590,8 @@ def get_ui_linguas(module_path, po_path):
         if os.access(LINGUAS, os.R_OK):
             return read_linguas_file(LINGUAS)
     # AS_ALL_LINGUAS is a macro that takes all po files by default
-    (status, output, errs) = run_shell_command("grep -qs AS_ALL_LINGUAS %s%sconfigure.*" % (module_path, os.sep))
-    if status == 0:
+    configures = glob.glob(os.path.join(module_path, "configure.*"))
+    if configures and run_command(["grep", "-qs", "AS_ALL_LINGUAS"] + configures)[0] == STATUS_OK:
         return {'langs': None,
                 'error': ugettext_noop("No need to edit LINGUAS file or variable for this module")}
 
@@ -479,25 +655,15 @@ def check_identical_figures(fig_stats, base_path, lang):
                 errors.append(("warn-ext", "Figures should not be copied when identical to original (%s)." % trans_path))
     return errors
 
-def add_custom_header(po_path, header, value):
-    """ Add a custom po file header """
-    grep_cmd = """grep "%s" %s""" % (header, po_path)
-    status = 1
-    last_headers = ["Content-Transfer-Encoding", "Plural-Forms"]
-    while status != 0 and last_headers != []:
-        (status, output, errs) = run_shell_command(grep_cmd)
-        if status != 0:
-            # Try to add header
-            cmd = '''sed -i '/^\"%s/ a\\"%s: %s\\\\n"' %s''' % (last_headers.pop(), header, value, po_path)
-            (stat, out, err) = run_shell_command(cmd)
-    if status == 0 and not "%s: %s" % (header, value) in output:
-        # Set header value
-        cmd = '''sed -i '/^\"%s/ c\\"%s: %s\\\\n"' %s''' % (header, header, value, po_path)
-        (stat, out, err) = run_shell_command(cmd)
-
-def is_po_reduced(file_path):
-    status, output, errs = run_shell_command("""grep "X-DamnedLies-Scope: partial" %s""" % file_path)
-    return (status == 0)
+def is_po_reduced(po_file):
+    """ po_file can be a path or a File object """
+    path = getattr(po_file, 'path', po_file)
+    try:
+        for entry in poparser.parse(path):
+            return entry.is_header() and entry.header_value("X-DamnedLies-Scope") == "partial"
+    except (IOError, poparser.ParseError):
+        pass
+    return False
 
 def copy_file(file1, file2):
     try:
@@ -531,6 +697,77 @@ def compute_md5(full_path):
     return m.hexdigest()
 
 
+class StatsCache(object):
+    """ Persistent cache of the results computed from po/pot files, keyed on the
+        content hash of the input files, so unchanged files are not processed
+        again, even when statistics generation is forced.
+        Each entry is stored as a JSON file in STATS_CACHE_DIR, whose modification time
+        tells when the entry was last used (see clean). """
+    version = 1 # Increment to invalidate entries when computation changes
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or getattr(settings, 'STATS_CACHE_DIR',
+                                              os.path.join(settings.SCRATCHDIR, "cache"))
+
+    def make_key(self, *parts):
+        """ Build a key from content hashes of input files and any other value
+            influencing the result """
+        h = hashlib.sha1(str(self.version))
+        for part in parts:
+            h.update("\0" + repr(part))
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key[2:] + ".json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            f = open(path)
+        except IOError:
+            return None
+        try:
+            if time.time() - os.fstat(f.fileno()).st_mtime > 24 * 3600:
+                # Mark the entry as used (at most once a day to spare writes)
+                os.utime(path, None)
+            return simplejson.load(f)
+        except ValueError:
+            return None
+        finally:
+            f.close()
+
+    def set(self, key, value):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path))
+        except OSError:
+            pass
+        # Write to a temporary file first, concurrent readers never see partial content
+        tmp_path = "%s.%d.%d.tmp" % (path, os.getpid(), thread.get_ident())
+        f = open(tmp_path, "w")
+        simplejson.dump(value, f)
+        f.close()
+        os.rename(tmp_path, path)
+
+    def clean(self, days):
+        """ Delete entries (and temporary files of interrupted writes) unused for days """
+        limit = time.time() - days * 24 * 3600
+        if not os.path.isdir(self.cache_dir):
+            return
+        for subdir in os.listdir(self.cache_dir):
+            subdir = os.path.join(self.cache_dir, subdir)
+            if not os.path.isdir(subdir):
+                continue
+            for filename in os.listdir(subdir):
+                path = os.path.join(subdir, filename)
+                try:
+                    if os.path.getmtime(path) < limit:
+                        os.remove(path)
+                except OSError:
+                    # Removed or replaced meanwhile
+                    pass
+
+
 def notify_list(out_domain, diff):
     """Send notification about string changes described in diff."""
     current_site = Site.objects.get_current()
@@ -562,8 +799,58 @@ def url_join(base, *args):
     return url
 
 class Profiler(object):
+    """ Wall time spent in each step of a statistics update, and commands run meanwhile
+        (by run_command/run_shell_command). Steps can be timed from several threads:
+            with profiler.step('msgmerge'):
+                ...
+    """
     def __init__(self):
-        self.start = time.clock()
+        self.start = time.time()
+        with _command_lock:
+            self.commands_start = dict([(tool, list(stats)) for tool, stats in _command_stats.items()])
+        self.steps = {} # step name -> [number of calls, seconds]
+        self.lock = threading.Lock()
 
     def time_spent(self):
-        return time.clock() - self.start
+        return time.time() - self.start
+
+    def commands(self):
+        """ Return (tool, calls, seconds, failures, timeouts) tuples of the commands run since
+            the profiler creation, the most time consuming tools first """
+        result = []
+        with _command_lock:
+            for tool, stats in _command_stats.items():
+                start = self.commands_start.get(tool, [0, 0.0, 0, 0])
+                delta = [value - start_value for value, start_value in zip(stats, start)]
+                if delta[0]:
+                    result.append(tuple([tool] + delta))
+        return sorted(result, key=lambda command: command[2], reverse=True)
+
+    def spawned_commands(self):
+        return sum([command[1] for command in self.commands()])
+
+    def step(self, name):
+        return ProfilerStep(self, name)
+
+    def add(self, name, seconds, calls=1):
+        with self.lock:
+            step = self.steps.setdefault(name, [0, 0.0])
+            step[0] += calls
+            step[1] += seconds
+
+    def ranked_steps(self):
+        """ Return (name, calls, seconds) tuples, the most time consuming steps first """
+        return sorted([(name, calls, seconds) for name, (calls, seconds) in self.steps.items()],
+                      key=lambda step: step[2], reverse=True)
+
+class ProfilerStep(object):
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.add(self.name, time.time() - self.start)
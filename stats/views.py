@@ -17,6 +17,7 @@
 # You should have received a copy of the GNU General Public License
 # along with Damned Lies; if not, write to the Free Software Foundation, Inc.,
 # 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+from bisect import bisect_right
 from datetime import date
 import os
 
@@ -24,17 +25,21 @@ from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core import serializers
+from django.core.cache import cache
 from django.http import HttpResponse, Http404
 from django.shortcuts import render, get_object_or_404
-from django.utils.translation import ugettext as _
+from django.template import RequestContext
+from django.template.loader import render_to_string
+from django.utils.translation import ugettext as _, get_language
 
-from common.utils import MIME_TYPES, get_user_locale
+from common.utils import MIME_TYPES, get_user_locale, stats_condition
 from stats.models import Statistics, FakeLangStatistics, Module, Branch, Category, Release
 from stats.forms import ModuleBranchForm
 from stats import utils
 from languages.models import Language
 from people.models import Person
 
+@stats_condition
 def modules(request, format='html'):
     all_modules = Module.objects.all()
     if format in ('json', 'xml'):
@@ -46,15 +51,16 @@ def modules(request, format='html'):
     }
     return render(request, 'module_list.html', context)
 
+@stats_condition
 def module(request, module_name):
     mod = get_object_or_404(Module, name=module_name)
     branches = mod.get_branches()
+    langs = []
     if request.user.is_authenticated():
         person = Person.get_by_user(request.user)
         langs = person.get_languages()
-        for branch in branches:
-            branch.get_ui_stats(mandatory_langs=langs)
-            branch.get_doc_stats(mandatory_langs=langs)
+    for branch in branches:
+        branch.stats_fragments = BranchStatsFragments(request, branch, mandatory_langs=langs)
 
     context = {
         'pageSection':  "module",
@@ -70,12 +76,86 @@ def module_branch(request, module_name, branch_name):
     """ This view is used to dynamically load a specific branch stats (jquery.load) """
     mod = get_object_or_404(Module, name=module_name)
     branch = mod.branch_set.get(name=branch_name)
+    branch.stats_fragments = BranchStatsFragments(request, branch)
     context = {
         'module': mod,
         'branch': branch,
     }
     return render(request, 'branch_detail.html', context)
 
+class BranchStatsFragments(object):
+    """ Rendered statistics tables of a branch, as used by branch_detail.html.
+        Tables are cached per branch statistics generation (see Branch.stats_changed),
+        statistics type and UI language. Lines of mandatory_langs languages without
+        translation are merged in afterwards, as they depend on the current user. """
+    timeout = getattr(settings, 'STATS_FRAGMENT_TIMEOUT', 24 * 3600)
+
+    def __init__(self, request, branch, mandatory_langs=[]):
+        self.request = request
+        self.branch = branch
+        self.mandatory_langs = mandatory_langs
+
+    def ui(self):
+        return self.get_domains('ui')
+
+    def doc(self):
+        return self.get_domains('doc')
+
+    def get_domains(self, dtype):
+        """ Return a list of {'name', 'head', 'lines'} dicts, one for each domain, where
+            lines is a sorted list of (sort_key, rendered line) tuples """
+        authenticated = self.request.user.is_authenticated()
+        key = "branch-stats:%d:%d:%s:%s:%d" % (self.branch.pk, self.branch.stats_generation, dtype,
+                                               get_language(), authenticated)
+        domains = cache.get(key)
+        if domains is None:
+            domains = self.render_domains(dtype)
+            cache.set(key, domains, self.timeout)
+        self.add_mandatory_langs(domains, dtype)
+        return domains
+
+    def context(self):
+        if not hasattr(self, '_context'):
+            self._context = RequestContext(self.request, {
+                'module': self.branch.module,
+                'branch': self.branch,
+                'user_language': get_user_locale(self.request),
+            })
+        return self._context
+
+    def render_line(self, line, pot_stat):
+        return ((-line.translated(), line.get_lang()),
+                render_to_string('stats_show_row.html', {'line': line, 'pot_stat': pot_stat},
+                                 context_instance=self.context()))
+
+    def render_domains(self, dtype):
+        domains = []
+        for dname, stats in self.branch.get_stats(dtype).items():
+            pot_stat = stats[0]
+            domains.append({
+                'name': dname,
+                'head': render_to_string('stats_show_head.html', {'pot_stat': pot_stat},
+                                         context_instance=self.context()),
+                'has_pot': bool(pot_stat.full_po),
+                'locales': [stat.language.locale for stat in stats[1:]],
+                'lines': [self.render_line(stat, pot_stat) for stat in stats[1:]],
+            })
+        return domains
+
+    def add_mandatory_langs(self, domains, dtype):
+        missing = [(dom, lang) for dom in domains for lang in self.mandatory_langs
+                   if dom['has_pot'] and lang.locale not in dom['locales']]
+        if not missing:
+            return
+        pot_stats = dict([(stat.domain.name, stat) for stat in Statistics.objects.select_related(
+            "domain", "branch", "full_po").filter(branch=self.branch, language__isnull=True,
+            domain__dtype=dtype, domain__name__in=set([dom['name'] for dom, lang in missing]))])
+        for dom, lang in missing:
+            pot_stat = pot_stats[dom['name']]
+            line = self.render_line(FakeLangStatistics(pot_stat, lang), pot_stat)
+            keys = [l[0] for l in dom['lines']]
+            dom['lines'].insert(bisect_right(keys, line[0]), line)
+
 @login_required
 def module_edit_branches(request, module_name):
     mod = get_object_or_404(Module, name=module_name)
@@ -205,8 +285,8 @@ def dynamic_po(request, module_name, domain, branch_name, filename):
     else:
         dyn_content += u"# FIRST AUTHOR <EMAIL@ADDRESS>, YEAR.\n#\n"
 
-    command = "msginit --locale=%s --no-translator --input=%s --output-file=-" % (locale, file_path)
-    status, output, err = utils.run_shell_command(command, raise_on_error=True)
+    command = ["msginit", "--locale=%s" % locale, "--no-translator", "--input=%s" % file_path, "--output-file=-"]
+    status, output, err = utils.run_command(command, raise_on_error=True)
     lines = output.decode('utf-8').split("\n")
     skip_next_line = False
     for i, line in enumerate(lines):
@@ -233,6 +313,7 @@ def dynamic_po(request, module_name, domain, branch_name, filename):
             break
     return HttpResponse(dyn_content, 'text/plain')
 
+@stats_condition
 def releases(request, format='html'):
     active_releases = Release.objects.filter(weight__gte=0).order_by('status', '-weight', '-name')
     old_releases    = Release.objects.filter(weight__lt=0).order_by('status', '-weight', '-name')
@@ -247,6 +328,7 @@ def releases(request, format='html'):
     }
     return render(request, 'release_list.html', context)
 
+@stats_condition
 def release(request, release_name, format='html'):
     release = get_object_or_404(Release, name=release_name)
     if format == 'xml':
@@ -30,6 +30,7 @@ from teams.models import Team, FakeTeam, Role
 from teams.forms import EditMemberRoleForm, EditTeamDetailsForm
 from languages.models import Language
 
+@utils.stats_condition
 def teams(request, format='html'):
     teams = Team.objects.all_with_coordinator()
     format = request.GET.get('format') or format
@@ -20,7 +20,6 @@
 # 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
 import os, sys
-import shutil
 from datetime import datetime, timedelta
 
 from django.conf import settings
@@ -28,13 +27,13 @@ from django.contrib.sites.models import Site
 from django.core import mail, urlresolvers
 from django.db import models
 from django.db.models import Max
-from django.db.models.signals import post_save, pre_delete
+from django.db.models.signals import post_save, pre_delete, post_delete
 from django.dispatch import receiver
 from django.utils.translation import get_language, activate, ugettext, ugettext_lazy as _
 
-from stats.models import Branch, Domain, Statistics, PoFile
+from stats.models import Branch, Domain, Statistics, StatisticsRow, StatsGeneration, PoFile
 from stats.signals import pot_has_changed
-from stats.utils import run_shell_command, is_po_reduced, po_grep
+from stats.utils import run_command, is_po_reduced, po_grep
 from languages.models import Language
 from people.models import Person
 
@@ -435,18 +434,10 @@ class Action(ActionAbstract):
             self.save()
             return # post_save will call merge_file_with_pot again
         merged_path = self.merged_file.path
-        command = "msgmerge --previous -o %(out_po)s %(po_file)s %(pot_file)s" % {
-            'out_po':   merged_path,
-            'po_file':  self.file.path,
-            'pot_file': pot_file
-        }
-        run_shell_command(command)
-        # If uploaded file is reduced, run po_grep *after* merge
+        run_command(["msgmerge", "--previous", "-o", merged_path, self.file.path, pot_file])
+        # If uploaded file is reduced, run po_grep *after* merge (merged file is replaced at the end)
         if is_po_reduced(self.file):
-            temp_path = "%s.temp.po" % self.file.path[:-3]
-            shutil.copy(merged_path, temp_path)
-            po_grep(temp_path, merged_path, self.state_db.domain.red_filter)
-            os.remove(temp_path)
+            po_grep(merged_path, merged_path, self.state_db.domain.red_filter)
         self.merged_file.update_stats()
 
     def send_mail_new_state(self, state, recipient_list):
@@ -772,6 +763,18 @@ def delete_action_files(sender, instance, **kwargs):
 def clean_dangling_states(sender, instance, **kwargs):
     State.objects.filter(branch=instance.branch, domain=instance.domain, language=instance.language).delete()
 
+@receiver(post_save)
+@receiver(post_delete)
+def update_statistics_row(sender, instance, **kwargs):
+    """ Keep the state and last comment of StatisticsRow objects up to date """
+    if isinstance(instance, State):
+        StatisticsRow.refresh(instance.branch_id, instance.domain_id, instance.language_id)
+        StatsGeneration.bump()
+    elif isinstance(instance, Action):
+        # The state may already be deleted (its own post_delete refreshes the row)
+        for key in State.objects.filter(pk=instance.state_db_id).values_list('branch_id', 'domain_id', 'language_id'):
+            StatisticsRow.refresh(*key)
+
 @receiver(post_save)
 def reactivate_role(sender, instance, **kwargs):
     # Reactivating the role if needed
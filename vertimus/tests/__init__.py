@@ -404,6 +404,27 @@ class VertimusTest(TeamsAndRolesTests):
         response = self.client.get(url)
         self.assertContains(response, '<option value="WC">')
 
+    def test_vertimus_diff(self):
+        state = StateTranslating(branch=self.b, domain=self.d, language=self.l, person=self.pt)
+        state.save()
+        po_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "valid_po.po")
+        action_1 = Action.new_by_name('UT', person=self.pt, comment="Done.", file=File(open(po_path, 'r')))
+        action_1.apply_on(state)
+        Action.new_by_name('RP', person=self.pr, comment="Reserved!").apply_on(state)
+        action_2 = Action.new_by_name('UP', person=self.pr, comment="Done.", file=File(open(po_path, 'r')))
+        action_2.apply_on(state)
+        # Merged files are normally generated from the POT file
+        content = open(po_path).read()
+        open(action_1.merged_file.path, 'w').write(content)
+        open(action_2.merged_file.path, 'w').write(content.replace('msgstr "Elem"', 'msgstr "Elemek"'))
+        self.files_to_clean.extend([action_1.file.path, action_1.merged_file.path,
+                                    action_2.file.path, action_2.merged_file.path])
+
+        response = self.client.get(reverse('vertimus_diff', args=[action_2.id, action_1.id, 0]))
+        self.assertContains(response, '<td class="diff_chg"><pre>', count=2)
+        self.assertContains(response, 'msgstr &quot;Elemek&quot;')
+        self.assertNotContains(response, 'Főmenü')
+
     def test_uploaded_file_validation(self):
         # Test a non valid po file
         post_content = QueryDict('action=WC&comment=Test1')
@@ -19,14 +19,19 @@
 # along with Damned Lies; if not, write to the Free Software Foundation, Inc.,
 # 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
+import hashlib, os
+
 from django.conf import settings
 from django.core import urlresolvers
+from django.core.cache import cache
 from django.http import HttpResponseRedirect, Http404
 from django.shortcuts import render, get_object_or_404
-from django.utils.translation import ugettext as _
+from django.template.loader import render_to_string
+from django.utils.translation import ugettext as _, get_language
 
 from stats.models import Statistics, FakeLangStatistics, Module, Branch, Domain, Language
 from stats.utils import is_po_reduced
+from stats import poparser
 from vertimus.models import State, Action, ActionArchived
 from vertimus.forms import ActionForm
 
@@ -139,7 +144,6 @@ def vertimus(request, branch, domain, language, stats=None, level="0"):
 
 def vertimus_diff(request, action_id_1, action_id_2, level):
     """Show a diff between current action po file and previous file"""
-    import difflib
     if int(level) != 0:
         ActionReal = ActionArchived
     else:
@@ -150,11 +154,6 @@ def vertimus_diff(request, action_id_1, action_id_2, level):
     file_path_1 = action_1.merged_file and action_1.merged_file.path or action_1.file.path
     reduced = is_po_reduced(file_path_1)
 
-    try:
-        content_1 = [l.decode('utf-8') for l in open(file_path_1, 'U').readlines()]
-    except UnicodeDecodeError:
-        return render(request, 'error.html',
-                      {'error': _("Error: The file %s contains invalid characters.") % file_path_1.split('/')[-1]})
     descr_1 = _("Uploaded file by %(name)s on %(date)s") % { 'name': action_1.person.name,
                                                              'date': action_1.created }
     if action_id_2 not in (None, "0"):
@@ -183,20 +182,51 @@ def vertimus_diff(request, action_id_1, action_id_2, level):
                 descr_2 = _("Latest POT file")
             file_path_2 = stats.po_path(reduced=reduced)
     try:
-        content_2 = [l.decode('utf-8') for l in open(file_path_2, 'U').readlines()]
-    except UnicodeDecodeError:
-        return render(request, 'error.html',
-                      {'error': _("Error: The file %s contains invalid characters.") % file_path_2.split('/')[-1]})
-    d = difflib.HtmlDiff(wrapcolumn=80)
-    diff_content = d.make_table(content_2, content_1,
-                                descr_2, descr_1, context=True)
+        diff_content = get_po_diff(file_path_2, file_path_1)
+    except PoDiffError, e:
+        return render(request, 'error.html', {'error': e.args[0]})
 
     context = {
         'diff_content': diff_content,
+        'descr_1': descr_1,
+        'descr_2': descr_2,
         'state': state,
     }
     return render(request, 'vertimus/vertimus_diff.html', context)
 
+class PoDiffError(Exception):
+    pass
+
+def get_po_diff(old_path, new_path):
+    """ Return the HTML table rows showing messages whose translation differs between
+        both po files. The result is cached, keyed on both file paths and modification
+        times (uploaded files never change, but latest committed files do), and on the
+        interface language of the rendered rows """
+    try:
+        key_parts = [(path, os.path.getmtime(path)) for path in (old_path, new_path)]
+    except OSError:
+        raise Http404
+    key = "vertimus-diff:%s:%s" % (hashlib.sha1(repr(key_parts)).hexdigest(), get_language())
+    diff_content = cache.get(key)
+    if diff_content is None:
+        rows = []
+        try:
+            for old_entry, new_entry in poparser.diff_po(old_path, new_path):
+                rows.append((entry_text(old_entry, old_path), entry_text(new_entry, new_path)))
+        except poparser.ParseError:
+            raise PoDiffError(_("Error: The po files could not be parsed."))
+        diff_content = render_to_string('vertimus/vertimus_diff_rows.html', {'rows': rows})
+        cache.set(key, diff_content, getattr(settings, 'VERTIMUS_DIFF_CACHE_TIMEOUT', 7 * 24 * 3600))
+    return diff_content
+
+def entry_text(entry, path):
+    if entry is None:
+        return None
+    try:
+        return "".join(entry.lines).decode('utf-8')
+    except UnicodeDecodeError:
+        raise PoDiffError(_("Error: The file %s contains invalid characters.") % os.path.basename(path))
+
 def latest_uploaded_po(request, module_name, branch_name, domain_name, locale_name):
     """ Redirect to the latest uploaded po for a module/branch/language """
     branch = get_object_or_404(Branch, module__name=module_name, name=branch_name)